@@ -1,12 +1,13 @@
 import os
 import sys
 import argparse
+import datetime
 
 # Add src to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import keyboard
-from modules.utils import check_ffmpeg, create_session, list_sessions, ANALYSIS_INTERVAL
+from modules.utils import check_ffmpeg, create_session, list_sessions, print_stats, search_notes, ANALYSIS_INTERVAL
 from modules.logger import Logger
 from modules.analyzer import Analyzer
 
@@ -17,13 +18,32 @@ def main():
                         help="Resume a previous session by name (e.g. session_20260211_223000)")
     parser.add_argument("--list", action="store_true",
                         help="List all available sessions")
+    parser.add_argument("--stats", action="store_true",
+                        help="Show totals over all sessions (batches, files, hours of speech)")
+    parser.add_argument("--search", type=str, default=None, metavar="QUERY",
+                        help="Search transcripts and key events across sessions (Chinese or English)")
+    parser.add_argument("--limit", type=int, default=20,
+                        help="With --search: max results")
+    parser.add_argument("--since", type=str, default=None,
+                        help="With --list / --stats / --search: only sessions active since this date (YYYY-MM-DD)")
     args = parser.parse_args()
 
     print("🚀 AI 论文伴侣 v2 已启动")
     print("   架构: Logger (采集) + Analyzer (分析)")
 
-    if args.list:
-        list_sessions()
+    if args.list or args.stats or args.search:
+        since = None
+        if args.since:
+            try:
+                since = datetime.datetime.strptime(args.since, "%Y-%m-%d").timestamp()
+            except ValueError:
+                parser.error("--since expects a date like 2026-02-11")
+        if args.list:
+            list_sessions(since)
+        if args.stats:
+            print_stats(since)
+        if args.search:
+            search_notes(args.search, since, args.limit)
         return
 
     if not check_ffmpeg():
@@ -36,7 +56,7 @@ def main():
 
     print(f"📝 日志: {session.log_file}")
     print(f"📂 待处理: {session.pending_dir}")
-    print(f"🧠 分析间隔: {ANALYSIS_INTERVAL // 60} 分钟")
+    print(f"🧠 最长分析延迟: {ANALYSIS_INTERVAL // 60} 分钟 (有新文件时按阈值提前分析)")
     print("-" * 50)
 
     # Start Analyzer (background thread)
@@ -51,6 +71,8 @@ def main():
     hotkey = "ctrl+shift+alt+p"
     try:
         keyboard.add_hotkey(hotkey, logger.toggle_pause)
+        # Typing bursts screen recording back to full frame rate
+        keyboard.on_press(lambda _: logger.screen.notify_activity())
         print(f"🎙️  开始监听... 按 Ctrl+C 退出")
         print(f"⏯️  快捷键暂停/恢复: {hotkey}")
     except Exception as e:
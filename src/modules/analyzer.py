@@ -2,48 +2,193 @@ import threading
 import time
 import os
 import shutil
-from .utils import ANALYSIS_INTERVAL
-from .gemini_client import batch_analyze
+from collections import namedtuple
+from .utils import (ANALYSIS_INTERVAL, TRIGGER_SPEECH_SECONDS, TRIGGER_FILES, TRIGGER_BYTES,
+                    TRIGGER_MIN_INTERVAL, PREUPLOAD_ENABLED, SPEECH_LANE, SPEECH_SETTLE, SPEECH_MIN_INTERVAL,
+                    AUDIO_EXTENSIONS, PARTIAL_SUFFIX, SIDECAR_SUFFIX, is_sidecar)
+from .upload_cache import UploadManifest
+from .pipeline import AnalysisPipeline
+from .batch_planner import plan_batches, media_duration
+from .fs_watch import PendingWatcher
+from .pre_uploader import PreUploader
+from .journal import BatchJournal, logged_batches, batch_marker
+from .batch_records import records_file, record_offsets, read_record, render_note
+from .gemini_client import append_log
+from .catalog import get_catalog
+
+PendingLoad = namedtuple("PendingLoad", "files bytes speech oldest newest")
+LANES = ("speech", "bulk")
+
+
+def lane_of(name):
+    """Speech clips (audio, video and their sidecars) go to the speech lane, the rest to bulk."""
+    return "speech" if SPEECH_LANE and "_speech_clip" in name else "bulk"
+
+
+def awaiting_video(pending_dir, name):
+    """True for a speech clip's audio (or its sidecar) while the clip's screen
+    video is still being encoded: claiming it now would split the pair."""
+    media = name[:-len(SIDECAR_SUFFIX)] if is_sidecar(name) else name
+    if not media.endswith(AUDIO_EXTENSIONS):
+        return False
+    video = os.path.splitext(media)[0] + ".mp4" + PARTIAL_SUFFIX
+    return os.path.exists(os.path.join(pending_dir, video))
 
 
 class Analyzer:
-    """Periodic batch analyzer: collects pending files, sends to Gemini, writes log."""
+    """Event-driven batch analyzer: collects pending files, sends to Gemini, writes log."""
 
-    def __init__(self, session):
+    def __init__(self, session, backend=None):
         self.session = session
+        self.manifest = UploadManifest(session.upload_manifest)
+        self.journal = BatchJournal(session.journal_file)
+        self.catalog = get_catalog()  # batch outcomes, file details and the notes' search index
+        self.pipeline = AnalysisPipeline(backend=backend, manifest=self.manifest,
+                                         keyframe_dir=session.keyframe_dir, journal=self.journal,
+                                         on_logged=lambda path: self.catalog.index_log(session.name, path))
         self._running = False
         self._thread = None
+        self._watcher = None
+        # Files are uploaded as they land, so most are ACTIVE by the time their batch runs
+        self._uploader = PreUploader(self.pipeline, session.pending_dir) if PREUPLOAD_ENABLED else None
+        self._failures = {lane: 0 for lane in LANES}  # consecutive failed batches (backs off the next round)
+        self._durations = {}      # (name, mtime) → seconds of speech
 
     def start(self):
-        """Start the analyzer as a background thread."""
+        """Start the analyzer as a background thread, after replaying whatever
+        a crash left in processing/."""
+        self._recover()
         self._running = True
+        self.pipeline.start()
+        self._watcher = PendingWatcher(self.session.pending_dir)
+        if self._uploader:
+            self._uploader.start()
         self._thread = threading.Thread(target=self._analysis_loop, daemon=True)
         self._thread.start()
-        print(f"🧠 Analyzer running every {ANALYSIS_INTERVAL // 60} minutes")
+        print(f"🧠 Analyzer watching pending/ ({self._watcher.backend}), "
+              f"max latency {ANALYSIS_INTERVAL // 60} minutes")
 
     def stop(self):
         """Stop the analyzer."""
         self._running = False
+        if self._watcher:
+            self._watcher.interrupt()
+        if self._uploader:
+            self._uploader.stop()
 
     def run_now(self):
-        """Trigger an immediate analysis (e.g. on shutdown)."""
+        """Trigger an immediate analysis (e.g. on shutdown) and wait for every batch in flight."""
         self._run_analysis()
+        self.pipeline.drain()
+        if self.pipeline.limiter:
+            print(f"📶 Gemini API: {self.pipeline.limiter.summary()}")
 
     def _analysis_loop(self):
-        """Main loop: sleep for ANALYSIS_INTERVAL, then run analysis."""
-        while self._running:
-            time.sleep(ANALYSIS_INTERVAL)
-            if not self._running:
-                break
-            self._run_analysis()
-
-    def _run_analysis(self):
-        """Execute one round of batch analysis."""
+        """Main loop: wait for pending/ events (or the next deadline), run a lane's round when triggered.
+        Each lane has its own minimum interval, backed off after failed batches;
+        an idle session sleeps until a file is finalized."""
+        last_run = {lane: 0.0 for lane in LANES}
+        try:
+            while self._running:
+                now = time.time()
+                waits = []
+                for lane, load in self._pending_load().items():
+                    reason, due = self._trigger_reason(lane, load, now)
+                    if not reason:
+                        if due is not None:
+                            waits.append(due - now)
+                        continue
+                    base = SPEECH_MIN_INTERVAL if lane == "speech" else TRIGGER_MIN_INTERVAL
+                    floor = last_run[lane] + min(ANALYSIS_INTERVAL, base * 2 ** min(self._failures[lane], 5))
+                    if now >= floor:
+                        print(f"\n⏰ [Analyzer] {lane} lane triggered: {reason}")
+                        self._run_analysis(lane)
+                        last_run[lane] = time.time()
+                        waits.append(0.0)
+                    else:
+                        waits.append(floor - now)
+
+                # Idle (no deadline in sight): sleep until something is finalized
+                self._watcher.wait(max(0.0, min(waits)) if waits else None)
+        finally:
+            self._watcher.close()
+
+    def _pending_load(self):
+        """Per lane: files, bytes and seconds of speech finalized in pending/, plus oldest/newest mtime."""
+        loads = {lane: PendingLoad(0, 0, 0.0, None, None) for lane in LANES}
+        durations = {}
+        try:
+            entries = list(os.scandir(self.session.pending_dir))
+        except OSError:
+            entries = []
+        for entry in entries:
+            name = entry.name
+            if name.endswith(PARTIAL_SUFFIX) or is_sidecar(name) or awaiting_video(self.session.pending_dir, name):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            speech = 0.0
+            if name.endswith(AUDIO_EXTENSIONS):
+                key = (name, st.st_mtime)
+                if key not in self._durations:
+                    self._durations[key] = media_duration(entry.path) or 0.0
+                speech = durations[key] = self._durations[key]
+            lane = lane_of(name)
+            load = loads[lane]
+            loads[lane] = PendingLoad(
+                load.files + 1, load.bytes + st.st_size, load.speech + speech,
+                st.st_mtime if load.oldest is None else min(load.oldest, st.st_mtime),
+                st.st_mtime if load.newest is None else max(load.newest, st.st_mtime))
+        self._durations = durations  # forget files that left pending/
+        return loads
+
+    @staticmethod
+    def _trigger_reason(lane, load, now):
+        """(reason to run now, or None; time the lane is next due, or None).
+
+        Speech clips go within seconds, once no new one has landed for
+        SPEECH_SETTLE. Heartbeat screenshots wait in the bulk lane until enough
+        files, bytes or speech are pending or the oldest has waited ANALYSIS_INTERVAL.
+        """
+        if not load.files:
+            return None, None
+        if lane == "speech":
+            settled = load.newest + SPEECH_SETTLE
+            if now >= settled:
+                return f"{load.files} speech files finished", None
+            return None, settled
+        if load.speech >= TRIGGER_SPEECH_SECONDS:
+            return f"{load.speech:.0f}s of speech pending", None
+        if load.files >= TRIGGER_FILES:
+            return f"{load.files} files pending", None
+        if load.bytes >= TRIGGER_BYTES:
+            return f"{load.bytes / 1e6:.0f} MB pending", None
+        if now - load.oldest >= ANALYSIS_INTERVAL:
+            return f"oldest file waited {ANALYSIS_INTERVAL // 60} minutes", None
+        return None, load.oldest + ANALYSIS_INTERVAL
+
+    def _run_analysis(self, lane=None):
+        """Execute one round of batch analysis for one lane (or all lanes).
+
+        A round only claims files, splits a large backlog into sub-batches
+        (batch planner), journals and submits them to the pipeline, so a slow
+        batch never holds up the next round.
+        """
         pending = self.session.pending_dir
         processing = self.session.processing_dir
 
         # ── Step 1: Lock — move pending → processing ──
-        files = [f for f in os.listdir(pending) if os.path.isfile(os.path.join(pending, f))]
+        files = [f for f in os.listdir(pending)
+                 if os.path.isfile(os.path.join(pending, f)) and not f.endswith(PARTIAL_SUFFIX)]
+        # A sidecar is written just before its media is renamed into place; wait for the media
+        files = [f for f in files
+                 if not (is_sidecar(f) and os.path.exists(os.path.join(pending, f[:-len(SIDECAR_SUFFIX)] + PARTIAL_SUFFIX)))]
+        # A speech clip's audio waits for its screen video (ffmpeg may still be finishing it)
+        files = [f for f in files if not awaiting_video(pending, f)]
+        if lane:
+            files = [f for f in files if lane_of(f) == lane]
         if not files:
             print("🔍 [Analyzer] No pending files, skipping.")
             return
@@ -51,9 +196,14 @@ class Analyzer:
         print(f"\n{'='*50}")
         print(f"🧠 [Analyzer] Processing {len(files)} files...")
 
-        # Move files atomically (only if they are not locked)
+        # Move files atomically (only if they are not locked). Media go first; a sidecar
+        # follows only if its media was claimed too (or is gone), never on its own
         moved_files = []
-        for f in files:
+        for f in sorted(files, key=is_sidecar):
+            media = f[:-len(SIDECAR_SUFFIX)] if is_sidecar(f) else None
+            if media and (os.path.exists(os.path.join(pending, media))
+                          or os.path.exists(os.path.join(pending, media + PARTIAL_SUFFIX))):
+                continue
             src = os.path.join(pending, f)
             dst = os.path.join(processing, f)
             try:
@@ -73,24 +223,122 @@ class Analyzer:
         # ── Step 2: Sort by timestamp (filename prefix) ──
         moved_files.sort(key=lambda x: os.path.basename(x))
 
-        # ── Step 3: Send to Gemini ──
-        success = batch_analyze(moved_files, self.session.log_file, self.session.archive_dir)
+        planned = []
+        for lane in LANES:
+            lane_files = [f for f in moved_files if lane_of(os.path.basename(f)) == lane]
+            if not lane_files:
+                continue
 
-        # ── Step 4: Archive processed files ──
+            # ── Step 3: Split into time-contiguous sub-batches under the token/byte budget ──
+            batches = plan_batches(lane_files)
+            if len(batches) > 1:
+                print(f"  🧩 {lane}: split into {len(batches)} sub-batches:")
+                for b in batches:
+                    print(f"    - {os.path.basename(b.files[0])} … {len(b.files)} files, "
+                          f"~{b.tokens // 1000}k tokens, {b.bytes / 1e6:.1f} MB")
+            planned.extend((lane, b) for b in batches)
+
+        # ── Step 4: Send to Gemini concurrently (Step 5 runs as each sub-batch finishes) ──
+        # The pipeline appends results in order of each batch's oldest file, across both lanes
+        planned.sort(key=lambda lb: os.path.basename(lb[1].files[0]))
+        for lane, b in planned:
+            batch_id = self.journal.begin(lane, b.files)
+            self.catalog.begin_batch(self.session.name, batch_id, lane, b.files)
+            self.pipeline.submit(b.files, self.session.log_file, self.session.archive_dir,
+                                 quarantine_dir=self.session.quarantine_dir, lane=lane, batch_id=batch_id,
+                                 on_done=lambda success, files=b.files, lane=lane, batch_id=batch_id:
+                                     self._finish_batch(files, success, lane, batch_id))
+        print(f"{'='*50}\n")
+
+    def _finish_batch(self, moved_files, success, lane="bulk", batch_id=None):
+        """Archive a finished batch, or return it to pending/ for retry."""
+        names = [os.path.basename(f) for f in moved_files]
+        # Quarantined files have already left processing/
+        moved_files = [f for f in moved_files if os.path.exists(f)]
+
+        # ── Step 5: Archive processed files ──
+        self._failures[lane] = 0 if success else self._failures[lane] + 1
         if success:
-            for f in moved_files:
-                try:
-                    shutil.move(f, os.path.join(self.session.archive_dir, os.path.basename(f)))
-                except:
-                    pass
-            print(f"� [Analyzer] Archived {len(moved_files)} files → archive/")
+            moved = self._move_all(moved_files, self.session.archive_dir)
+            print(f"📦 [Analyzer] Archived {moved} files → archive/")
         else:
             # On failure, move files back to pending for retry
             print("  ⚠️ Analysis failed. Moving files back to pending for retry.")
-            for f in moved_files:
+            self._move_all(moved_files, self.session.pending_dir)
+        if batch_id:
+            self.journal.mark(batch_id, "archived" if success else "returned")
+        self.catalog.finish_batch(self.session.name, batch_id, success, self._locate(names),
+                                  self.session.log_file if success else None)
+
+    def _locate(self, names):
+        """(path, catalog state) of each file after its batch was settled."""
+        located = []
+        for name in names:
+            for directory, state in ((self.session.archive_dir, "archived"), (self.session.pending_dir, "pending"),
+                                     (self.session.quarantine_dir, "quarantined"),
+                                     (self.session.processing_dir, "processing")):
+                path = os.path.join(directory, name)
+                if os.path.exists(path):
+                    located.append((path, state))
+                    break
+        return located
+
+    @staticmethod
+    def _move_all(files, directory):
+        """Move files into `directory`; a file that can't be moved stays in
+        processing/ and is sorted out by the next startup's recovery."""
+        moved = 0
+        for f in files:
+            try:
+                shutil.move(f, os.path.join(directory, os.path.basename(f)))
+                moved += 1
+            except OSError as e:
+                print(f"  ⚠️ Could not move {os.path.basename(f)} → {os.path.basename(directory)}/: {e}")
+        return moved
+
+    def _recover(self):
+        """Replay the journal after a crash: batches whose note reached the log
+        are archived (never analyzed twice), as are batches whose record reached
+        batches.jsonl (the note is rendered from it); other stranded files go
+        back to pending/."""
+        processing = self.session.processing_dir
+        stranded = {f for f in os.listdir(processing) if not f.endswith(PARTIAL_SUFFIX)}
+        open_batches = self.journal.open_batches()
+        if not stranded and not open_batches:
+            self.journal.compact()
+            return
+
+        logged = logged_batches(self.session.log_file) if open_batches else set()
+        records = records_file(self.session.log_file)
+        offsets = record_offsets(records) if open_batches else {}
+        archive, retry = [], []
+        for batch_id, batch in open_batches.items():
+            done = batch["state"] == "logged" or batch_id in logged
+            if not done and batch_id in offsets:
                 try:
-                    shutil.move(f, os.path.join(pending, os.path.basename(f)))
-                except:
-                    pass
+                    append_log(self.session.log_file, render_note(read_record(records, offsets[batch_id]))
+                               + batch_marker(batch_id), durable=True)
+                    logged.add(batch_id)
+                    done = True
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"⚠️ [Analyzer] Could not restore the note of batch {batch_id}: {e}")
+            files = [f for f in batch["files"] if f in stranded]
+            stranded -= set(files)
+            (archive if done else retry).extend(os.path.join(processing, f) for f in files)
+            if done and batch["state"] != "logged":
+                self.journal.mark(batch_id, "logged", sync=False)
+            self.journal.mark(batch_id, "archived" if done else "returned")
+        # Files of closed batches whose move failed, or moved in before their batch was journaled
+        for f in stranded:
+            (archive if self.journal.last_state(f) == "archived" else retry).append(os.path.join(processing, f))
 
-        print(f"{'='*50}\n")
+        print(f"🩹 [Analyzer] Recovering processing/: {len(open_batches)} unfinished batches, "
+              f"{len(archive)} files already in the log → archive/, {len(retry)} → pending/")
+        self._move_all(archive, self.session.archive_dir)
+        self._move_all(retry, self.session.pending_dir)
+        for batch_id, batch in open_batches.items():
+            done = batch["state"] == "logged" or batch_id in logged
+            self.catalog.finish_batch(self.session.name, batch_id, done, self._locate(batch["files"]),
+                                      self.session.log_file if done else None)
+        if not os.listdir(processing):
+            self.journal.compact()
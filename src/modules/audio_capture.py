@@ -0,0 +1,122 @@
+import time
+import pyaudio
+
+
+class ChunkRing:
+    """Bounded single-producer / single-consumer ring of fixed-size PCM chunks.
+
+    The PortAudio callback thread is the only writer of `_write` and the VAD
+    loop the only writer of `_read`; both are monotonic counters, and plain int
+    stores are atomic under the GIL, so neither side takes a lock. When the
+    ring is full the incoming chunk is dropped and counted instead of blocking
+    the audio thread.
+    """
+
+    def __init__(self, capacity, chunk_bytes):
+        self.capacity = capacity
+        self.chunk_bytes = chunk_bytes
+        self._buffer = bytearray(capacity * chunk_bytes)
+        self._view = memoryview(self._buffer)
+        self._stamps = [0.0] * capacity
+        self._write = 0
+        self._read = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._write - self._read
+
+    def put(self, data, stamp):
+        """Producer side. Returns False (and counts a drop) if the ring is full."""
+        if self._write - self._read >= self.capacity:
+            self.dropped += 1
+            return False
+        slot = self._write % self.capacity
+        offset = slot * self.chunk_bytes
+        self._view[offset:offset + self.chunk_bytes] = data
+        self._stamps[slot] = stamp
+        self._write += 1
+        return True
+
+    def get(self):
+        """Consumer side. Returns (chunk_bytes, capture_time) or None if empty."""
+        if self._read == self._write:
+            return None
+        slot = self._read % self.capacity
+        offset = slot * self.chunk_bytes
+        data = bytes(self._view[offset:offset + self.chunk_bytes])
+        stamp = self._stamps[slot]
+        self._read += 1
+        return data, stamp
+
+
+class CallbackCapture:
+    """PyAudio callback that slices incoming audio into CHUNK_SIZE chunks and
+    fills a ChunkRing, decoupled from the VAD consumer.
+
+    Counters:
+        dropped_chunks  — chunks lost because the consumer let the ring fill up
+        overflows       — callbacks where PortAudio itself reported input overflow
+        late_chunks     — chunks consumed more than `late_after` seconds after capture
+    """
+
+    def __init__(self, capacity, chunk_bytes, late_after):
+        self.ring = ChunkRing(capacity, chunk_bytes)
+        self.late_after = late_after
+        self.overflows = 0
+        self.late_chunks = 0
+        self.captured_chunks = 0
+        self._partial = bytearray()
+        self._listeners = []
+
+    @property
+    def dropped_chunks(self):
+        return self.ring.dropped
+
+    def add_listener(self, fn):
+        """Register a zero-arg callable invoked (on the audio thread) after each put."""
+        self._listeners.append(fn)
+
+    def callback(self, in_data, frame_count, time_info, status):
+        """PyAudio stream_callback: must never block."""
+        if status & pyaudio.paInputOverflow:
+            self.overflows += 1
+
+        now = time.monotonic()
+        size = self.ring.chunk_bytes
+        if self._partial:
+            self._partial.extend(in_data)
+            data = bytes(self._partial)
+            self._partial.clear()
+        else:
+            data = in_data
+
+        offset = 0
+        while offset + size <= len(data):
+            self.ring.put(data[offset:offset + size], now)
+            self.captured_chunks += 1
+            offset += size
+        if offset < len(data):
+            self._partial.extend(data[offset:])
+
+        for fn in self._listeners:
+            fn()
+        return (None, pyaudio.paContinue)
+
+    def get(self):
+        """Pop one chunk, updating the late-chunk counter. Returns bytes or None."""
+        item = self.ring.get()
+        if item is None:
+            return None
+        data, stamp = item
+        if time.monotonic() - stamp > self.late_after:
+            self.late_chunks += 1
+        return data
+
+    def stats(self):
+        return {
+            "captured": self.captured_chunks,
+            "dropped": self.dropped_chunks,
+            "overflows": self.overflows,
+            "late": self.late_chunks,
+            "queued": len(self.ring),
+        }
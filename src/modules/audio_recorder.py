@@ -1,21 +1,28 @@
 import pyaudio
 import torch
-import numpy as np
+import threading
 import collections
 from silero_vad import load_silero_vad
-from .utils import FORMAT, CHANNELS, RATE, CHUNK_SIZE, PADDING_DURATION_MS, VAD_THRESHOLD
+from .utils import (FORMAT, CHANNELS, RATE, CHUNK_SIZE, PADDING_DURATION_MS, VAD_THRESHOLD,
+                    CAPTURE_MODE, CAPTURE_BUFFER_SECONDS, CAPTURE_LATE_MS)
+from .vad_engine import StreamingVAD
+from .audio_capture import CallbackCapture
 
 
 class AudioRecorder:
-    def __init__(self):
+    def __init__(self, capture_mode=CAPTURE_MODE):
         self.p = pyaudio.PyAudio()
         self.stream = None
+        self.capture = None
+        self.capture_mode = capture_mode
+        self._data_ready = threading.Event()
 
         # Load Silero VAD model (neural network, runs on CPU)
         print("🧠 Loading Silero VAD model...")
         self.model = load_silero_vad()
         self.model.eval()
         torch.set_num_threads(1)  # Silero recommends single thread for efficiency
+        self.vad = StreamingVAD(self.model)
 
         # Silence history: how many consecutive silent chunks we've seen
         # CHUNK_SIZE=512 at 16kHz = 32ms per chunk
@@ -25,11 +32,23 @@ class AudioRecorder:
 
     def start_stream(self):
         try:
-            self.stream = self.p.open(format=FORMAT,
-                                      channels=CHANNELS,
-                                      rate=RATE,
-                                      input=True,
-                                      frames_per_buffer=CHUNK_SIZE)
+            if self.capture_mode == "callback":
+                # PortAudio thread fills a bounded ring; the VAD loop only consumes
+                capacity = int(CAPTURE_BUFFER_SECONDS * RATE / CHUNK_SIZE)
+                self.capture = CallbackCapture(capacity, CHUNK_SIZE * 2, CAPTURE_LATE_MS / 1000)
+                self.capture.add_listener(self._data_ready.set)
+                self.stream = self.p.open(format=FORMAT,
+                                          channels=CHANNELS,
+                                          rate=RATE,
+                                          input=True,
+                                          frames_per_buffer=CHUNK_SIZE,
+                                          stream_callback=self.capture.callback)
+            else:
+                self.stream = self.p.open(format=FORMAT,
+                                          channels=CHANNELS,
+                                          rate=RATE,
+                                          input=True,
+                                          frames_per_buffer=CHUNK_SIZE)
             return True
         except OSError as e:
             print(f"❌ Failed to open audio stream: {e}")
@@ -38,6 +57,9 @@ class AudioRecorder:
             return False
 
     def read(self):
+        if self.capture:
+            data = self._read_captured(timeout=0.5)
+            return data if data is not None else b'\x00' * (CHUNK_SIZE * 2)
         if self.stream:
             try:
                 data = self.stream.read(CHUNK_SIZE, exception_on_overflow=False)
@@ -47,19 +69,52 @@ class AudioRecorder:
                 return b'\x00' * (CHUNK_SIZE * 2)  # 2 bytes per sample (16-bit)
         return b'\x00' * (CHUNK_SIZE * 2)
 
-    def is_speech(self, chunk):
-        """Use Silero VAD to detect speech. Returns True if probability > threshold."""
-        try:
-            # Convert raw bytes to float32 tensor
-            audio_int16 = np.frombuffer(chunk, dtype=np.int16)
-            audio_float32 = audio_int16.astype(np.float32) / 32768.0
-            audio_tensor = torch.from_numpy(audio_float32)
+    def read_available(self):
+        """Read one chunk (blocking), plus any further chunks already buffered
+        by PortAudio, up to the VAD queue capacity. Lets the VAD loop catch up
+        in a single Silero call when it falls behind.
+        """
+        if self.capture:
+            first = self._read_captured(timeout=0.5)
+            if first is None:
+                return []
+            chunks = [first]
+            while len(chunks) < self.vad.capacity:
+                data = self.capture.get()
+                if data is None:
+                    break
+                chunks.append(data)
+            return chunks
 
-            # Run model — returns speech probability (0.0 to 1.0)
-            prob = self.model(audio_tensor, RATE).item()
-            return prob > VAD_THRESHOLD
+        chunks = [self.read()]
+        if not self.stream:
+            return chunks
+        try:
+            while (len(chunks) < self.vad.capacity
+                   and self.stream.get_read_available() >= CHUNK_SIZE):
+                chunks.append(self.stream.read(CHUNK_SIZE, exception_on_overflow=False))
         except Exception:
-            return False
+            pass
+        return chunks
+
+    def _read_captured(self, timeout):
+        """Pop one chunk from the callback ring, waiting up to `timeout` seconds."""
+        data = self.capture.get()
+        if data is None:
+            self._data_ready.wait(timeout)
+            self._data_ready.clear()
+            data = self.capture.get()
+        return data
+
+    def capture_stats(self):
+        """Dropped / late / overflow counters for callback capture (None in blocking mode)."""
+        return self.capture.stats() if self.capture else None
+
+    def is_speech(self, chunk):
+        """Use Silero VAD to detect speech. Returns True if probability > threshold."""
+        self.vad.push(chunk)
+        results = self.vad.process()
+        return bool(results) and results[-1][1] > VAD_THRESHOLD
 
     def reset_vad(self):
         """Reset model states between utterances for clean detection."""
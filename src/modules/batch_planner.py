@@ -0,0 +1,149 @@
+import os
+import math
+import wave
+import struct
+from collections import namedtuple
+import cv2
+from PIL import Image
+from .utils import (AUDIO_EXTENSIONS, SIDECAR_SUFFIX, BATCH_MAX_TOKENS, BATCH_MAX_BYTES,
+                    is_sidecar, read_sidecar)
+
+# Gemini token accounting (per the API docs)
+IMAGE_TILE = 768              # Images larger than 384px are tiled into 768x768 crops
+TOKENS_PER_TILE = 258
+VIDEO_TOKENS_PER_SEC = 263    # 1 sampled frame per second + the audio track
+AUDIO_TOKENS_PER_SEC = 32
+FILE_OVERHEAD_TOKENS = 40     # Inventory line and file reference per file
+BATCH_OVERHEAD_TOKENS = 1500  # Prompt plus headroom for the response
+
+# Fallback bytes per second of media when the duration can't be read
+BYTES_PER_SEC = {".wav": 32000, ".flac": 18000, ".ogg": 3000, ".mp4": 60000}
+
+Batch = namedtuple("Batch", "files tokens bytes")
+
+
+def image_tokens(width, height):
+    if width <= 384 and height <= 384:
+        return TOKENS_PER_TILE
+    return math.ceil(width / IMAGE_TILE) * math.ceil(height / IMAGE_TILE) * TOKENS_PER_TILE
+
+
+def media_duration(path):
+    """Duration in seconds of an audio/video file, or None if unknown.
+    Speech clips carry it in their time-map sidecar; otherwise read the header."""
+    timemap = read_sidecar(path).get("timemap")
+    if timemap and timemap.get("duration"):
+        return timemap["duration"]
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == ".wav":
+            with wave.open(path, "rb") as wf:
+                return wf.getnframes() / wf.getframerate()
+        if ext == ".mp4":
+            duration = mp4_duration(path)
+            if duration:
+                return duration
+            cap = cv2.VideoCapture(path)
+            try:
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            finally:
+                cap.release()
+            if fps > 0 and frames > 0:
+                return frames / fps
+    except Exception:
+        pass
+    return None
+
+
+def mp4_duration(path):
+    """Duration in seconds from an MP4's movie header (moov/mvhd), or None.
+    Unlike frame count / fps it is right for the variable-frame-rate clips
+    the ffmpeg writer produces (repeated frames dropped)."""
+    try:
+        with open(path, "rb") as f:
+            moov = _find_box(f, 0, os.path.getsize(path), b"moov")
+            mvhd = moov and _find_box(f, *moov, b"mvhd")
+            if not mvhd:
+                return None
+            f.seek(mvhd[0])
+            version = f.read(4)[0]
+            if version == 1:
+                f.seek(16, os.SEEK_CUR)  # 64-bit creation/modification times
+                timescale, duration = struct.unpack(">IQ", f.read(12))
+            else:
+                f.seek(8, os.SEEK_CUR)
+                timescale, duration = struct.unpack(">II", f.read(8))
+    except (OSError, struct.error, IndexError):
+        return None
+    return duration / timescale if timescale else None
+
+
+def _find_box(f, start, end, kind):
+    """(payload start, end) of the first `kind` box between two file offsets."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, box = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size, header = struct.unpack(">Q", f.read(8))[0], 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return None
+        if box == kind:
+            return pos + header, pos + size
+        pos += size
+    return None
+
+
+def estimate_cost(path):
+    """Estimated (prompt tokens, upload bytes) of one media file."""
+    size = os.path.getsize(path)
+    ext = os.path.splitext(path)[1].lower()
+    tokens = FILE_OVERHEAD_TOKENS
+    if ext == ".jpg":
+        try:
+            with Image.open(path) as img:  # reads the header only
+                tokens += image_tokens(*img.size)
+        except Exception:
+            tokens += image_tokens(1280, 720)
+    elif ext in AUDIO_EXTENSIONS or ext == ".mp4":
+        duration = media_duration(path)
+        if duration is None:
+            duration = size / BYTES_PER_SEC.get(ext, 32000)
+        rate = VIDEO_TOKENS_PER_SEC if ext == ".mp4" else AUDIO_TOKENS_PER_SEC
+        tokens += int(duration * rate)
+    return tokens, size
+
+
+def plan_batches(files, max_tokens=BATCH_MAX_TOKENS, max_bytes=BATCH_MAX_BYTES):
+    """Split `files` (sorted by timestamp) into time-contiguous sub-batches whose
+    estimated tokens and bytes stay under budget. Sidecars stay with their media;
+    a single file over budget gets a batch of its own.
+    """
+    sidecars = {f[:-len(SIDECAR_SUFFIX)]: f for f in files if is_sidecar(f)}
+    batches = []
+    current, tokens, nbytes = [], BATCH_OVERHEAD_TOKENS, 0
+    for path in files:
+        if is_sidecar(path):
+            continue
+        try:
+            cost, size = estimate_cost(path)
+        except OSError:
+            cost, size = FILE_OVERHEAD_TOKENS, 0
+        if current and (tokens + cost > max_tokens or nbytes + size > max_bytes):
+            batches.append(Batch(current, tokens, nbytes))
+            current, tokens, nbytes = [], BATCH_OVERHEAD_TOKENS, 0
+        current.append(path)
+        if path in sidecars:
+            current.append(sidecars.pop(path))
+        tokens += cost
+        nbytes += size
+
+    # Sidecars whose media isn't in this round (e.g. quarantined) ride along at the end
+    current.extend(sidecars.values())
+    if current:
+        batches.append(Batch(current, tokens, nbytes))
+    return batches
@@ -0,0 +1,199 @@
+import os
+import re
+import json
+import threading
+from .utils import AUDIO_EXTENSIONS
+
+RECORDS_NAME = "batches.jsonl"
+
+_CLOCK = re.compile(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?$")
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_BATCH_PREFIX = '{"batch": '
+_lock = threading.Lock()
+
+_ENTRIES = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "time": {"type": "STRING", "description": "HH:MM:SS，取自文件清单中的实际时间"},
+            "text": {"type": "STRING"},
+        },
+        "required": ["time", "text"],
+    },
+}
+
+# Gemini response schema for one batch (the API's OpenAPI subset)
+RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "start": {"type": "STRING", "description": "本批次内容的开始时间 HH:MM:SS"},
+        "end": {"type": "STRING", "description": "本批次内容的结束时间 HH:MM:SS"},
+        "summary": {"type": "STRING", "description": "一两句话的整体总结"},
+        "transcript": dict(_ENTRIES, description="语音转录，每段语音一条；没有语音文件则为空"),
+        "events": dict(_ENTRIES, description="关键事件，忽略不变化的画面"),
+    },
+    "required": ["start", "end", "transcript", "events"],
+}
+
+
+def records_file(log_file):
+    """The batches.jsonl sidecar next to a Research_Log.md."""
+    return os.path.join(os.path.dirname(log_file), RECORDS_NAME)
+
+
+def _clock(value):
+    """"9:05:03" → "09:05:03"; anything that isn't a clock time is kept as is."""
+    value = str(value).strip().strip("[]")
+    match = _CLOCK.match(value)
+    if not match:
+        return value
+    h, m, s = match.groups()
+    return f"{int(h):02d}:{m}:{s or '00'}"
+
+
+def parse_response(text):
+    """The structured body of a schema response: start, end, summary,
+    transcript and events ([{"time", "text"}]). Raises ValueError if the
+    model didn't answer in the schema."""
+    data = json.loads(_FENCE.sub("", text.strip()))
+    if not isinstance(data, dict):
+        raise ValueError("response is not a JSON object")
+    body = {"start": _clock(data.get("start", "")), "end": _clock(data.get("end", "")),
+            "summary": str(data.get("summary") or "").strip()}
+    for key in ("transcript", "events"):
+        entries = data.get(key) or []
+        if not isinstance(entries, list):
+            raise ValueError(f"'{key}' is not a list")
+        body[key] = [{"time": _clock(e.get("time", "")), "text": str(e.get("text", "")).strip()}
+                     for e in entries if isinstance(e, dict) and str(e.get("text", "")).strip()]
+    return body
+
+
+def render_body(record):
+    """The note's markdown, in the layout the free-form prompt used to ask for.
+    A record of a non-schema response just carries its markdown."""
+    if "markdown" in record:
+        return record["markdown"]
+    lines = [f"## 📋 时间段总结 [{record['start']} - {record['end']}]", ""]
+    if record.get("summary"):
+        lines += [record["summary"], ""]
+    lines.append("### 🗣️ 语音转录")
+    lines += [f"- **[{e['time']}]** {e['text']}" for e in record["transcript"]] or ["- (无语音片段)"]
+    lines += ["", "### 📝 关键事件"]
+    lines += [f"- **[{e['time']}]** {e['text']}" for e in record["events"]] or ["- (无变化)"]
+    return "\n".join(lines)
+
+
+def file_references(files, rel_archive):
+    """Markdown section with links to the batch's archived media files."""
+    screenshots = []
+    audio_clips = []
+    video_clips = []
+
+    for fname in files:
+        rel_path = f"{rel_archive}/{fname}"
+        if fname.endswith(".jpg"):
+            screenshots.append(f"![{fname}]({rel_path})")
+        elif fname.endswith(AUDIO_EXTENSIONS):
+            audio_clips.append(f"- 🎙️ [{fname}]({rel_path})")
+        elif fname.endswith(".mp4"):
+            video_clips.append(f"- 🎬 [{fname}]({rel_path})")
+
+    parts = ["<details>\n<summary>📎 本次分析的原始素材</summary>\n"]
+
+    if screenshots:
+        parts.append("**截图:**")
+        for s in screenshots:
+            parts.append(s)
+        parts.append("")
+
+    if audio_clips:
+        parts.append("**语音:**")
+        parts.extend(audio_clips)
+        parts.append("")
+
+    if video_clips:
+        parts.append("**录屏:**")
+        parts.extend(video_clips)
+        parts.append("")
+
+    parts.append("</details>")
+    return "\n".join(parts)
+
+
+def render_note(record):
+    """The full Research_Log.md note for a batch record."""
+    refs = file_references(record["files"], record["archive"]) if record.get("archive") else ""
+    return f"\n---\n\n> **[Batch Analysis: {record['analyzed']}]**\n\n{render_body(record)}\n\n{refs}\n\n---\n"
+
+
+# ── batches.jsonl: one record per line, "batch" always the first key ──
+
+def append_record(path, record, durable=False):
+    """Append a record; returns its byte offset. A torn last line left by a
+    crash is cut off first so it can't swallow this record."""
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    with _lock, open(path, "a+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        if end:
+            f.seek(end - 1)
+            if f.read(1) != b"\n":
+                f.seek(0)
+                end = f.read().rfind(b"\n") + 1
+                f.truncate(end)
+        f.write(line)
+        f.flush()
+        if durable:
+            os.fsync(f.fileno())
+    return end
+
+
+def iter_records(path, offset=0):
+    """Stream (offset, record) from byte `offset` on, skipping a torn or unreadable line."""
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return
+    with f:
+        f.seek(offset)
+        for line in f:
+            if line.endswith(b"\n"):
+                try:
+                    yield offset, json.loads(line)
+                except ValueError:
+                    pass
+            offset += len(line)
+
+
+def read_record(path, offset):
+    """The record at a byte offset (from append_record / record_offsets)."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+
+def record_offsets(path):
+    """batch ID → byte offset of its record, without decoding the records."""
+    offsets = {}
+    for offset, line in _lines(path):
+        if line.startswith(_BATCH_PREFIX):
+            try:
+                batch_id, _ = json.JSONDecoder().raw_decode(line, len(_BATCH_PREFIX))
+            except ValueError:
+                continue
+            if batch_id:
+                offsets[batch_id] = offset
+    return offsets
+
+
+def _lines(path):
+    offset = 0
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                if line.endswith(b"\n"):
+                    yield offset, line.decode("utf-8", errors="replace")
+                offset += len(line)
+    except OSError:
+        return
@@ -0,0 +1,374 @@
+import os
+import time
+import sqlite3
+import datetime
+import threading
+from .utils import AUDIO_EXTENSIONS, Session, catalog_path
+from .upload_cache import file_hash
+from .batch_planner import media_duration
+from .note_index import cjk_terms, fts_query, parse_notes, parse_records
+from .batch_records import records_file
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    name TEXT PRIMARY KEY,
+    created REAL,
+    first_active REAL,
+    last_active REAL,
+    recorded_seconds REAL NOT NULL DEFAULT 0,
+    batches INTEGER NOT NULL DEFAULT 0,
+    failed_batches INTEGER NOT NULL DEFAULT 0,
+    files INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    speech_seconds REAL NOT NULL DEFAULT 0,
+    log_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    session TEXT NOT NULL,
+    lane TEXT,
+    state TEXT,
+    started REAL,
+    finished REAL,
+    files INTEGER,
+    bytes INTEGER,
+    first_file TEXT,
+    last_file TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    session TEXT NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT,
+    size INTEGER,
+    duration REAL,
+    sha256 TEXT,
+    batch TEXT,
+    state TEXT,
+    updated REAL,
+    PRIMARY KEY (session, name)
+);
+CREATE INDEX IF NOT EXISTS batches_by_session ON batches (session, started);
+CREATE INDEX IF NOT EXISTS files_by_hash ON files (sha256);
+"""
+
+# Full-text index of the transcript / key-event bullets (needs SQLite with FTS5).
+# `terms` holds cjk_terms(text): CJK is indexed as bigrams, so Chinese needs no word segmenter.
+NOTES_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS notes USING fts5 (
+    terms, text UNINDEXED, session UNINDEXED, batch UNINDEXED, analyzed UNINDEXED,
+    kind UNINDEXED, clock UNINDEXED, tokenize = 'unicode61'
+);
+CREATE TABLE IF NOT EXISTS indexed_logs (
+    session TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    tail BLOB                   -- last bytes before `offset`, to notice a rewritten log
+);
+"""
+TAIL_BYTES = 64
+
+
+def media_type(name):
+    """Catalog type of a session file, or None for sidecars and anything else."""
+    if name.endswith(".jpg"):
+        return "screenshot"
+    if name.endswith(AUDIO_EXTENSIONS):
+        return "speech"
+    if name.endswith(".mp4"):
+        return "video"
+    return None
+
+
+class Catalog:
+    """Cross-session SQLite index of sessions, analysis batches and media
+    files (data/catalog.sqlite).
+
+    Kept current as sessions are created, recorded and analyzed, with the
+    per-session totals maintained on each write, so listing years of
+    sessions is one small query instead of a walk over every directory.
+    Also holds the full-text index of the research logs' notes.
+    Writes never raise: a broken catalog must not stop a recording.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.search_enabled = False
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️ Catalog unavailable ({path}): {e}")
+            self._db = None
+            return
+        try:
+            self._db.executescript(NOTES_SCHEMA)
+            if "tail" not in {row["name"] for row in self._db.execute("PRAGMA table_info(indexed_logs)")}:
+                self._db.execute("ALTER TABLE indexed_logs ADD COLUMN tail BLOB")
+            self.search_enabled = True
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Note search unavailable (SQLite without FTS5): {e}")
+
+    def _write(self, statements):
+        """Run (sql, params) statements in one transaction."""
+        with self._lock:
+            if self._db is None:
+                return
+            try:
+                with self._db:
+                    for sql, params in statements:
+                        self._db.execute(sql, params)
+            except sqlite3.Error as e:
+                print(f"⚠️ Catalog update failed: {e}")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            if self._db is None:
+                return []
+            return self._db.execute(sql, params).fetchall()
+
+    # ── Writers ──
+
+    def add_session(self, name, created=None):
+        self._write([("INSERT INTO sessions (name, created) VALUES (?, ?) ON CONFLICT (name) DO NOTHING",
+                      (name, created or time.time()))])
+
+    def record_activity(self, name, start, end):
+        """The Logger recorded from `start` to `end` (UNIX times)."""
+        self.add_session(name)
+        self._write([("""UPDATE sessions SET first_active = MIN(COALESCE(first_active, ?), ?),
+                                             last_active = MAX(COALESCE(last_active, ?), ?),
+                                             recorded_seconds = recorded_seconds + ?
+                         WHERE name = ?""", (start, start, end, end, max(0.0, end - start), name))])
+
+    def begin_batch(self, session, batch_id, lane, files):
+        """A batch over `files` (paths in processing/) was claimed for analysis."""
+        media = sorted(f for f in files if media_type(f))
+        size = 0
+        for f in media:
+            try:
+                size += os.path.getsize(f)
+            except OSError:
+                pass
+        first, last = (os.path.basename(media[0]), os.path.basename(media[-1])) if media else (None, None)
+        self._write([("""INSERT OR REPLACE INTO batches (id, session, lane, state, started, files, bytes,
+                                                         first_file, last_file)
+                         VALUES (?, ?, ?, 'claimed', ?, ?, ?, ?, ?)""",
+                      (batch_id, session, lane, time.time(), len(media), size, first, last))])
+
+    def finish_batch(self, session, batch_id, success, files, log_file=None, hashes=True):
+        """Record a batch's outcome and where its files ended up.
+        `files` are (path, state) pairs: state "archived", "pending" or "quarantined"."""
+        now = time.time()
+        statements = []
+        counted = [0, 0, 0.0]  # archived files, bytes, seconds of speech
+        for path, state in files:
+            name = os.path.basename(path)
+            kind = media_type(name)
+            if not kind:
+                continue
+            size, duration, sha = _describe(path, kind, hashes)
+            statements.append(("""INSERT OR REPLACE INTO files (session, name, type, size, duration, sha256,
+                                                               batch, state, updated)
+                                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                               (session, name, kind, size, duration, sha, batch_id, state, now)))
+            if state == "archived":
+                counted[0] += 1
+                counted[1] += size or 0
+                counted[2] += duration if kind == "speech" and duration else 0.0
+        if batch_id:
+            statements.append(("UPDATE batches SET state = ?, finished = ? WHERE id = ?",
+                               ("archived" if success else "returned", now, batch_id)))
+        log_bytes = _size(log_file) if log_file else None
+        statements.append(("""UPDATE sessions SET batches = batches + ?, failed_batches = failed_batches + ?,
+                                                  files = files + ?, bytes = bytes + ?,
+                                                  speech_seconds = speech_seconds + ?,
+                                                  log_bytes = COALESCE(?, log_bytes),
+                                                  last_active = MAX(COALESCE(last_active, ?), ?)
+                              WHERE name = ?""",
+                           (int(bool(batch_id and success)), int(bool(batch_id and not success)),
+                            counted[0], counted[1], counted[2], log_bytes, now, now, session)))
+        self.add_session(session)
+        self._write(statements)
+
+    def index_session(self, session):
+        """Backfill a session recorded before the catalog existed (one directory walk)."""
+        self.add_session(session.name, _created(session))
+        files = []
+        for state, directory in (("archived", session.archive_dir), ("pending", session.pending_dir),
+                                 ("pending", session.processing_dir), ("quarantined", session.quarantine_dir)):
+            try:
+                files.extend((os.path.join(directory, n), state) for n in sorted(os.listdir(directory)))
+            except OSError:
+                pass
+        self.finish_batch(session.name, None, True, files, session.log_file, hashes=False)
+        batches = 0
+        try:
+            with open(session.log_file, encoding="utf-8", errors="replace") as f:
+                batches = sum(1 for line in f if "[Batch Analysis:" in line)
+        except OSError:
+            pass
+        # Activity span from the media timestamps, not from the time of indexing
+        mtimes = [os.path.getmtime(p) for p, _ in files if media_type(p) and os.path.exists(p)]
+        created = _created(session)
+        self._write([("UPDATE sessions SET batches = ?, first_active = ?, last_active = ? WHERE name = ?",
+                      (batches, min(mtimes, default=created), max(mtimes, default=created), session.name))])
+
+    def index_log(self, session, log_file):
+        """Index the notes appended to a session's research log since the last
+        call. Returns the number of bullets added.
+
+        Reads the structured batch records (batches.jsonl) when the session has
+        them, else the Markdown log of a session recorded before them. A source
+        that shrank or was rewritten, e.g. a log cleaned by tools/clean_log.py
+        --in-place, is indexed again from the start."""
+        if not self.search_enabled:
+            return 0
+        records = records_file(log_file)
+        source, parse = (records, parse_records) if os.path.exists(records) else (log_file, parse_notes)
+        rows = self._query("SELECT offset, tail FROM indexed_logs WHERE session = ?", (session,))
+        offset, tail = (rows[0]["offset"], rows[0]["tail"] or b"") if rows else (0, b"")
+        try:
+            with open(source, "rb") as f:
+                size = f.seek(0, os.SEEK_END)
+                reset = size < offset
+                if not reset and tail:
+                    f.seek(offset - len(tail))
+                    reset = f.read(len(tail)) != tail
+                if reset:
+                    offset = 0
+                if size == offset:
+                    return 0
+                f.seek(offset)
+                data = f.read(size - offset)
+                data = data[:data.rfind(b"\n") + 1]  # whole lines only
+                end = offset + len(data)
+                f.seek(max(0, end - TAIL_BYTES))
+                tail = f.read(end - f.tell())
+        except OSError:
+            return 0
+
+        entries = parse(data.decode("utf-8", errors="replace"))
+        statements = [("DELETE FROM notes WHERE session = ?", (session,))] if reset else []
+        statements += [("""INSERT INTO notes (terms, text, session, batch, analyzed, kind, clock)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                        (cjk_terms(e.text), e.text, session, e.batch, e.analyzed, e.kind, e.clock))
+                       for e in entries]
+        statements.append(("""INSERT INTO indexed_logs (session, offset, tail) VALUES (?, ?, ?)
+                              ON CONFLICT (session) DO UPDATE SET offset = excluded.offset, tail = excluded.tail""",
+                           (session, end, tail)))
+        self._write(statements)
+        return len(entries)
+
+    def forget_log(self, session):
+        """Drop a session's note index; the next index_log() rebuilds it (after a log rewrite)."""
+        self._write([("DELETE FROM notes WHERE session = ?", (session,)),
+                     ("DELETE FROM indexed_logs WHERE session = ?", (session,))])
+
+    # ── Queries ──
+
+    def names(self):
+        return {row["name"] for row in self._query("SELECT name FROM sessions")}
+
+    def sessions(self, since=None):
+        """Session rows (oldest first), optionally only those active since a UNIX time."""
+        if since is None:
+            return self._query("SELECT * FROM sessions ORDER BY name")
+        return self._query("SELECT * FROM sessions WHERE COALESCE(last_active, created) >= ? ORDER BY name",
+                           (since,))
+
+    def totals(self, since=None):
+        """Totals over sessions, plus archived files and bytes per media type."""
+        active = "COALESCE(s.last_active, s.created) >= ?" if since is not None else "1"
+        params = () if since is None else (since,)
+        summary = self._query(f"""SELECT COUNT(*) AS sessions, SUM(recorded_seconds) AS recorded_seconds,
+                                         SUM(batches) AS batches, SUM(failed_batches) AS failed_batches,
+                                         SUM(files) AS files, SUM(bytes) AS bytes,
+                                         SUM(speech_seconds) AS speech_seconds, SUM(log_bytes) AS log_bytes
+                                  FROM sessions s WHERE {active}""", params)
+        by_type = self._query(f"""SELECT f.type, COUNT(*) AS files, SUM(f.size) AS bytes, SUM(f.duration) AS seconds
+                                  FROM files f JOIN sessions s ON s.name = f.session
+                                  WHERE f.state = 'archived' AND {active}
+                                  GROUP BY f.type ORDER BY f.type""", params)
+        return (summary[0] if summary else None), by_type
+
+    def search(self, query, since=None, limit=20):
+        """Best-matching note bullets for `query` (BM25), each with the path of the
+        archived media nearest before it, or None. Rows: session, batch, analyzed,
+        kind, clock, text, media."""
+        match = fts_query(query)
+        if not self.search_enabled or not match:
+            return []
+        active = "session IN (SELECT name FROM sessions WHERE COALESCE(last_active, created) >= ?)"
+        sql = f"""SELECT session, batch, analyzed, kind, clock, text FROM notes
+                  WHERE notes MATCH ? {'AND ' + active if since is not None else ''}
+                  ORDER BY bm25(notes) LIMIT ?"""
+        params = (match, since, limit) if since is not None else (match, limit)
+        try:
+            rows = self._query(sql, params)
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ Bad search query ({match}): {e}")
+            return []
+        return [dict(row, media=self.media_near(row["session"], row["batch"], row["kind"], row["clock"]))
+                for row in rows]
+
+    def media_near(self, session, batch, kind, clock):
+        """Archived file a note bullet refers to: the latest clip (for speech) or
+        screen capture (for events) starting at or before `clock`, from the same batch if known."""
+        types = ("speech", "speech") if kind == "speech" else ("video", "screenshot")
+        bound = clock.replace(":", "") + "~"  # names start with HHMMSS_
+        for batch_filter in ((batch,) if batch else ()) + (None,):
+            rows = self._query(f"""SELECT name FROM files
+                                   WHERE session = ? AND type IN (?, ?) AND state = 'archived' AND name <= ?
+                                   {'AND batch = ?' if batch_filter else ''}
+                                   ORDER BY name DESC LIMIT 1""",
+                               (session, *types, bound) + ((batch_filter,) if batch_filter else ()))
+            if rows:
+                return os.path.join(Session(session).archive_dir, rows[0]["name"])
+        return None
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog():
+    """The process-wide Catalog for the current data directory."""
+    path = catalog_path()
+    with _catalogs_lock:
+        if path not in _catalogs:
+            _catalogs[path] = Catalog(path)
+        return _catalogs[path]
+
+
+def _describe(path, kind, hashes=True):
+    """(size, duration, sha256) of a file; None for whatever can't be read."""
+    size = _size(path)
+    if size is None:
+        return None, None, None
+    duration = media_duration(path) if kind in ("speech", "video") else None
+    sha = None
+    if hashes:
+        try:
+            sha = file_hash(path)
+        except OSError:
+            pass
+    return size, duration, sha
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def _created(session):
+    """Creation time from a "session_YYYYmmdd_HHMMSS" name, else the directory's mtime."""
+    try:
+        return datetime.datetime.strptime(session.name, "session_%Y%m%d_%H%M%S").timestamp()
+    except ValueError:
+        return os.path.getmtime(session.base_dir)
@@ -0,0 +1,98 @@
+import os
+import queue
+import subprocess
+import threading
+import time
+from .utils import AUDIO_CODEC, OPUS_BITRATE, PARTIAL_SUFFIX, publish_file
+
+# codec → (extension, ffmpeg output format, ffmpeg codec args)
+CODECS = {
+    "flac": (".flac", "flac", ["-c:a", "flac", "-compression_level", "5"]),
+    "opus": (".ogg", "ogg", ["-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip"]),
+}
+
+
+def encode_audio(src, dst, codec):
+    """Encode a WAV file with ffmpeg. Raises CalledProcessError on failure."""
+    _, fmt, args = CODECS[codec]
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+         "-f", "wav", "-i", src, *args, "-f", fmt, dst],
+        check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+
+
+class ClipEncoder:
+    """Compresses finished speech clips with ffmpeg on a background thread.
+
+    SegmentWriter hands over the finished `.wav.part` file; the encoder writes
+    `<clip><ext>.part`, publishes it (sidecar first, then rename) and deletes
+    the WAV. If ffmpeg fails the clip is published as plain WAV instead, so
+    no audio is lost. The VAD thread never waits on an encode.
+    """
+
+    def __init__(self, codec=AUDIO_CODEC):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown audio codec: {codec}")
+        self.codec = codec
+        self.extension = CODECS[codec][0]
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+        # Stats
+        self.clips = 0
+        self.audio_seconds = 0.0
+        self.encode_seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def submit(self, wav_partial, final_path, meta=None, duration=0.0):
+        """Queue a finished WAV for encoding into `final_path`."""
+        self._queue.put((wav_partial, final_path, meta, duration))
+
+    def close(self):
+        """Finish all queued encodes and stop the worker."""
+        self._queue.put(None)
+        self._thread.join()
+
+    @property
+    def compression_ratio(self):
+        return self.bytes_in / self.bytes_out if self.bytes_out else 0.0
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            self._encode(*job)
+
+    def _encode(self, wav_partial, final_path, meta, duration):
+        out_partial = final_path + PARTIAL_SUFFIX
+        start = time.perf_counter()
+        try:
+            encode_audio(wav_partial, out_partial, self.codec)
+            size_in = os.path.getsize(wav_partial)
+            publish_file(out_partial, final_path, meta)
+            os.remove(wav_partial)
+        except Exception as e:
+            err = e.stderr.decode(errors="ignore").strip() if isinstance(e, subprocess.CalledProcessError) else e
+            print(f"⚠️ {self.codec} encode failed for {os.path.basename(final_path)}, keeping WAV: {err}")
+            try:
+                if os.path.exists(out_partial):
+                    os.remove(out_partial)
+                wav_path = os.path.splitext(final_path)[0] + ".wav"
+                publish_file(wav_partial, wav_path, meta)
+            except Exception as e2:
+                print(f"❌ Error saving WAV: {e2}")
+            return
+
+        elapsed = time.perf_counter() - start
+        size_out = os.path.getsize(final_path)
+        self.clips += 1
+        self.audio_seconds += duration
+        self.encode_seconds += elapsed
+        self.bytes_in += size_in
+        self.bytes_out += size_out
+        print(f"💾 Audio saved: {os.path.basename(final_path)} "
+              f"({size_in // 1024} KB → {size_out // 1024} KB, {elapsed:.2f}s)")
@@ -0,0 +1,230 @@
+import os
+import wave
+import datetime
+from .utils import (CHANNELS, RATE, CHUNK_SIZE, MAX_CLIP_SECONDS, PARTIAL_SUFFIX,
+                    TRIM_MARGIN_MS, COMPACT_PAUSES, MAX_PAUSE_MS, publish_file)
+
+CHUNK_SECONDS = CHUNK_SIZE / RATE
+
+
+class SegmentWriter:
+    """Streams a speech segment to disk as it is recorded.
+
+    The WAV is opened when speech triggers and each chunk is appended as it
+    arrives, so memory stays constant however long the user talks. The file is
+    written under a `.part` name (ignored by the Analyzer) and published on
+    close, after `wave` has patched the RIFF header: renamed into place, or
+    handed to a ClipEncoder that publishes the compressed clip. Segments
+    longer than `max_seconds` are split into consecutive clips.
+    """
+
+    def __init__(self, directory, name="_speech_clip", max_seconds=MAX_CLIP_SECONDS, encoder=None):
+        self.directory = directory
+        self.name = name
+        self.max_frames = int(max_seconds * RATE)
+        self.encoder = encoder
+        self._wf = None
+        self._path = None
+        self._partial = None
+        self._frames = 0
+        self.on_close = None  # called with (final_path, duration); may return sidecar metadata
+
+    @property
+    def is_open(self):
+        return self._wf is not None
+
+    @property
+    def path(self):
+        """Final path of the clip currently being written."""
+        return self._path
+
+    @property
+    def duration(self):
+        return self._frames / RATE
+
+    def open(self, timestamp=None):
+        """Start a new clip named `<HHMMSS><name>.<ext>`. Returns its final path."""
+        ts = (timestamp or datetime.datetime.now()).strftime("%H%M%S")
+        base = os.path.join(self.directory, f"{ts}{self.name}")
+        self._path = base + (self.encoder.extension if self.encoder else ".wav")
+        self._partial = base + ".wav" + PARTIAL_SUFFIX
+        self._wf = wave.open(self._partial, 'wb')
+        self._wf.setnchannels(CHANNELS)
+        self._wf.setsampwidth(2)  # 16-bit
+        self._wf.setframerate(RATE)
+        self._frames = 0
+        return self._path
+
+    def write(self, chunk, timestamp=None):
+        """Append one chunk. Returns the path of a finalized clip if the
+        max-length limit forced a split, else None. `timestamp` names the
+        clip that starts with this chunk after a split (default: now).
+        """
+        rotated = None
+        if self._frames + len(chunk) // 2 > self.max_frames:
+            rotated = self.close()
+            self.open(timestamp)
+        # writeframesraw skips the per-call header patch; close() patches once
+        self._wf.writeframesraw(chunk)
+        self._frames += len(chunk) // 2
+        return rotated
+
+    def close(self):
+        """Finalize the clip and publish it. Returns its final path (None if empty)."""
+        if not self._wf:
+            return None
+        path, partial, frames = self._path, self._partial, self._frames
+        try:
+            self._wf.close()
+            if frames:
+                meta = self.on_close(path, frames / RATE) if self.on_close else None
+                if self.encoder:
+                    self.encoder.submit(partial, path, meta, frames / RATE)
+                else:
+                    publish_file(partial, path, meta)
+                    print(f"💾 Audio saved: {os.path.basename(path)} ({frames // CHUNK_SIZE} frames)")
+            else:
+                os.remove(partial)
+                path = None
+        except Exception as e:
+            print(f"❌ Error saving WAV: {e}")
+            path = None
+        finally:
+            self._wf = None
+            self._path = None
+            self._partial = None
+            self._frames = 0
+        return path
+
+    def discard(self):
+        """Abort the current clip and delete the partial file."""
+        if not self._wf:
+            return
+        try:
+            self._wf.close()
+            os.remove(self._partial)
+        except Exception:
+            pass
+        finally:
+            self._wf = None
+            self._path = None
+            self._partial = None
+            self._frames = 0
+
+
+class SpeechTrimmer:
+    """Trims silence from a speech segment on its way into a SegmentWriter.
+
+    Uses the per-chunk VAD decisions already computed by the VAD loop:
+    - leading: only `margin_ms` of the pre-roll before the first speech chunk is kept
+    - trailing: only `margin_ms` of the closing silence is kept
+    - internal: pauses longer than `max_pause_ms` keep `margin_ms` on each side
+
+    Silence is held (bounded by the VAD padding) until the next speech chunk
+    or the end of the segment decides its fate. Each clip gets a sidecar time
+    map (start, cuts, trimmed tail) so transcript timestamps can be mapped
+    back to wall-clock time.
+    """
+
+    def __init__(self, writer, margin_ms=TRIM_MARGIN_MS, compact=COMPACT_PAUSES,
+                 max_pause_ms=MAX_PAUSE_MS):
+        self.writer = writer
+        self.writer.on_close = self._finish_clip
+        self.margin = max(1, int(margin_ms / 1000 / CHUNK_SECONDS))
+        self.max_pause = int(max_pause_ms / 1000 / CHUNK_SECONDS) if compact else None
+        self._held = []        # silent chunks awaiting a decision
+        self._origin = None    # wall-clock time of the first pre-roll chunk
+        self._src = 0          # source chunks consumed since the origin
+        self._clip = None      # time map of the clip being written
+        self.removed_seconds = 0.0
+
+    def open(self, now, preroll):
+        """Start a segment. `preroll` is a sequence of (chunk, is_speech) ending
+        with the triggering chunk; returns the clip path.
+        """
+        preroll = list(preroll)
+        self._origin = now - datetime.timedelta(seconds=len(preroll) * CHUNK_SECONDS)
+        self._held = []
+
+        first = next((i for i, (_, speech) in enumerate(preroll) if speech), len(preroll) - 1)
+        keep_from = max(0, first - self.margin)
+        self._src = keep_from
+        self.removed_seconds += keep_from * CHUNK_SECONDS
+
+        path = self.writer.open(now)
+        self._new_clip()
+        for chunk, speech in preroll[keep_from:]:
+            self.feed(chunk, speech)
+        return path
+
+    def feed(self, chunk, is_speech):
+        """Route one chunk. Returns the start time (the name) of a new clip begun
+        by a max-length split, if any, so the screen clip can take the same name."""
+        if not is_speech:
+            self._held.append(chunk)
+            return None
+
+        rotated = None
+        held, self._held = self._held, []
+        if self.max_pause is not None and len(held) > self.max_pause:
+            cut = len(held) - 2 * self.margin
+            rotated = self._write_all(held[:self.margin]) or rotated
+            self._clip["cuts"].append({
+                "at": round(self.writer.duration, 3),
+                "removed": round(cut * CHUNK_SECONDS, 3),
+                "resumes": self._wall(self._src + cut).strftime("%H:%M:%S.%f")[:-3],
+            })
+            self._src += cut
+            self.removed_seconds += cut * CHUNK_SECONDS
+            rotated = self._write_all(held[-self.margin:]) or rotated
+        else:
+            rotated = self._write_all(held) or rotated
+        return self._write(chunk) or rotated
+
+    def close(self):
+        """End the segment, trimming the trailing silence. Returns the clip path."""
+        if not self.writer.is_open:
+            return None
+        held, self._held = self._held, []
+        self._write_all(held[:self.margin])
+        tail = max(0, len(held) - self.margin)
+        self._clip["trimmed_tail"] = round(tail * CHUNK_SECONDS, 3)
+        self.removed_seconds += tail * CHUNK_SECONDS
+        return self.writer.close()
+
+    def discard(self):
+        self._held = []
+        self._clip = None
+        self.writer.discard()
+
+    def _write(self, chunk):
+        start = self._wall(self._src)
+        rotated = self.writer.write(chunk, start)
+        self._src += 1
+        return start if rotated else None
+
+    def _write_all(self, chunks):
+        rotated = None
+        for chunk in chunks:
+            rotated = self._write(chunk) or rotated
+        return rotated
+
+    def _wall(self, src_chunks):
+        return self._origin + datetime.timedelta(seconds=src_chunks * CHUNK_SECONDS)
+
+    def _new_clip(self):
+        self._clip = {
+            "start": self._wall(self._src).strftime("%H:%M:%S.%f")[:-3],
+            "cuts": [],
+            "trimmed_tail": 0.0,
+        }
+
+    def _finish_clip(self, path, duration):
+        """SegmentWriter.on_close hook: return the time map as sidecar metadata,
+        then start a fresh one in case this close is a max-length split."""
+        clip = self._clip
+        self._new_clip()
+        if clip is None:
+            return None
+        clip["duration"] = round(duration, 3)
+        return {"timemap": clip}
@@ -0,0 +1,129 @@
+import os
+import time
+import json
+import uuid
+import random
+import asyncio
+import datetime
+import threading
+from collections import deque
+from types import SimpleNamespace
+
+
+class ResourceExhausted(Exception):
+    """Stand-in for google.api_core.exceptions.ResourceExhausted (HTTP 429)."""
+    code = 429
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ServiceUnavailable(Exception):
+    """Stand-in for google.api_core.exceptions.ServiceUnavailable (HTTP 503)."""
+    code = 503
+
+
+class FakeBackend:
+    """Offline stand-in for the Gemini file + generate API.
+
+    Same interface as gemini_client.GeminiBackend: blocking `upload`, `get`
+    and `delete` (run in worker threads by the pipeline) and an async
+    `generate`. Simulates a fixed RPC latency, upload time proportional to
+    file size, a random processing delay before a file turns ACTIVE (or
+    FAILED) and a random generation latency, plus random 503s and a
+    requests-per-minute quota answered with 429 + retry-after. Select it
+    with ANALYZER_BACKEND=fake, or pass one to Analyzer / batch_analyze.
+    """
+
+    name = "fake"
+    available = True
+
+    def __init__(self, rpc_latency=0.05, upload_bandwidth=4e6, active_delay=(0.5, 3.0),
+                 generate_latency=(2.0, 6.0), requests_per_minute=None, error_rate=0.0,
+                 processing_failure_rate=0.0, seed=None):
+        self.rpc_latency = rpc_latency
+        self.upload_bandwidth = upload_bandwidth  # bytes/s per upload
+        self.active_delay = active_delay
+        self.generate_latency = generate_latency
+        self.requests_per_minute = requests_per_minute
+        self.error_rate = error_rate
+        self.processing_failure_rate = processing_failure_rate
+        self._random = random.Random(seed)
+        self._files = {}  # remote name → (display name, ready_at, final state)
+        self._window = deque()  # admitted request times (quota)
+        self._lock = threading.Lock()
+
+        # Stats
+        self.calls = {"upload": 0, "get": 0, "delete": 0, "generate": 0}
+        self.errors = {429: 0, 503: 0}
+        self.bytes_uploaded = 0
+
+    def _admit(self, call):
+        """Count the call, then maybe reject it like the server would."""
+        with self._lock:
+            self.calls[call] += 1
+            now = time.monotonic()
+            if self.requests_per_minute:
+                while self._window and now - self._window[0] >= 60:
+                    self._window.popleft()
+                if len(self._window) >= self.requests_per_minute:
+                    self.errors[429] += 1
+                    retry_after = 60 - (now - self._window[0])
+                    raise ResourceExhausted(f"429 quota exceeded ({call})", retry_after=retry_after)
+                self._window.append(now)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors[503] += 1
+                raise ServiceUnavailable(f"503 backend unavailable ({call})")
+
+    def upload(self, path, mime_type=None):
+        self._admit("upload")
+        size = os.path.getsize(path)
+        time.sleep(self.rpc_latency + size / self.upload_bandwidth)
+        name = f"files/{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            ready_at = time.monotonic() + self._random.uniform(*self.active_delay)
+            failed = self._random.random() < self.processing_failure_rate
+            self._files[name] = (os.path.basename(path), ready_at, "FAILED" if failed else "ACTIVE")
+            self.bytes_uploaded += size
+        return self._remote(name)
+
+    def get(self, name):
+        self._admit("get")
+        time.sleep(self.rpc_latency)
+        return self._remote(name)
+
+    def delete(self, name):
+        self._admit("delete")
+        time.sleep(self.rpc_latency)
+        with self._lock:
+            self._files.pop(name, None)
+
+    async def generate(self, parts, schema=None):
+        self._admit("generate")
+        with self._lock:
+            delay = self._random.uniform(*self.generate_latency)
+        await asyncio.sleep(delay)
+        names = [p.display_name for p in parts if not isinstance(p, str)]
+        if schema:
+            return json.dumps({"start": "--:--:--", "end": "--:--:--", "summary": "fake", "transcript": [],
+                               "events": [{"time": "--:--:--", "text": f"(fake) {n}"} for n in names]},
+                              ensure_ascii=False)
+        lines = [f"- **[--:--:--]** (fake) {n}" for n in names]
+        return "## 📋 时间段总结 [fake]\n\n### 📝 关键事件\n" + "\n".join(lines)
+
+    @property
+    def remote_files(self):
+        """Uploads not deleted yet."""
+        with self._lock:
+            return len(self._files)
+
+    def _remote(self, name):
+        with self._lock:
+            if name not in self._files:
+                raise KeyError(f"{name} not found")
+            display_name, ready_at, final_state = self._files[name]
+        state = final_state if time.monotonic() >= ready_at else "PROCESSING"
+        expires = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=48)
+        return SimpleNamespace(name=name, display_name=display_name,
+                               state=SimpleNamespace(name=state), expiration_time=expires)
@@ -0,0 +1,92 @@
+import numpy as np
+import cv2
+from .utils import SCREEN_DIFF_THRESHOLD, PHASH_MAX_DISTANCE
+
+
+def luma_thumbnail(frame, size):
+    """Downsample a BGR frame to a small int16 luma image (area-averaged)."""
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+def perceptual_hash(frame):
+    """64-bit DCT perceptual hash of a BGR frame."""
+    gray = cv2.cvtColor(cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    low = cv2.dct(gray.astype(np.float32))[:8, :8].flatten()
+    bits = low > np.median(low[1:])  # DC term excluded from the median
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class FrameChangeDetector:
+    """Cheap change detection on a downsampled luma thumbnail.
+
+    The thumbnail is split into a grid of tiles; a frame counts as changed
+    when any tile's mean absolute difference from the reference exceeds
+    `threshold`. The reference only moves on a change, so slow drift (e.g.
+    a gentle scroll) accumulates until it is detected.
+    """
+
+    def __init__(self, threshold=SCREEN_DIFF_THRESHOLD, grid=(8, 8), tile=(8, 6)):
+        self.threshold = threshold
+        self.grid = grid
+        self.tile = tile
+        self.size = (grid[0] * tile[0], grid[1] * tile[1])  # (width, height)
+        self._reference = None
+
+    def reset(self):
+        self._reference = None
+
+    def tile_diffs(self, thumb):
+        """Per-tile mean absolute luma difference against the reference."""
+        gw, gh = self.grid
+        tw, th = self.tile
+        diff = np.abs(thumb - self._reference)
+        return diff.reshape(gh, th, gw, tw).mean(axis=(1, 3))
+
+    def differs(self, frame):
+        """True if `frame` differs visibly from the reference (without adopting it)."""
+        if self._reference is None:
+            return True
+        return self.tile_diffs(luma_thumbnail(frame, self.size)).max() > self.threshold
+
+    def adopt(self, frame):
+        self._reference = luma_thumbnail(frame, self.size)
+
+    def changed(self, frame):
+        """Return True (and adopt `frame` as the new reference) if it differs visibly."""
+        thumb = luma_thumbnail(frame, self.size)
+        if self._reference is None or self.tile_diffs(thumb).max() > self.threshold:
+            self._reference = thumb
+            return True
+        return False
+
+
+class ScreenshotDeduper:
+    """Decides whether a screenshot is near-identical to the last kept one.
+
+    Both checks must agree: the perceptual hash catches global changes
+    (a new page, a different window) while the tile diff catches small local
+    ones the hash is blind to (a highlighted line, typed text).
+    """
+
+    def __init__(self, max_distance=PHASH_MAX_DISTANCE, threshold=SCREEN_DIFF_THRESHOLD):
+        self.max_distance = max_distance
+        self._tiles = FrameChangeDetector(threshold=threshold)
+        self._hash = None
+
+    def is_duplicate(self, frame):
+        """True if `frame` matches the last kept frame. Call `keep()` after saving a frame."""
+        if self._hash is None:
+            return False
+        if hamming(perceptual_hash(frame), self._hash) > self.max_distance:
+            return False
+        return not self._tiles.differs(frame)
+
+    def keep(self, frame):
+        """Adopt `frame` as the reference for later comparisons."""
+        self._hash = perceptual_hash(frame)
+        self._tiles.adopt(frame)
@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from .utils import PARTIAL_SUFFIX, TRIGGER_POLL_INTERVAL
+
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class _Inotify:
+    """Minimal inotify binding (Linux): close-after-write and rename-into events."""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {directory}")
+
+    def read_names(self):
+        names = []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        i = 0
+        while i + _EVENT.size <= len(data):
+            _, _, _, length = _EVENT.unpack_from(data, i)
+            name = data[i + _EVENT.size:i + _EVENT.size + length].rstrip(b"\0")
+            names.append(os.fsdecode(name))
+            i += _EVENT.size + length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PendingWatcher:
+    """Reports files finalized in a directory (renamed into place or closed
+    after writing); `.part` files are ignored.
+
+    Uses inotify where available, so an idle directory costs nothing; other
+    platforms (or inotify errors) fall back to listing the directory every
+    `poll_interval` seconds. `interrupt()` wakes a blocked `wait()`.
+    """
+
+    def __init__(self, directory, poll_interval=TRIGGER_POLL_INTERVAL):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._inotify = None
+        self._wake_r = self._wake_w = None
+        self._interrupted = threading.Event()
+        self._known = None
+        if sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify(directory)
+                self._wake_r, self._wake_w = os.pipe()
+            except (OSError, AttributeError) as e:
+                print(f"⚠️ inotify unavailable ({e}), polling {os.path.basename(directory)}/ instead")
+                self._inotify = None
+        if self._inotify is None:
+            self._known = self._listing()
+
+    @property
+    def backend(self):
+        return "inotify" if self._inotify else "polling"
+
+    def wait(self, timeout=None):
+        """Block until files are finalized, the timeout passes or interrupt()
+        is called. Returns the new file names (empty on timeout/interrupt)."""
+        if self._inotify:
+            return self._wait_inotify(timeout)
+        return self._wait_polling(timeout)
+
+    def interrupt(self):
+        self._interrupted.set()
+        if self._wake_w is not None:
+            os.write(self._wake_w, b"\0")
+
+    def close(self):
+        self.interrupt()
+        if self._inotify:
+            self._inotify.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._inotify = None
+            self._wake_r = self._wake_w = None
+
+    def _wait_inotify(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + max(0.0, timeout)
+        while not self._interrupted.is_set():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                ready, _, _ = select.select([self._inotify.fd, self._wake_r], [], [], remaining)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if self._wake_r in ready:
+                os.read(self._wake_r, 64)
+            if self._inotify.fd in ready:
+                names = [n for n in self._inotify.read_names() if n and not n.endswith(PARTIAL_SUFFIX)]
+                if names:
+                    return names
+            if not ready and deadline is not None:
+                return []
+        self._interrupted.clear()
+        return []
+
+    def _wait_polling(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + max(0.0, timeout)
+        while True:
+            current = self._listing()
+            names = sorted(current - self._known)
+            self._known = current
+            if names:
+                return names
+            step = self.poll_interval
+            if deadline is not None:
+                step = min(step, deadline - time.monotonic())
+                if step <= 0:
+                    return []
+            if self._interrupted.wait(step):
+                self._interrupted.clear()
+                return []
+
+    def _listing(self):
+        try:
+            return {n for n in os.listdir(self.directory) if not n.endswith(PARTIAL_SUFFIX)}
+        except OSError:
+            return set()
@@ -2,9 +2,21 @@ import google.generativeai as genai
 from PIL import Image
 import os
 import time
+import shutil
+import asyncio
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from .utils import API_KEY, MODEL_NAME
+import functools
+import threading
+from .utils import (API_KEY, MODEL_NAME, ANALYZER_BACKEND, AUDIO_EXTENSIONS, QUARANTINE_AFTER,
+                    SPEECH_LANE_CONCURRENCY, BULK_LANE_CONCURRENCY,
+                    PREUPLOAD_CONCURRENCY, PREUPLOAD_BYTES_PER_SEC, KEYFRAMES_ENABLED, STRUCTURED_NOTES,
+                    is_sidecar, read_sidecar, sidecar_path)
+from .upload_cache import file_hash
+from .readiness import ReadinessTracker
+from .rate_limit import ApiLimiter
+from .keyframes import extract_keyframes, discard_keyframes
+from .log_lock import log_lock
+from .batch_records import RESPONSE_SCHEMA, parse_response, render_note, records_file, append_record
 
 
 def configure_genai():
@@ -19,87 +31,289 @@ def configure_genai():
         return None
 
 
-# Global model instance
-model = configure_genai()
+# Global model instance, configured on first use rather than at import
+_model = None
+_model_configured = False
+_model_lock = threading.Lock()
 
 
-def batch_analyze(file_list, output_file, archive_dir=None):
+def get_model():
+    """The configured GenerativeModel (None if the API key is missing or invalid)."""
+    global _model, _model_configured
+    with _model_lock:
+        if not _model_configured:
+            _model = configure_genai()
+            _model_configured = True
+        return _model
+
+# Output part of the prompt: free-form markdown, or the fields of RESPONSE_SCHEMA
+MARKDOWN_FORMAT = """2. **结构化总结**：生成Markdown格式的总结。
+
+输出格式：
+## 📋 时间段总结 [HH:MM:SS - HH:MM:SS] （这个批次的所有内容的整体时间范围）
+
+### 🗣️ 语音转录（根据语音片段，如果没有语音文件则为空，这个批次内所有语音片段）
+- **[HH:MM:SS]** (转录内容...)
+或者
+- (无语音片段)
+
+### 📝 关键事件（根据这个批次内所有截图和录屏，忽略不变化的事件）
+- **[HH:MM:SS]** (事件描述...)
+"""
+
+STRUCTURED_FORMAT = """2. **结构化总结**：按给定的 JSON 结构输出。
+
+字段说明：
+- start / end：这个批次的所有内容的整体时间范围（HH:MM:SS）
+- summary：一两句话概括这段时间在做什么
+- transcript：语音转录，这个批次内所有语音片段，每段一条 {time, text}；如果没有语音文件则为空数组
+- events：关键事件，根据这个批次内所有截图和录屏，每条 {time, text}，忽略不变化的事件
+"""
+
+# Explicit MIME types for formats mimetypes may not know on every platform
+MIME_TYPES = {".flac": "audio/flac", ".ogg": "audio/ogg"}
+
+
+class GeminiBackend:
+    """Live Gemini API. File calls are blocking SDK calls (run in worker
+    threads by the pipeline); generation uses the SDK's async client.
+
+    Backends share this interface: blocking `upload(path, mime_type)`,
+    `get(name)` and `delete(name)`, async `generate(parts, schema=None)` →
+    text (JSON in `schema` when one is given), and an `available` flag
+    (see fake_backend.FakeBackend for the offline one).
+    """
+
+    name = "gemini"
+
+    def __init__(self, model=None):
+        self._model = model
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = get_model()
+        return self._model
+
+    @property
+    def available(self):
+        return self.model is not None
+
+    def upload(self, path, mime_type=None):
+        return genai.upload_file(path=path, mime_type=mime_type)
+
+    def get(self, name):
+        return genai.get_file(name)
+
+    def delete(self, name):
+        genai.delete_file(name)
+
+    async def generate(self, parts, schema=None):
+        config = None
+        if schema:
+            config = genai.GenerationConfig(response_mime_type="application/json", response_schema=schema)
+        response = await self.model.generate_content_async(parts, generation_config=config)
+        return response.text
+
+
+class Stages:
+    """Limits shared by every batch on one event loop: the ApiLimiter under
+    every Gemini call (rate buckets, adaptive per-call-kind concurrency,
+    retries), per-lane generate slots so bulk heartbeat summaries never
+    hold up speech notes, the background upload budget, plus the set of
+    fire-and-forget cleanup tasks. Must be created inside the running loop."""
+
+    def __init__(self, generate=None, pre_upload=PREUPLOAD_CONCURRENCY,
+                 pre_upload_rate=PREUPLOAD_BYTES_PER_SEC):
+        generate = generate or {"speech": SPEECH_LANE_CONCURRENCY, "bulk": BULK_LANE_CONCURRENCY}
+        self.limiter = ApiLimiter()
+        self.generate = {lane: asyncio.Semaphore(n) for lane, n in generate.items()}
+        self.pre_upload = asyncio.Semaphore(pre_upload)
+        self.pre_upload_rate = pre_upload_rate
+        self.uploading = {}       # content hash → Event set when its background upload ends
+        self._paced_until = 0.0
+        self._cleanup = set()
+
+    async def pace(self, nbytes):
+        """Reserve `nbytes` of the background upload rate; sleeps until the slot starts."""
+        now = time.monotonic()
+        start = max(now, self._paced_until)
+        self._paced_until = start + nbytes / self.pre_upload_rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def spawn_cleanup(self, coro):
+        """Run `coro` in the background; drain() waits for it."""
+        task = asyncio.ensure_future(coro)
+        self._cleanup.add(task)
+        task.add_done_callback(self._cleanup.discard)
+
+    async def drain(self):
+        while self._cleanup:
+            await asyncio.gather(*list(self._cleanup), return_exceptions=True)
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call in the loop's executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+def append_log(output_file, note_content, durable=False):
+    # Under the log's lock, so tools/clean_log.py --in-place can't rewrite it mid-append
+    with log_lock(output_file), open(output_file, "a", encoding="utf-8") as f:
+        f.write(note_content)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def batch_analyze(file_list, output_file, archive_dir=None, manifest=None, quarantine_dir=None, backend=None,
+                  keyframe_dir=None):
+    """Blocking one-shot analysis of a single batch (see analyze_batch).
+    Waits for the background remote deletes before returning."""
+    async def _run():
+        stages = Stages()
+        try:
+            return await analyze_batch(file_list, output_file, archive_dir, manifest, quarantine_dir,
+                                       backend=backend, stages=stages, keyframe_dir=keyframe_dir)
+        finally:
+            await stages.drain()
+
+    return asyncio.run(_run())
+
+
+async def analyze_batch(file_list, output_file, archive_dir=None, manifest=None, quarantine_dir=None,
+                        backend=None, stages=None, write_log=None, label="", lane="bulk", keyframe_dir=None):
     """
     Upload a batch of files (images, audio, video) to Gemini and get a summary.
+
+    Runs as pipeline stages — keyframes → upload → readiness → generate →
+    log write → cleanup — each bounded by its own semaphore in `stages`, so
+    several batches can share one event loop without exceeding any limit.
+    Screen clips are sent as their scene-change keyframes where that is
+    cheaper; the inventory gives each keyframe's actual time. With
+    STRUCTURED_NOTES the model answers in RESPONSE_SCHEMA; the batch is
+    kept as a JSON record (batches.jsonl) and its note is rendered from it.
     
     Args:
         file_list: List of absolute file paths, sorted by timestamp.
         output_file: Path to Research_Log.md to append results.
         archive_dir: Path to archive directory (for embedding file links in log).
+        manifest: UploadManifest for reusing uploads across retries / --resume.
+        quarantine_dir: Where files that keep failing are moved (needs a manifest).
+        backend: GeminiBackend (default, live API) or a stand-in such as FakeBackend.
+        stages: Shared Stages; a private one is created if omitted.
+        write_log: async (output_file, note, record) → None; lets the pipeline order log
+            appends. Without it the record goes straight to batches.jsonl and the note to the log.
+        label: Batch label for progress messages.
+        lane: "speech" or "bulk"; selects the generate concurrency limit.
+        keyframe_dir: Cache for extracted keyframes; None uploads screen clips whole.
     """
-    if not model:
-        print("❌ Model not configured. Check your .env file.")
+    backend = _resolve_backend(backend)
+    if backend is None:
         return False
+    stages = stages or Stages()
+    tag = f"[{label}] " if label else ""
 
+    # Sidecars (e.g. trim time maps) annotate the inventory but are never uploaded
+    file_list = [f for f in file_list if not is_sidecar(f)]
     if not file_list:
-        print("  (no files to analyze)")
+        print(f"  {tag}(no files to analyze)")
         return True
 
-    print(f"  📤 Uploading {len(file_list)} files to Gemini (parallel)...")
-    uploaded_files = []
+    uploaded = {}   # upload path → remote file
+    hashes = {}     # upload path → content hash (manifest key)
+    sources = {}    # upload path → analyzed file (a keyframe's screen clip, else itself)
+    failed = []
     content_parts = []
+    timings = {}
 
     try:
-        # Upload all files in parallel
-        def _upload_one(fpath):
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    uploaded = genai.upload_file(path=fpath)
-                    print(f"    ✅ {os.path.basename(fpath)}")
-                    return uploaded
-                except Exception as e:
-                    if attempt < max_retries - 1:
-                        wait_time = 2 ** attempt
-                        print(f"    ⚠️ Upload failed ({os.path.basename(fpath)}), retrying in {wait_time}s... ({e})")
-                        time.sleep(wait_time)
-                    else:
-                        raise e
-
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            futures = {executor.submit(_upload_one, fp): fp for fp in file_list}
-            for future in as_completed(futures):
-                fpath = futures[future]
-                try:
-                    uploaded_files.append(future.result())
-                except Exception as e:
-                    print(f"    ❌ Failed to upload {os.path.basename(fpath)}: {e}")
-
-        if not uploaded_files:
-            print("  ❌ No files were uploaded successfully.")
+        # ── Stage 0: replace screen clips by their scene-change keyframes ──
+        t0 = time.monotonic()
+        reduced = await _reduce_media(file_list, keyframe_dir)
+        for fpath in file_list:
+            for path in ([kf.path for kf in reduced[fpath].frames] if fpath in reduced else [fpath]):
+                sources[path] = fpath
+        if reduced:
+            sets = reduced.values()
+            print(f"  🎞️ {tag}{len(reduced)} screen clips → {sum(len(k.frames) for k in sets)} keyframes: "
+                  f"{sum(k.video_bytes for k in sets) / 1e6:.1f} MB → {sum(k.bytes for k in sets) / 1e6:.1f} MB, "
+                  f"~{sum(k.video_tokens for k in sets):,} → ~{sum(k.tokens for k in sets):,} tokens")
+            timings["keyframes"] = time.monotonic() - t0
+
+        # ── Stage 1: upload, reusing remote copies the manifest still knows about ──
+        print(f"  📤 {tag}Uploading {len(sources)} files to Gemini (parallel)...")
+        t0 = time.monotonic()
+        results = await asyncio.gather(
+            *(_upload_one(path, backend, stages, manifest, hashes) for path in sources),
+            return_exceptions=True)
+        for fpath, result in zip(sources, results):
+            if isinstance(result, Exception):
+                print(f"    ❌ Failed to upload {os.path.basename(fpath)}: {result}")
+                failed.append(fpath)
+            else:
+                uploaded[fpath] = result
+        timings["upload"] = time.monotonic() - t0
+
+        # ── Stage 2: wait for files to become ACTIVE (all polled concurrently) ──
+        print(f"  ⏳ {tag}Waiting for files to be processed...")
+        t0 = time.monotonic()
+        async def _get(name):
+            return await stages.limiter.call("poll", backend.get, name)
+
+        ready = await ReadinessTracker(_get).wait_all(uploaded)
+        for fpath, (state, seconds) in sorted(ready.items(), key=lambda kv: kv[1][1]):
+            fname = os.path.basename(fpath)
+            if state == "ACTIVE":
+                print(f"    ⏱️ {fname}: ACTIVE after {seconds:.1f}s")
+                if manifest:
+                    manifest.set_state(hashes[fpath], "ACTIVE")
+            else:
+                print(f"    ⚠️ {fname}: {state} after {seconds:.1f}s")
+                del uploaded[fpath]
+                failed.append(fpath)
+        timings["ready"] = time.monotonic() - t0
+
+        # Repeat offenders go to quarantine; anything else fails the batch for a retry
+        failed = list(dict.fromkeys(sources[path] for path in failed))
+        if failed and _quarantine(failed, manifest, hashes, quarantine_dir):
+            print(f"  ❌ {tag}Some files failed; batch will be retried (finished uploads are kept for reuse).")
+            return False
+
+        file_list = [fp for fp in file_list if fp not in failed]
+        if not file_list:
+            print(f"  ❌ {tag}No files were uploaded successfully.")
             return False
 
-        # Wait for files to become ACTIVE
-        print("  ⏳ Waiting for files to be processed...")
-        for uf in uploaded_files:
-            _wait_for_active(uf)
+        uploaded_files = [uploaded[path] for path in sources if sources[path] in file_list]
 
         # Build file inventory with explicit timestamps
         inventory_lines = []
         for fpath in file_list:
             fname = os.path.basename(fpath)
-            # Parse timestamp from filename "HHMMSS_..."
-            try:
-                ts_str = fname.split("_")[0]
-                if len(ts_str) == 6 and ts_str.isdigit():
-                    t_obj = datetime.datetime.strptime(ts_str, "%H%M%S")
-                    time_fmt = t_obj.strftime("%H:%M:%S")
-                else:
-                    time_fmt = "UNKNOWN"
-            except:
-                time_fmt = "UNKNOWN"
-            
+            meta = read_sidecar(fpath)
+            t_obj = _file_time(fname)
+            if t_obj and meta.get("starts_at"):
+                # A clip whose encoder died mid-way only holds its tail
+                t_obj += datetime.timedelta(seconds=meta["starts_at"])
+            time_fmt = t_obj.strftime("%H:%M:%S") if t_obj else "UNKNOWN"
+
+            if fpath in reduced:
+                for kf in reduced[fpath].frames:
+                    kf_time = (t_obj + datetime.timedelta(seconds=kf.offset)).strftime("%H:%M:%S") if t_obj else "UNKNOWN"
+                    inventory_lines.append(f"- [{kf_time}] 录屏关键帧: {os.path.basename(kf.path)}"
+                                           f"（录屏 {fname} 第 {kf.offset:.1f}s）")
+                continue
+
             ftype = "未知"
             if fname.endswith(".jpg"): ftype = "截图"
-            elif fname.endswith(".wav"): ftype = "语音"
+            elif fname.endswith(AUDIO_EXTENSIONS): ftype = "语音"
             elif fname.endswith(".mp4"): ftype = "录屏"
             
-            inventory_lines.append(f"- [{time_fmt}] {ftype}: {fname}")
+            note = _describe_sidecar(meta)
+            inventory_lines.append(f"- [{time_fmt}] {ftype}: {fname}{note}")
         
         inventory_str = "\n".join(inventory_lines)
 
@@ -111,115 +325,250 @@ def batch_analyze(file_list, output_file, archive_dir=None):
 {inventory_str}
 
 **请严格基于上述时间点（[HH:MM:SS]）生成时间轴。**
+语音片段已剪除静音；若清单中标注了删去的停顿，请按标注把片段内的时间换算为实际时间。
 
 数据包含：
-- **语音片段** (.wav)：用户在看论文/写代码时说的话
+- **语音片段** (.wav/.flac/.ogg)：用户在看论文/写代码时说的话
 - **屏幕录像** (.mp4)：与语音同步的屏幕录制
+- **录屏关键帧** (.jpg)：从屏幕录像中按画面变化提取的关键帧，清单中的时间即该画面出现的实际时间
 - **定时截图** (.jpg)：每10秒自动截取的屏幕画面
 
 请按照时间顺序，完成以下任务：
-1. **逐字转录**：如果没有.wav文件则为空，否则将每段语音转录为文字。**自动过滤掉无意义的语气词（如“嗯”、“啊”、“那个”、“就是”等），只保留有意义的内容。**
-2. **结构化总结**：生成Markdown格式的总结。
-
-输出格式：
-## 📋 时间段总结 [HH:MM:SS - HH:MM:SS] （这个批次的所有内容的整体时间范围）
-
-### 🗣️ 语音转录（根据语音片段，如果没有.wav文件则为空，这个批次内所有语音片段）
-- **[HH:MM:SS]** (转录内容...)
-或者
-- (无语音片段)
-
-### 📝 关键事件（根据这个批次内所有截图和录屏，忽略不变化的事件）
-- **[HH:MM:SS]** (事件描述...)
-
+1. **逐字转录**：如果没有语音文件则为空，否则将每段语音转录为文字。**自动过滤掉无意义的语气词（如“嗯”、“啊”、“那个”、“就是”等），只保留有意义的内容。**
+{STRUCTURED_FORMAT if STRUCTURED_NOTES else MARKDOWN_FORMAT}
 """
         content_parts.append(prompt)
         content_parts.extend(uploaded_files)
 
-        print("  🧠 Analyzing with Gemini...")
-        response = model.generate_content(content_parts)
+        # ── Stage 3: generate ──
+        print(f"  🧠 {tag}Analyzing with Gemini...")
+        t0 = time.monotonic()
+        schema = RESPONSE_SCHEMA if STRUCTURED_NOTES else None
+        async with stages.generate[lane]:
+            response_text = await stages.limiter.call("generate", backend.generate, content_parts, schema)
+        timings["generate"] = time.monotonic() - t0
 
-        # Build file reference section
-        file_refs = _build_file_references(file_list, output_file, archive_dir)
-
-        # Write to log
+        # The batch record ("batch" is filled in by the pipeline); the note is rendered from it
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        note_content = f"\n---\n\n> **[Batch Analysis: {timestamp}]**\n\n{response.text}\n\n{file_refs}\n\n---\n"
+        record = {"batch": None, "analyzed": timestamp, "lane": lane,
+                  "files": [os.path.basename(f) for f in file_list],
+                  "archive": os.path.relpath(archive_dir, os.path.dirname(output_file)) if archive_dir else None}
+        try:
+            if not schema:
+                raise ValueError("no schema requested")
+            record.update(parse_response(response_text))
+        except ValueError as e:
+            if schema:
+                print(f"  ⚠️ {tag}Response not in the schema ({e}), keeping it as markdown")
+            record["markdown"] = response_text
+
+        # ── Stage 4: write to log ──
+        note_content = render_note(record)
+
+        t0 = time.monotonic()
+        if write_log:
+            await write_log(output_file, note_content, record)
+        else:
+            await run_blocking(append_record, records_file(output_file), record)
+            await run_blocking(append_log, output_file, note_content)
+        timings["write"] = time.monotonic() - t0
+
+        print(f"  ✅ {tag}分析完成, 写入: {os.path.basename(output_file)} "
+              f"({', '.join(f'{k} {v:.1f}s' for k, v in timings.items())})")
+
+        # ── Stage 5: cleanup cloud uploads in the background ──
+        for fpath, uf in uploaded.items():
+            stages.spawn_cleanup(_delete_remote(backend, stages, uf.name))
+            if manifest:
+                manifest.forget(hashes[fpath])
+        for fpath in reduced:
+            stages.spawn_cleanup(run_blocking(discard_keyframes, fpath, keyframe_dir))
 
-        with open(output_file, "a", encoding="utf-8") as f:
-            f.write(note_content)
+        return True
+
+    except Exception as e:
+        print(f"  ❌ {tag}Batch analysis error: {e}")
+        return False
 
-        print(f"  ✅ 分析完成, 写入: {os.path.basename(output_file)}")
 
-        # Cleanup cloud uploads
-        for uf in uploaded_files:
+async def _upload_one(fpath, backend, stages, manifest, hashes):
+    fname = os.path.basename(fpath)
+    if manifest:
+        sha = hashes[fpath] = await run_blocking(file_hash, fpath)
+        if sha in stages.uploading:
+            # Already being uploaded in the background: wait for that instead of uploading twice
+            await stages.uploading[sha].wait()
+        entry = manifest.lookup(sha)
+        if entry:
             try:
-                uf.delete()
-            except:
+                remote = await stages.limiter.call("poll", backend.get, entry["name"])
+                if remote.state.name in ("ACTIVE", "PROCESSING"):
+                    print(f"    ♻️ {fname} (already uploaded)")
+                    return remote
+            except Exception:
                 pass
+            manifest.forget(sha)
+
+    # Retries (429 / 5xx / connection errors, honoring Retry-After) happen inside the limiter
+    mime = MIME_TYPES.get(os.path.splitext(fpath)[1].lower())
+    size = await run_blocking(os.path.getsize, fpath)
+    remote = await stages.limiter.call("upload", backend.upload, fpath, mime_type=mime, nbytes=size)
+    print(f"    ✅ {fname}")
+    if manifest:
+        manifest.record_upload(hashes[fpath], fname, remote.name, _expiry(remote))
+    return remote
+
+
+async def pre_upload(fpath, backend, stages, manifest, keyframe_dir=None):
+    """Upload a file finalized in pending/ ahead of its batch and record the
+    handle in the manifest, so analyze_batch only has to reuse it. Screen
+    clips are reduced to their keyframes first, like the batch will. Rate-limited
+    by `stages.pre_upload` and the background byte rate. Returns True if uploaded."""
+    backend = _resolve_backend(backend)
+    if backend is None or manifest is None:
+        return False
+    reduced = await _reduce_media([fpath], keyframe_dir)
+    paths = [kf.path for kf in reduced[fpath].frames] if fpath in reduced else [fpath]
+    results = await asyncio.gather(*(_pre_upload_one(path, backend, stages, manifest) for path in paths))
+    return any(results)
 
-        return True
 
+async def _pre_upload_one(fpath, backend, stages, manifest):
+    fname = os.path.basename(fpath)
+    try:
+        sha = await run_blocking(file_hash, fpath)
+        size = os.path.getsize(fpath)
+    except OSError:
+        return False  # already picked up by an analysis round
+    if sha in stages.uploading or manifest.lookup(sha):
+        return False
+
+    done = stages.uploading[sha] = asyncio.Event()
+    try:
+        async with stages.pre_upload:
+            await stages.pace(size)
+            if not os.path.exists(fpath):
+                return False
+            mime = MIME_TYPES.get(os.path.splitext(fpath)[1].lower())
+            remote = await stages.limiter.call("upload", backend.upload, fpath, mime_type=mime, nbytes=size)
+        manifest.record_upload(sha, fname, remote.name, _expiry(remote))
+        print(f"    ⏫ Pre-uploaded {fname}")
+        return True
     except Exception as e:
-        print(f"  ❌ Batch analysis error: {e}")
+        print(f"    ⚠️ Pre-upload failed ({fname}), the batch will upload it: {e}")
         return False
+    finally:
+        del stages.uploading[sha]
+        done.set()
+
+
+def create_backend(name=ANALYZER_BACKEND):
+    """Backend by name: "gemini" (live API) or "fake" (offline stand-in)."""
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "fake":
+        from .fake_backend import FakeBackend
+        return FakeBackend()
+    raise ValueError(f"Unknown analyzer backend: {name}")
+
+
+def _resolve_backend(backend):
+    """The given backend, or the configured default (None if it isn't usable)."""
+    if backend is None:
+        backend = create_backend()
+    if not backend.available:
+        print("❌ Model not configured. Check your .env file.")
+        return None
+    return backend
+
+
+async def _reduce_media(file_list, keyframe_dir):
+    """Extract keyframes for the screen clips in `file_list` (in worker threads).
+    Returns clip path → KeyframeSet, leaving out clips cheaper to send whole."""
+    if not keyframe_dir or not KEYFRAMES_ENABLED:
+        return {}
+    clips = [fp for fp in file_list if fp.endswith(".mp4")]
+    results = await asyncio.gather(*(run_blocking(extract_keyframes, fp, keyframe_dir) for fp in clips),
+                                   return_exceptions=True)
+    reduced = {}
+    for fpath, result in zip(clips, results):
+        if isinstance(result, Exception):
+            print(f"    ⚠️ Keyframe extraction failed ({os.path.basename(fpath)}), uploading the video: {result}")
+        elif result:
+            reduced[fpath] = result
+    return reduced
+
+
+async def _delete_remote(backend, stages, name):
+    try:
+        await stages.limiter.call("delete", backend.delete, name)
+    except Exception:
+        pass
+
+
+def _describe_sidecar(meta):
+    """Render sidecar metadata as an inventory annotation (empty if none)."""
+    if "unchanged_until" in meta or "unchanged_since" in meta:
+        notes = []
+        if meta.get("unchanged_since"):
+            notes.append(f"自 {meta['unchanged_since']} 起画面未变化")
+        if meta.get("unchanged_until"):
+            notes.append(f"画面保持不变至 {meta['unchanged_until']}")
+        return "（" + "，".join(notes) + "）"
+
+    if meta.get("starts_at"):
+        return f"（录屏前 {meta['starts_at']:.0f}s 因编码中断缺失，清单时间为剩余部分的起始）"
+
+    timemap = meta.get("timemap")
+    if not timemap:
+        return ""
+    notes = [f"实际起始 {timemap['start'][:8]}"]
+    for cut in timemap.get("cuts", []):
+        m, sec = divmod(cut["at"], 60)
+        notes.append(f"片段 {int(m):02d}:{sec:04.1f} 处删去 {cut['removed']:.1f}s 停顿，之后对应实际 {cut['resumes'][:8]}")
+    return "（已剪除静音；" + "；".join(notes) + "）"
 
 
-def _build_file_references(file_list, output_file, archive_dir):
-    """Build markdown section with links to archived media files."""
-    if not archive_dir:
-        return ""
+def _file_time(fname):
+    """Wall-clock time from a "HHMMSS_..." file name (a datetime on 1900-01-01), or None."""
+    ts_str = fname.split("_")[0]
+    if len(ts_str) == 6 and ts_str.isdigit():
+        try:
+            return datetime.datetime.strptime(ts_str, "%H%M%S")
+        except ValueError:
+            pass
+    return None
+
 
-    # Calculate relative path from Research_Log.md to archive/
-    log_dir = os.path.dirname(output_file)
-    rel_archive = os.path.relpath(archive_dir, log_dir)
+def _expiry(remote):
+    """Expiry of an uploaded file as a UNIX timestamp (Gemini keeps files for 48 h)."""
+    exp = getattr(remote, "expiration_time", None)
+    try:
+        return exp.timestamp()
+    except AttributeError:
+        return time.time() + 47 * 3600
 
-    screenshots = []
-    audio_clips = []
-    video_clips = []
 
-    for fpath in file_list:
+def _quarantine(failed, manifest, hashes, quarantine_dir):
+    """Count a failure for each file; move repeat offenders (and their sidecars)
+    to quarantine. Returns the files that should still block the batch."""
+    blocking = []
+    for fpath in failed:
         fname = os.path.basename(fpath)
-        rel_path = f"{rel_archive}/{fname}"
-        if fname.endswith(".jpg"):
-            screenshots.append(f"![{fname}]({rel_path})")
-        elif fname.endswith(".wav"):
-            audio_clips.append(f"- 🎙️ [{fname}]({rel_path})")
-        elif fname.endswith(".mp4"):
-            video_clips.append(f"- 🎬 [{fname}]({rel_path})")
-
-    parts = ["<details>\n<summary>📎 本次分析的原始素材</summary>\n"]
-
-    if screenshots:
-        parts.append("**截图:**")
-        for s in screenshots:
-            parts.append(s)
-        parts.append("")
-
-    if audio_clips:
-        parts.append("**语音:**")
-        parts.extend(audio_clips)
-        parts.append("")
-
-    if video_clips:
-        parts.append("**录屏:**")
-        parts.extend(video_clips)
-        parts.append("")
-
-    parts.append("</details>")
-    return "\n".join(parts)
-
-
-def _wait_for_active(uploaded_file, timeout=120):
-    """Wait for an uploaded file to become ACTIVE (ready for use)."""
-    start = time.time()
-    while time.time() - start < timeout:
+        if not manifest or not quarantine_dir:
+            blocking.append(fpath)
+            continue
+        sha = hashes.get(fpath) or file_hash(fpath)
+        failures = manifest.record_failure(sha, fname)
+        if failures < QUARANTINE_AFTER:
+            blocking.append(fpath)
+            continue
         try:
-            f = genai.get_file(uploaded_file.name)
-            if f.state.name == "ACTIVE":
-                return True
-        except:
-            pass
-        time.sleep(2)
-    print(f"  ⚠️ File {uploaded_file.name} did not become ACTIVE in time.")
-    return False
+            for path in (fpath, sidecar_path(fpath)):
+                if os.path.exists(path):
+                    shutil.move(path, os.path.join(quarantine_dir, os.path.basename(path)))
+            print(f"    🚫 Quarantined after {failures} failures: {fname}")
+        except OSError as e:
+            print(f"    ⚠️ Could not quarantine {fname}: {e}")
+            blocking.append(fpath)
+    return blocking
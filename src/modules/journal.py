@@ -0,0 +1,133 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from .utils import PARTIAL_SUFFIX
+
+OPEN_STATES = ("claimed", "logged")   # files still in processing/
+
+BATCH_MARKER = re.compile(r"<!-- batch (\S+) -->")
+
+
+def batch_marker(batch_id):
+    """Trailer appended after a batch's note; its presence means the note was written in full."""
+    return f"<!-- batch {batch_id} -->\n"
+
+
+def logged_batches(log_file):
+    """IDs of the batches whose notes are in the research log."""
+    found = set()
+    try:
+        with open(log_file, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if "<!-- batch " in line:
+                    found.update(BATCH_MARKER.findall(line))
+    except OSError:
+        pass
+    return found
+
+
+class BatchJournal:
+    """Append-only write-ahead journal of analysis batches (`journal.jsonl`).
+
+    A batch is `claimed` (its files are in processing/) before it is
+    analyzed, `logged` once its note is in the research log, then
+    `archived` or `returned` to pending/. Each transition is one JSON line
+    and one fsync; file moves are plain renames. After a crash the
+    Analyzer replays the open batches: logged ones are archived without
+    analyzing them again, the rest go back to pending/.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._batches = {}    # id → {"lane", "files", "state"}
+        self._file_batch = {}  # file name → id of the last batch that claimed it
+        self._load()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        if lines and not lines[-1].endswith("\n"):
+            # Torn last line from a crash mid-append: drop it so the next record starts clean
+            torn = lines.pop()
+            with open(self.path, "r+b") as f:
+                f.truncate(os.path.getsize(self.path) - len(torn.encode("utf-8")))
+        for line in lines:
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError):
+                continue
+
+    def _apply(self, record):
+        batch = self._batches.setdefault(record["id"], {"lane": None, "files": [], "state": None})
+        if "files" in record:
+            batch["lane"] = record.get("lane")
+            batch["files"] = record["files"]
+            for name in record["files"]:
+                self._file_batch[name] = record["id"]
+        batch["state"] = record["state"]
+
+    def _append(self, record, sync=True):
+        record["t"] = round(time.time(), 3)
+        with self._lock:
+            self._apply(record)
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def begin(self, lane, files):
+        """Journal a new batch over `files` (paths in processing/). Returns its ID."""
+        batch_id = f"{lane}-{uuid.uuid4().hex[:8]}"
+        self._append({"id": batch_id, "state": "claimed", "lane": lane,
+                      "files": [os.path.basename(f) for f in files]})
+        return batch_id
+
+    def mark(self, batch_id, state, sync=True):
+        """Record a transition. "logged" may skip the fsync: the note's marker
+        in the research log is the durable record of it."""
+        self._append({"id": batch_id, "state": state}, sync=sync)
+
+    def state(self, batch_id):
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            return batch["state"] if batch else None
+
+    def open_batches(self):
+        """id → {"lane", "files", "state"} of batches not archived or returned yet."""
+        with self._lock:
+            return {i: dict(b) for i, b in self._batches.items() if b["state"] in OPEN_STATES}
+
+    def last_state(self, name):
+        """State of the last batch that claimed file `name` (None if never claimed)."""
+        with self._lock:
+            batch_id = self._file_batch.get(name)
+            return self._batches[batch_id]["state"] if batch_id else None
+
+    def compact(self):
+        """Rewrite the journal with just the open batches (call when nothing is in flight)."""
+        with self._lock:
+            keep = {i: b for i, b in self._batches.items() if b["state"] in OPEN_STATES}
+            tmp = self.path + PARTIAL_SUFFIX
+            with open(tmp, "w", encoding="utf-8") as f:
+                for batch_id, b in keep.items():
+                    f.write(json.dumps({"id": batch_id, "state": b["state"], "lane": b["lane"],
+                                        "files": b["files"]}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._batches = keep
+            self._file_batch = {n: i for i, b in keep.items() for n in b["files"]}
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,149 @@
+import os
+import json
+import shutil
+import threading
+from collections import namedtuple
+import cv2
+from .utils import KEYFRAME_SAMPLE_FPS, KEYFRAME_MAX_WIDTH, PARTIAL_SUFFIX
+from .frame_diff import ScreenshotDeduper
+from .batch_planner import image_tokens, media_duration, VIDEO_TOKENS_PER_SEC
+
+Keyframe = namedtuple("Keyframe", "path offset")  # offset: seconds into the clip
+KeyframeSet = namedtuple("KeyframeSet", "frames video_bytes bytes video_tokens tokens")
+
+INDEX_NAME = "index.json"
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def extract_keyframes(video_path, cache_dir, sample_fps=KEYFRAME_SAMPLE_FPS, max_width=KEYFRAME_MAX_WIDTH):
+    """Scene-change keyframes of a screen clip as a KeyframeSet, or None when
+    the clip can't be read or uploading the video itself is cheaper.
+
+    Frames are sampled at `sample_fps` and kept when they differ from the
+    last kept one (the heartbeat deduper: perceptual hash + tile diff), then
+    downscaled to `max_width` and written as JPEGs under
+    cache_dir/<clip name>/. The result is cached there, so the background
+    pre-upload and the batch see the same files (and content hashes).
+    """
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    out_dir = os.path.join(cache_dir, stem)
+    with _lock_for(out_dir):
+        cached = _read_index(out_dir)
+        if cached is not None:
+            return _keyframe_set(out_dir, cached) if cached["frames"] else None
+
+        try:
+            video_bytes = os.path.getsize(video_path)
+        except OSError:
+            return None  # moved on by an analysis round; not cached
+        scan = _scene_changes(video_path, sample_fps, max_width)
+        if scan is None:
+            return None
+        frames, duration = scan
+
+        index = {"video_bytes": video_bytes, "video_tokens": int(duration * VIDEO_TOKENS_PER_SEC),
+                 "bytes": sum(len(data) for _, data, _ in frames),
+                 "tokens": sum(tokens for _, _, tokens in frames), "frames": None}
+        os.makedirs(out_dir, exist_ok=True)
+        if frames and index["bytes"] < video_bytes and index["tokens"] < index["video_tokens"]:
+            index["frames"] = []
+            for i, (offset, data, _) in enumerate(frames):
+                name = f"{stem}_kf{i:02d}.jpg"
+                with open(os.path.join(out_dir, name), "wb") as f:
+                    f.write(data)
+                index["frames"].append([name, round(offset, 2)])
+
+        # The index is written last: it marks the directory complete
+        tmp = os.path.join(out_dir, INDEX_NAME + PARTIAL_SUFFIX)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, os.path.join(out_dir, INDEX_NAME))
+        return _keyframe_set(out_dir, index) if index["frames"] else None
+
+
+def discard_keyframes(video_path, cache_dir):
+    """Delete a clip's cached keyframes (the original video is archived)."""
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    out_dir = os.path.join(cache_dir, stem)
+    with _lock_for(out_dir):
+        shutil.rmtree(out_dir, ignore_errors=True)
+    with _locks_guard:
+        _locks.pop(out_dir, None)
+
+
+def _scene_changes(video_path, sample_fps, max_width):
+    """[(offset, jpeg bytes, tokens)] of the distinct frames and the clip
+    duration in seconds, or None if the video can't be opened.
+
+    Offsets are the frames' own timestamps and sampling goes by elapsed
+    time: the ffmpeg writer drops repeated frames (variable frame rate), so
+    frame index / fps would run early after every static stretch. A frame
+    skipped by the sampling is still checked when the next one comes a
+    sample interval or more later (a change followed by a static stretch).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+    interval = 1.0 / sample_fps
+    deduper = ScreenshotDeduper()
+    frames = []
+
+    def consider(offset, frame):
+        if deduper.is_duplicate(frame):
+            return
+        deduper.keep(frame)
+        h, w = frame.shape[:2]
+        if w > max_width:
+            frame = cv2.resize(frame, (max_width, int(h * max_width / w)), interpolation=cv2.INTER_AREA)
+            h, w = frame.shape[:2]
+        ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        if ok:
+            frames.append((offset, data.tobytes(), image_tokens(w, h)))
+
+    try:
+        next_sample = 0.0
+        last = 0.0
+        held = None  # (offset, frame): the latest frame skipped since the last sample
+        while cap.grab():
+            last = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            if last < next_sample - 1e-3:
+                held = (last, frame)
+                continue
+            if held and last - held[0] >= interval:
+                consider(*held)
+            held = None
+            next_sample = last + interval
+            consider(last, frame)
+        if held:
+            consider(*held)
+        return frames, max(media_duration(video_path) or 0.0, last)
+    finally:
+        cap.release()
+
+
+def _read_index(out_dir):
+    try:
+        with open(os.path.join(out_dir, INDEX_NAME), encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # A frame deleted behind our back invalidates the cache
+    for name, _ in index["frames"] or []:
+        if not os.path.exists(os.path.join(out_dir, name)):
+            return None
+    return index
+
+
+def _keyframe_set(out_dir, index):
+    frames = [Keyframe(os.path.join(out_dir, name), offset) for name, offset in index["frames"]]
+    return KeyframeSet(frames, index["video_bytes"], index["bytes"], index["video_tokens"], index["tokens"])
+
+
+def _lock_for(out_dir):
+    with _locks_guard:
+        return _locks.setdefault(out_dir, threading.Lock())
@@ -0,0 +1,36 @@
+import time
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_SUFFIX = ".lock"
+
+
+@contextlib.contextmanager
+def log_lock(log_file):
+    """Exclusive lock on a research log, held by every writer of it: the
+    Analyzer's appends and tools/clean_log.py rewriting it in place.
+    Blocks until the lock is free. (No heavy imports: the tools use it too.)"""
+    with open(log_file + LOCK_SUFFIX, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10 s
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
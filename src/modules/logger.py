@@ -2,9 +2,12 @@ import threading
 import time
 import datetime
 import os
-from .utils import save_wav, HEARTBEAT_INTERVAL
+from .utils import HEARTBEAT_INTERVAL, VAD_THRESHOLD, AUDIO_CODEC
 from .audio_recorder import AudioRecorder
+from .clip_writer import SegmentWriter, SpeechTrimmer
+from .clip_encoder import ClipEncoder
 from .screen_recorder import ScreenRecorder
+from .catalog import get_catalog
 
 
 class Logger:
@@ -14,10 +17,14 @@ class Logger:
         self.session = session
         self.recorder = AudioRecorder()
         self.screen = ScreenRecorder()
+        self.encoder = ClipEncoder() if AUDIO_CODEC != "wav" else None
+        self.writer = SpeechTrimmer(SegmentWriter(session.pending_dir, encoder=self.encoder))
         self._running = False
         self._paused = False  # New pause flag
         self._is_recording_speech = False  # True when currently recording a speech clip
         self._last_toggle_time = 0
+        self._reported_loss = 0  # dropped + overflowed chunks already warned about
+        self._started = None
 
     def toggle_pause(self):
         """Toggle the pause state with debounce."""
@@ -37,6 +44,8 @@ class Logger:
             return False
 
         self._running = True
+        self._started = time.time()
+        get_catalog().record_activity(self.session.name, self._started, self._started)
 
         # Start heartbeat screenshot thread
         self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
@@ -52,8 +61,27 @@ class Logger:
         self._running = False
         if self._is_recording_speech:
             self.screen.stop_recording()
+            self.writer.close()
+        stats = self.recorder.capture_stats()
+        if stats:
+            print(f"🎙️  音频采集统计: {stats}")
+        if self.encoder:
+            self.encoder.close()
+            if self.encoder.audio_seconds:
+                per_min = self.encoder.encode_seconds / (self.encoder.audio_seconds / 60)
+                print(f"🗜️  {self.encoder.codec}: 压缩比 {self.encoder.compression_ratio:.1f}x, "
+                      f"编码耗时 {per_min:.2f}s / 分钟语音")
+        if self.writer.removed_seconds:
+            print(f"✂️  已剪除静音: {self.writer.removed_seconds:.1f}s")
+        gate = self.recorder.vad.gate
+        if gate:
+            print(f"🔇 能量预门控: 跳过 {gate.skip_ratio:.0%} 的 Silero 推理 "
+                  f"({gate.skipped}/{gate.passed + gate.skipped})")
         self.recorder.close()
         self.screen.close()
+        if self._started:
+            get_catalog().record_activity(self.session.name, self._started, time.time())
+            self._started = None
 
     # ──────────────────────────────────────────────────────────
     # A1: VAD-triggered AV recording
@@ -62,77 +90,98 @@ class Logger:
         """Main VAD loop: detect speech → record audio + screen → save to pending."""
         import collections
         ring_buffer = collections.deque(maxlen=20)
-        voiced_frames = []
         triggered = False
 
         try:
             while self._running:
                 # If paused, just read and discard to keep buffer clean
                 if self._paused:
-                    self.recorder.read()
+                    self.recorder.read_available()
                     if triggered:
                         # If we were recording when paused, force stop
                         print("\n⏸️  Paused during recording - discarding segment.")
                         triggered = False
                         self._is_recording_speech = False
                         self.screen.stop_recording()
-                        voiced_frames = []
+                        self.writer.discard()
                         ring_buffer.clear()
                         self.recorder.history.clear()
                         self.recorder.reset_vad()
                     time.sleep(0.01)
                     continue
 
-                chunk = self.recorder.read()
-                is_speech = self.recorder.is_speech(chunk)
-
-                if not triggered:
-                    ring_buffer.append(chunk)
-                    if is_speech:
-                        print("🔴 检测到语音，开始录制...")
-                        triggered = True
-                        self._is_recording_speech = True
-                        voiced_frames.extend(ring_buffer)
-                        voiced_frames.append(chunk)
-
-                        # Start screen recording simultaneously
-                        ts = datetime.datetime.now().strftime("%H%M%S")
-                        video_path = os.path.join(self.session.pending_dir, f"{ts}_speech_clip.mp4")
-                        self.screen.start_recording(video_path)
+                # Queue everything the capture side has buffered, then run Silero once
+                for chunk in self.recorder.read_available():
+                    self.recorder.vad.push(chunk)
+                self._report_capture_loss()
+
+                for chunk, prob in self.recorder.vad.process():
+                    is_speech = prob > VAD_THRESHOLD
+
+                    if not triggered:
+                        ring_buffer.append((chunk, is_speech))
+                        if is_speech:
+                            print("🔴 检测到语音，开始录制...")
+                            triggered = True
+                            self._is_recording_speech = True
+
+                            # Stream audio to disk; pre-roll (incl. this chunk) is trimmed to a margin
+                            now = datetime.datetime.now()
+                            self.writer.open(now, ring_buffer)
+
+                            # Start screen recording simultaneously
+                            self._start_screen_clip(now)
                     
-                else:
-                    voiced_frames.append(chunk)
-                    if is_speech:
-                        self.recorder.history.clear()
                     else:
-                        self.recorder.history.append(chunk)
+                        rotated = self.writer.feed(chunk, is_speech)
+                        if rotated:
+                            # Max clip length reached: the screen clip takes the new audio part's name
+                            self.screen.stop_recording()
+                            self._start_screen_clip(rotated)
+                        if is_speech:
+                            self.recorder.history.clear()
+                        else:
+                            self.recorder.history.append(chunk)
                         
-                        silence_duration = len(self.recorder.history) * 32  # ~32ms per chunk
-                        print(f"🟡 静音中... {silence_duration}ms / 3000ms", end="\r")
+                            silence_duration = len(self.recorder.history) * 32  # ~32ms per chunk
+                            print(f"🟡 静音中... {silence_duration}ms / 3000ms", end="\r")
 
-                        if len(self.recorder.history) == self.recorder.history.maxlen:
-                            print("\n⏹️  语音结束，保存片段...")
-                            triggered = False
-                            self._is_recording_speech = False
+                            if len(self.recorder.history) == self.recorder.history.maxlen:
+                                print("\n⏹️  语音结束，保存片段...")
+                                triggered = False
+                                self._is_recording_speech = False
 
-                            # Stop screen recording
-                            self.screen.stop_recording()
+                                # Stop screen recording
+                                self.screen.stop_recording()
 
-                            # Save audio
-                            ts = datetime.datetime.now().strftime("%H%M%S")
-                            audio_path = os.path.join(self.session.pending_dir, f"{ts}_speech_clip.wav")
-                            save_wav(voiced_frames, audio_path)
+                                # Finalize audio (trailing silence trimmed)
+                                self.writer.close()
 
-                            # Reset
-                            voiced_frames = []
-                            ring_buffer.clear()
-                            self.recorder.history.clear()
-                            self.recorder.reset_vad()
-                            print("🎙️  继续监听中...")
+                                # Reset
+                                ring_buffer.clear()
+                                self.recorder.history.clear()
+                                self.recorder.reset_vad()
+                                print("🎙️  继续监听中...")
 
         except KeyboardInterrupt:
             print("\n👋 停止采集")
 
+    def _start_screen_clip(self, now):
+        ts = now.strftime("%H%M%S")
+        video_path = os.path.join(self.session.pending_dir, f"{ts}_speech_clip.mp4")
+        self.screen.start_recording(video_path)
+
+    def _report_capture_loss(self):
+        """Warn once per new loss event so dropped audio is never silent."""
+        stats = self.recorder.capture_stats()
+        if not stats:
+            return
+        lost = stats["dropped"] + stats["overflows"]
+        if lost > self._reported_loss:
+            self._reported_loss = lost
+            print(f"\n⚠️  音频丢帧: dropped={stats['dropped']} overflows={stats['overflows']} "
+                  f"late={stats['late']}")
+
     # ──────────────────────────────────────────────────────────
     # A2: Heartbeat screenshots
     # ──────────────────────────────────────────────────────────
@@ -165,5 +214,8 @@ class Logger:
 
             ts = datetime.datetime.now().strftime("%H%M%S")
             filepath = os.path.join(self.session.pending_dir, f"{ts}_interval_screen.jpg")
-            self.screen.take_screenshot(filepath)
-            print(f"📷 心跳截图: {os.path.basename(filepath)}")
+            saved = self.screen.take_heartbeat(filepath)
+            if saved:
+                print(f"📷 心跳截图: {os.path.basename(filepath)}")
+            elif saved is None:
+                print("📷 (画面未变化，跳过心跳截图)")
@@ -0,0 +1,103 @@
+import re
+import json
+from collections import namedtuple
+from .journal import BATCH_MARKER
+
+# Chinese/Japanese/Korean characters: no spaces between words, so they are indexed as overlapping bigrams
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_RUNS = re.compile(rf"([{_CJK}]+)|((?:(?![{_CJK}])\w)+)")
+
+_NOTE = re.compile(r"\*\*\[Batch Analysis: ([^\]]+)\]\*\*")
+_BULLET = re.compile(r"^\s*[-*]\s*\*\*\[(\d{1,2}:\d{2}:\d{2})\]\*\*\s*(.+)$")
+_CLOCK = re.compile(r"^\d{2}:\d{2}:\d{2}$")
+_SECTIONS = {"语音转录": "speech", "关键事件": "event"}
+
+Entry = namedtuple("Entry", "batch analyzed kind clock text")
+
+
+def cjk_terms(text):
+    """Index terms for `text`: lowercased words, CJK runs as overlapping bigrams
+    (a lone CJK character stays a unigram)."""
+    terms = []
+    for cjk, word in _RUNS.findall(text.lower()):
+        if word:
+            terms.append(word)
+        elif len(cjk) == 1:
+            terms.append(cjk)
+        else:
+            terms.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return " ".join(terms)
+
+
+def fts_query(query):
+    """FTS5 MATCH expression requiring every word of `query`: a CJK run becomes
+    a phrase of its bigrams, words and single characters match as prefixes."""
+    parts = []
+    for cjk, word in _RUNS.findall(query.lower()):
+        if word:
+            parts.append(f'"{word}"*')
+        elif len(cjk) == 1:
+            parts.append(f'"{cjk}"*')
+        else:
+            parts.append('"' + " ".join(cjk[i:i + 2] for i in range(len(cjk) - 1)) + '"')
+    return " ".join(parts)
+
+
+def parse_notes(text):
+    """Timestamped transcript and key-event bullets of the batch notes in a
+    chunk of Research_Log.md, as Entry(batch, analyzed, kind, clock, text).
+
+    `batch` comes from the marker after each note (None for notes written
+    before the journal); `analyzed` is the note's "Batch Analysis" time.
+    """
+    entries = []
+    note = []       # entries of the current note, waiting for its marker
+    analyzed = None
+    kind = None
+    for line in text.splitlines():
+        header = _NOTE.search(line)
+        if header:
+            entries.extend(note)
+            note, analyzed, kind = [], header.group(1).strip(), None
+            continue
+        marker = BATCH_MARKER.search(line)
+        if marker:
+            entries.extend(e._replace(batch=marker.group(1)) for e in note)
+            note, kind = [], None
+            continue
+        if line.startswith("<details"):
+            kind = None  # the file reference list
+            continue
+        if line.startswith("#"):
+            kind = next((k for title, k in _SECTIONS.items() if title in line), None)
+            continue
+        bullet = _BULLET.match(line)
+        if kind and bullet:
+            clock, body = bullet.groups()
+            if len(clock) == 7:
+                clock = "0" + clock
+            note.append(Entry(None, analyzed, kind, clock, body.strip()))
+    entries.extend(note)
+    return entries
+
+
+def parse_records(text):
+    """The same Entry list from a chunk of batches.jsonl (whole lines). A
+    record of a non-schema response carries its note's Markdown, which is
+    parsed like the log; entries without a clock time are skipped, as in
+    the log."""
+    entries = []
+    for line in text.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        batch, analyzed = record.get("batch"), record.get("analyzed")
+        if "markdown" in record:
+            entries.extend(e._replace(batch=batch, analyzed=analyzed) for e in parse_notes(record["markdown"]))
+            continue
+        for key, kind in (("transcript", "speech"), ("events", "event")):
+            for e in record.get(key) or []:
+                if _CLOCK.match(e.get("time", "")) and e.get("text"):
+                    entries.append(Entry(batch, analyzed, kind, e["time"], e["text"]))
+    return entries
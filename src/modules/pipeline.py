@@ -0,0 +1,169 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from .utils import (UPLOAD_CONCURRENCY, POLL_CONCURRENCY, DELETE_CONCURRENCY, PREUPLOAD_CONCURRENCY,
+                    PREUPLOAD_DELAY, SPEECH_LANE_CONCURRENCY, BULK_LANE_CONCURRENCY)
+from .gemini_client import Stages, analyze_batch, pre_upload, append_log, run_blocking, create_backend
+from .journal import batch_marker
+from .batch_records import records_file, append_record
+
+
+class AnalysisPipeline:
+    """Runs batch analyses concurrently on a private asyncio event loop thread."""
+
+    def __init__(self, backend=None, manifest=None, keyframe_dir=None, journal=None, on_logged=None):
+        self.backend = backend or create_backend()
+        self.manifest = manifest
+        self.keyframe_dir = keyframe_dir
+        self.journal = journal
+        self.on_logged = on_logged  # called with the log path after each append, still holding the turn
+        self._loop = asyncio.new_event_loop()
+        # Blocking SDK calls from every stage share this pool
+        workers = (UPLOAD_CONCURRENCY + POLL_CONCURRENCY + DELETE_CONCURRENCY + PREUPLOAD_CONCURRENCY
+                   + SPEECH_LANE_CONCURRENCY + BULK_LANE_CONCURRENCY + 2)
+        self._loop.set_default_executor(ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis"))
+        self._thread = None
+        self._stages = None
+        self._turn = None       # asyncio.Condition guarding the log order
+        self._open_turns = set()  # (oldest file name, submission number) of batches yet to append
+        self._submitted = 0
+        self._seq = {}          # lane → next sequence number to hand out (batch labels)
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the event loop thread (idempotent)."""
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+            self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+    async def _setup(self):
+        self._stages = Stages()
+        self._turn = asyncio.Condition()
+
+    def submit(self, file_list, output_file, archive_dir=None, quarantine_dir=None, on_done=None, lane="bulk",
+               batch_id=None):
+        """Queue one batch on a lane. Returns a concurrent Future resolving to success (bool).
+        `on_done(success)` runs in a worker thread before the future resolves.
+
+        The batch goes through the stages of `analyze_batch`. Stage limits are
+        shared, so batch N+1 can upload while batch N is generating; each lane
+        ("speech" or "bulk") has its own generate limit.
+        """
+        self.start()
+        with self._lock:
+            seq = self._seq.get(lane, 0)
+            self._seq[lane] = seq + 1
+            # File names start with their HHMMSS time, so the oldest name orders the batch
+            turn = (min((os.path.basename(f) for f in file_list), default=""), self._submitted)
+            self._submitted += 1
+            self._open_turns.add(turn)
+        future = asyncio.run_coroutine_threadsafe(
+            self._run_batch(lane, seq, turn, file_list, output_file, archive_dir, quarantine_dir, on_done,
+                            batch_id),
+            self._loop)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def pre_upload(self, path, delay=PREUPLOAD_DELAY):
+        """Upload `path` in the background after `delay` seconds (see gemini_client.pre_upload).
+        Batch uploads of the same content wait for it instead of uploading twice."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._pre_upload(path, delay), self._loop)
+
+    async def _pre_upload(self, path, delay):
+        await asyncio.sleep(delay)
+        return await pre_upload(path, self.backend, self._stages, self.manifest, self.keyframe_dir)
+
+    @property
+    def limiter(self):
+        """The shared ApiLimiter (None before start)."""
+        return self._stages.limiter if self._stages else None
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return len(self._futures)
+
+    def drain(self, timeout=None):
+        """Wait for every submitted batch and every background delete."""
+        if not self._thread:
+            return
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures, timeout=timeout)
+        asyncio.run_coroutine_threadsafe(self._stages.drain(), self._loop).result(timeout)
+
+    def close(self):
+        self.drain()
+        if self._thread:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    async def _run_batch(self, lane, seq, turn, file_list, output_file, archive_dir, quarantine_dir, on_done,
+                         batch_id):
+        try:
+            success = await analyze_batch(
+                file_list, output_file, archive_dir, self.manifest, quarantine_dir,
+                backend=self.backend, stages=self._stages, label=f"{lane}#{seq}", lane=lane,
+                keyframe_dir=self.keyframe_dir,
+                write_log=lambda path, note, record: self._write_in_order(turn, path, note, record, batch_id))
+        except Exception as e:
+            print(f"  ❌ [{lane}#{seq}] Batch analysis error: {e}")
+            success = False
+        finally:
+            await self._finish_turn(turn)
+        if on_done:
+            await run_blocking(on_done, success)
+        return success
+
+    def _first_turn(self):
+        with self._lock:
+            return min(self._open_turns)
+
+    async def _write_in_order(self, turn, path, note, record, batch_id=None):
+        """Append a batch's record (batches.jsonl) and then its note, in turn order.
+
+        Turns are ordered by the batch's oldest file across both lanes, but only
+        among batches in flight: a note waits for submitted batches that start
+        earlier (a failed batch just gives up its turn), not for files still in
+        pending/. So the order is best-effort. A bulk batch claimed after a newer
+        speech note was appended lands after it; holding speech notes for the
+        bulk lane would cost them their latency. With a journal and a batch ID, both writes are fsynced,
+        the note carries a trailing marker, and a batch already journaled as
+        logged is never appended twice.
+        """
+        journaled = self.journal is not None and batch_id is not None
+        record["batch"] = batch_id
+        async with self._turn:
+            await self._turn.wait_for(lambda: self._first_turn() == turn)
+            if not journaled:
+                await run_blocking(append_record, records_file(path), record)
+                await run_blocking(append_log, path, note)
+            elif self.journal.state(batch_id) != "logged":
+                # The record first: after a crash in between, recovery renders the note from it
+                await run_blocking(append_record, records_file(path), record, durable=True)
+                await run_blocking(append_log, path, note + batch_marker(batch_id), durable=True)
+                await run_blocking(self.journal.mark, batch_id, "logged", sync=False)
+            if self.on_logged:
+                try:
+                    await run_blocking(self.on_logged, path)
+                except Exception as e:
+                    print(f"  ⚠️ Post-append hook failed: {e}")
+        await self._finish_turn(turn)
+
+    async def _finish_turn(self, turn):
+        async with self._turn:
+            with self._lock:
+                self._open_turns.discard(turn)
+            self._turn.notify_all()
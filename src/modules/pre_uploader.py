@@ -0,0 +1,43 @@
+import os
+import threading
+from .utils import is_sidecar
+from .fs_watch import PendingWatcher
+
+
+class PreUploader:
+    """Watches pending/ and hands each newly finalized clip or screenshot to
+    the pipeline for a background upload, so its bytes leave the machine
+    while recording continues and the analysis round mostly just generates.
+    """
+
+    def __init__(self, pipeline, directory):
+        self.pipeline = pipeline
+        self.directory = directory
+        self._running = False
+        self._thread = None
+        self._watcher = None
+        self.submitted = 0
+
+    def start(self):
+        self._running = True
+        self._watcher = PendingWatcher(self.directory)
+        self._thread = threading.Thread(target=self._watch_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._watcher:
+            self._watcher.interrupt()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def _watch_loop(self):
+        try:
+            while self._running:
+                for name in self._watcher.wait():
+                    if is_sidecar(name):
+                        continue
+                    self.pipeline.pre_upload(os.path.join(self.directory, name))
+                    self.submitted += 1
+        finally:
+            self._watcher.close()
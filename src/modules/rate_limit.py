@@ -0,0 +1,243 @@
+import re
+import time
+import random
+import asyncio
+import functools
+from .utils import (RATE_REQUESTS_PER_MIN, RATE_GENERATE_PER_MIN, RATE_BYTES_PER_MIN, RATE_MAX_ATTEMPTS,
+                    RETRY_BUDGET_RATIO, LATENCY_BACKOFF, UPLOAD_CONCURRENCY, POLL_CONCURRENCY,
+                    DELETE_CONCURRENCY, SPEECH_LANE_CONCURRENCY, BULK_LANE_CONCURRENCY)
+
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+# google.api_core exception names → HTTP status, for errors without a numeric .code
+_CODES_BY_NAME = {
+    "ResourceExhausted": 429, "TooManyRequests": 429,
+    "InternalServerError": 500, "BadGateway": 502,
+    "ServiceUnavailable": 503, "DeadlineExceeded": 504, "GatewayTimeout": 504,
+}
+_RETRY_IN = re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE)
+_RETRY_DELAY = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)")
+
+
+def error_code(e):
+    """HTTP status of an API error, or None."""
+    code = getattr(e, "code", None)
+    try:
+        return int(code)
+    except (TypeError, ValueError):
+        return _CODES_BY_NAME.get(type(e).__name__)
+
+
+def is_retryable(e):
+    if error_code(e) in RETRYABLE_CODES or isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    name = type(e).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def retry_after(e):
+    """Server back-off hint in seconds (retry_after attribute, Retry-After
+    header or the RetryInfo text of a Gemini 429), or None."""
+    hint = getattr(e, "retry_after", None)
+    if hint is None:
+        headers = getattr(getattr(e, "response", None), "headers", None) or {}
+        hint = headers.get("Retry-After")
+    if hint is None:
+        match = _RETRY_IN.search(str(e)) or _RETRY_DELAY.search(str(e))
+        hint = match.group(1) if match else None
+    try:
+        return max(0.0, float(hint))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """`per_minute` tokens refilled continuously, bursting up to one minute's
+    worth. Used from a single event loop, so no locking. An amount larger
+    than the capacity is let through once the bucket is full.
+
+    The refill rate is itself AIMD-adapted: `slow_down()` on a 429 halves it
+    (the real quota may be below the configured one), `speed_up()` on each
+    success wins back 1% of the configured rate.
+    """
+
+    def __init__(self, per_minute):
+        self.max_rate = per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        return now
+
+    async def acquire(self, amount=1):
+        while True:
+            now = self._refill()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            need = min(amount, self.capacity)
+            if self.tokens >= need:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((need - self.tokens) / self.rate)
+
+    def slow_down(self):
+        self._refill()
+        self.rate = max(self.max_rate / 60, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)  # drop the burst allowance too
+
+    def speed_up(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+    def pause(self, seconds):
+        """Hold every caller for `seconds` (the server asked us to back off)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit: grows by one slot per `limit` successes, halves
+    on a 429 and, if `latency_signal` is set, shrinks 10% while the latency
+    average drifts above LATENCY_BACKOFF × its baseline. Must be created
+    inside the running loop."""
+
+    def __init__(self, maximum, minimum=1, latency_signal=False):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(maximum)
+        self.latency_signal = latency_signal
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+        self._ewma = None
+        self._baseline = None
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency):
+        if self.latency_signal:
+            self._ewma = latency if self._ewma is None else 0.8 * self._ewma + 0.2 * latency
+            if self._baseline is None or self._ewma < self._baseline:
+                self._baseline = self._ewma
+            else:
+                self._baseline += (self._ewma - self._baseline) * 0.01  # forget slowly
+            if self._ewma > LATENCY_BACKOFF * self._baseline:
+                self.limit = max(self.minimum, self.limit * 0.9)
+                return
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_overload(self):
+        self.limit = max(self.minimum, self.limit / 2)
+
+
+class RetryBudget:
+    """Every first attempt deposits `ratio` of a retry, every retry withdraws
+    one, so retries add at most `ratio` on top of normal traffic (plus a small
+    reserve for quiet periods) no matter how badly the backend is failing."""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, reserve=10, cap=100):
+        self.ratio = ratio
+        self.balance = float(reserve)
+        self.cap = cap
+
+    def deposit(self):
+        self.balance = min(self.cap, self.balance + self.ratio)
+
+    def withdraw(self):
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class ApiLimiter:
+    """Shared limiter under every Gemini call on one event loop.
+
+    Each call waits for a request token (and a generate token for
+    generation, byte tokens for uploads) and a slot in its kind's adaptive
+    concurrency limit. 429s and transient errors are retried with jittered
+    backoff, honoring the server's Retry-After (which also pauses the bucket
+    for everyone), up to RATE_MAX_ATTEMPTS and within the retry budget.
+    """
+
+    def __init__(self):
+        self.requests = TokenBucket(RATE_REQUESTS_PER_MIN)
+        self.generations = TokenBucket(RATE_GENERATE_PER_MIN)
+        self.bytes = TokenBucket(RATE_BYTES_PER_MIN)
+        self.limits = {
+            "upload": AdaptiveLimit(UPLOAD_CONCURRENCY),
+            "poll": AdaptiveLimit(POLL_CONCURRENCY, latency_signal=True),
+            "delete": AdaptiveLimit(DELETE_CONCURRENCY, latency_signal=True),
+            "generate": AdaptiveLimit(SPEECH_LANE_CONCURRENCY + BULK_LANE_CONCURRENCY),
+        }
+        self.budget = RetryBudget()
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failed": 0, "budget_exhausted": 0}
+
+    async def call(self, kind, fn, *args, nbytes=0, **kwargs):
+        """Run `fn` (blocking, or a coroutine function) as one `kind` API call."""
+        limit = self.limits[kind]
+        bucket = self.generations if kind == "generate" else self.requests
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            await self.requests.acquire()
+            if kind == "generate":
+                await self.generations.acquire()
+            if nbytes:
+                await self.bytes.acquire(nbytes)
+
+            await limit.acquire()
+            self.stats["calls"] += 1
+            start = time.monotonic()
+            try:
+                if asyncio.iscoroutinefunction(fn):
+                    result = await fn(*args, **kwargs)
+                else:
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+                limit.on_success(time.monotonic() - start)
+                bucket.speed_up()
+                return result
+            except Exception as e:
+                error = e
+            finally:
+                await limit.release()
+
+            attempt += 1
+            hint = retry_after(error)
+            if error_code(error) == 429:
+                self.stats["throttled"] += 1
+                limit.on_overload()
+                bucket.slow_down()
+                if hint:
+                    bucket.pause(hint)
+            if not is_retryable(error) or attempt >= RATE_MAX_ATTEMPTS:
+                self.stats["failed"] += 1
+                raise error
+            if not self.budget.withdraw():
+                self.stats["budget_exhausted"] += 1
+                self.stats["failed"] += 1
+                raise error
+            self.stats["retries"] += 1
+            delay = hint if hint is not None else min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+            await asyncio.sleep(delay)
+
+    def summary(self):
+        s = self.stats
+        limits = ", ".join(f"{k} {v.limit:.1f}" for k, v in self.limits.items())
+        return (f"{s['calls']} calls, {s['retries']} retries, {s['throttled']} throttled (429), "
+                f"{s['failed']} failed, retry budget exhausted {s['budget_exhausted']}x; "
+                f"rate {self.requests.rate * 60:.0f}/min (generate {self.generations.rate * 60:.0f}/min); "
+                f"concurrency: {limits}")
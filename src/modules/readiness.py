@@ -0,0 +1,75 @@
+import time
+import random
+import asyncio
+from .utils import READY_TIMEOUT, READY_POLL_MIN, READY_POLL_MAX
+
+
+def backoff_delay(attempt, base=READY_POLL_MIN, cap=READY_POLL_MAX):
+    """Exponential (x1.5) backoff with ±25% jitter so polls for a batch don't synchronize."""
+    return min(cap, base * (1.5 ** attempt)) * random.uniform(0.75, 1.25)
+
+
+class ReadinessTracker:
+    """Polls every outstanding uploaded file concurrently until it is ACTIVE,
+    FAILED or the shared deadline passes.
+
+    Each file has its own coroutine with a jittered exponential backoff, so
+    one slow video no longer delays the checks for the files after it: the
+    wall time is the slowest file's time-to-active rather than the sum of
+    all of them. `get_file(name)` is either a coroutine function (the
+    rate-limited backend `get` in gemini_client) or a blocking call (a fake
+    in testcode/check_readiness.py), which runs in the loop's executor;
+    `limit` is an optional semaphore shared with other batches.
+    """
+
+    def __init__(self, get_file, timeout=READY_TIMEOUT, workers=8, limit=None):
+        self.get_file = get_file
+        self.timeout = timeout
+        self.workers = workers
+        self.limit = limit
+
+    async def wait_all(self, files):
+        """`files` maps key → uploaded file (with .name and .state).
+        Returns key → (state_name, seconds_to_state).
+        """
+        loop = asyncio.get_running_loop()
+        limit = self.limit or asyncio.Semaphore(self.workers)
+        start = time.monotonic()
+
+        async def _track(remote):
+            state = _state_name(remote)
+            attempt = 0
+            while state not in ("ACTIVE", "FAILED"):
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                try:
+                    async with limit:
+                        if asyncio.iscoroutinefunction(self.get_file):
+                            remote = await self.get_file(remote.name)
+                        else:
+                            remote = await loop.run_in_executor(None, self.get_file, remote.name)
+                    state = _state_name(remote)
+                except Exception:
+                    state = None  # transient error: poll again
+            return state, time.monotonic() - start
+
+        tasks = {key: asyncio.ensure_future(_track(remote)) for key, remote in files.items()}
+        if tasks:
+            _, pending = await asyncio.wait(list(tasks.values()), timeout=self.timeout)
+            # Don't wait on polls still sleeping at the deadline
+            for task in pending:
+                task.cancel()
+
+        elapsed = time.monotonic() - start
+        results = {}
+        for key, task in tasks.items():
+            if task.done() and not task.cancelled():
+                results[key] = task.result()
+            else:
+                results[key] = ("TIMEOUT", elapsed)
+        return results
+
+
+def _state_name(remote):
+    state = getattr(remote, "state", None)
+    return getattr(state, "name", state)
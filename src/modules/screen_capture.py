@@ -0,0 +1,251 @@
+import threading
+import time
+import numpy as np
+import cv2
+import mss
+
+MAX_FRAME_WIDTH = 1280  # Frames are published already scaled to this width
+
+
+def find_primary_monitor(monitors):
+    """Index of the primary monitor (the one at (0,0)); index 0 is the virtual all-monitors screen."""
+    for i, m in enumerate(monitors):
+        if i == 0:
+            continue
+        if m['left'] == 0 and m['top'] == 0:
+            return i
+    return 1  # fallback
+
+
+class SharedFrame:
+    """A BGR frame buffer shared between the grabber and its consumers.
+
+    The grabber holds one reference while the frame is the latest one;
+    each consumer holds one between acquire and release (or a `with` block).
+    A buffer is only reused for a new grab once nobody references it.
+    """
+
+    def __init__(self, shape, lock):
+        self.array = np.empty(shape, dtype=np.uint8)
+        self.timestamp = 0.0
+        self.seq = 0
+        self._refs = 0
+        self._lock = lock
+
+    def acquire(self):
+        with self._lock:
+            self._refs += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+
+    @property
+    def age(self):
+        return time.time() - self.timestamp
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Grabber:
+    """Owns one mss instance and one thread for a single monitor.
+
+    Grabs at the highest rate any subscriber asked for (or once on demand),
+    converts BGRA→BGR and scales once, and publishes the result as the
+    latest SharedFrame. Idles when nobody needs frames.
+    """
+
+    def __init__(self, monitor, max_width):
+        self.monitor = monitor
+        self.max_width = max_width
+        self._cond = threading.Condition()
+        self._rates = {}        # subscriber id → fps
+        self._requests = 0      # pending one-shot grab requests
+        self._latest = None
+        self._pool = []
+        self._seq = 0
+        self._running = True
+        self.grabs = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # ── consumer side ──
+    def set_rate(self, key, fps):
+        with self._cond:
+            if fps:
+                self._rates[key] = fps
+            else:
+                self._rates.pop(key, None)
+            self._cond.notify_all()
+
+    def latest(self):
+        with self._cond:
+            return self._latest.acquire() if self._latest else None
+
+    def wait_newer(self, seq, timeout, request=False):
+        """Wait for a frame newer than `seq` (optionally requesting a one-shot grab)."""
+        deadline = time.time() + timeout
+        with self._cond:
+            if request:
+                self._requests += 1
+                self._cond.notify_all()
+            while self._running and (self._latest is None or self._latest.seq <= seq):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._latest.acquire() if self._latest else None
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=2)
+
+    # ── grabber thread ──
+    def _run(self):
+        try:
+            with mss.mss() as sct:
+                while True:
+                    with self._cond:
+                        while self._running and not self._rates and not self._requests:
+                            self._cond.wait()
+                        if not self._running:
+                            return
+                        interval = 1.0 / max(self._rates.values()) if self._rates else 0.0
+                        self._requests = 0  # this grab satisfies every pending request
+
+                    start = time.time()
+                    self._publish(self._grab(sct), start)
+
+                    if interval:
+                        with self._cond:
+                            wait = interval - (time.time() - start)
+                            if wait > 0 and not self._requests:
+                                self._cond.wait(wait)
+        except Exception as e:
+            print(f"❌ Screen capture error: {e}")
+            with self._cond:
+                self._running = False
+                self._cond.notify_all()
+
+    def _grab(self, sct):
+        img = sct.grab(self.monitor)
+        bgra = np.frombuffer(img.raw, dtype=np.uint8).reshape(img.height, img.width, 4)
+        h, w = bgra.shape[:2]
+        if w > self.max_width:
+            bgra = cv2.resize(bgra, (self.max_width, int(h * self.max_width / w)))
+        buf = self._free_buffer(bgra.shape[:2] + (3,))
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=buf.array)
+        self.grabs += 1
+        return buf
+
+    def _free_buffer(self, shape):
+        with self._cond:
+            for buf in self._pool:
+                if buf._refs == 0 and buf.array.shape == shape:
+                    return buf
+            buf = SharedFrame(shape, self._cond)
+            self._pool.append(buf)
+            return buf
+
+    def _publish(self, buf, timestamp):
+        with self._cond:
+            self._seq += 1
+            buf.seq = self._seq
+            buf.timestamp = timestamp
+            buf._refs += 1  # held as latest
+            if self._latest is not None:
+                self._latest._refs -= 1
+            self._latest = buf
+            self._cond.notify_all()
+
+
+class Subscription:
+    """A consumer's standing request for frames at a given rate.
+
+    set_fps() may come from another thread (input hooks); after close() it
+    is a no-op, so a late call can't keep the grabber capturing.
+    """
+
+    def __init__(self, grabber, fps):
+        self._grabber = grabber
+        self._last_seq = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.fps = fps
+        grabber.set_rate(id(self), fps)
+
+    def set_fps(self, fps):
+        with self._lock:
+            if self._closed:
+                return
+            self.fps = fps
+            self._grabber.set_rate(id(self), fps)
+
+    def next_frame(self, timeout):
+        """Next frame not yet seen by this subscriber (acquired), or None on timeout."""
+        frame = self._grabber.wait_newer(self._last_seq, timeout)
+        if frame:
+            self._last_seq = frame.seq
+        return frame
+
+    def latest(self):
+        return self._grabber.latest()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._grabber.set_rate(id(self), 0)
+
+
+class ScreenCaptureService:
+    """Single source of screen frames for heartbeat screenshots and clip recording.
+
+    One grabber thread (with its own mss instance — mss is thread-local) runs
+    per monitor in use. Consumers either subscribe at a frame rate or ask for
+    a snapshot, which reuses the latest frame when it is fresh enough instead
+    of grabbing the screen a second time.
+    """
+
+    def __init__(self, max_width=MAX_FRAME_WIDTH):
+        self.max_width = max_width
+        with mss.mss() as sct:
+            self.monitors = [m.copy() for m in sct.monitors]
+        self.primary_index = find_primary_monitor(self.monitors)
+        self._grabbers = {}
+        self._lock = threading.Lock()
+
+    def _grabber(self, monitor_idx=None):
+        idx = self.primary_index if monitor_idx is None else monitor_idx
+        with self._lock:
+            if idx not in self._grabbers:
+                self._grabbers[idx] = _Grabber(self.monitors[idx], self.max_width)
+            return self._grabbers[idx]
+
+    def subscribe(self, fps, monitor_idx=None):
+        return Subscription(self._grabber(monitor_idx), fps)
+
+    def snapshot(self, max_age, timeout=2.0, monitor_idx=None):
+        """Latest frame if younger than `max_age` seconds, else a fresh grab.
+        Returns an acquired SharedFrame, or None on timeout.
+        """
+        grabber = self._grabber(monitor_idx)
+        frame = grabber.latest()
+        if frame and frame.age <= max_age:
+            return frame
+        seq = frame.seq if frame else 0
+        if frame:
+            frame.release()
+        return grabber.wait_newer(seq, timeout, request=True)
+
+    def close(self):
+        with self._lock:
+            grabbers, self._grabbers = list(self._grabbers.values()), {}
+        for g in grabbers:
+            g.close()
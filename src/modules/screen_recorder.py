@@ -1,70 +1,126 @@
 import threading
+import queue
 import time
+import datetime
 import os
-import numpy as np
 import cv2
-import mss
-from .utils import SCREEN_FPS
+from .utils import (SCREEN_FPS, SCREEN_KEEPALIVE_FPS, SCREEN_STATIC_AFTER, SCREEN_QUEUE_FRAMES,
+                    SCREEN_ENCODER, HEARTBEAT_DEDUP, PARTIAL_SUFFIX, publish_file, read_sidecar, write_sidecar)
+from .screen_capture import ScreenCaptureService
+from .frame_diff import FrameChangeDetector, ScreenshotDeduper
+from .video_writer import open_video_writer, ffmpeg_writer_usable
 
 
 class ScreenRecorder:
     """Handles screen capture: both continuous video recording and single screenshots.
-    
-    Note: mss is thread-local, so each method creates its own mss instance
-    to support cross-thread usage (heartbeat thread vs VAD thread).
+
+    Both consume frames from one shared ScreenCaptureService, so heartbeat
+    screenshots and clip recording never open their own mss instances or
+    grab the screen twice when they overlap.
     """
 
     def __init__(self):
         self._recording = False
         self._record_thread = None
-        self._video_writer = None
         self._output_path = None
-        self._primary_idx = self._find_primary_monitor()
+        self.last_stats = None
+        self._deduper = ScreenshotDeduper()
+        self._last_heartbeat = None   # path of the last kept heartbeat screenshot
+        self._unchanged_since = None  # when the screen last changed (HH:MM:SS)
+        self._subscription = None
+        self._last_activity = 0.0
+        self.capture = ScreenCaptureService()
+        self._primary_idx = self.capture.primary_index
         print(f"🖥️  使用显示器 #{self._primary_idx}")
+        if SCREEN_ENCODER == "ffmpeg":
+            ffmpeg_writer_usable()  # probe now rather than when the first clip starts
 
     @property
     def is_recording(self):
         return self._recording
 
-    @staticmethod
-    def _find_primary_monitor():
-        """Find the primary monitor index. Primary is typically at position (0,0)."""
-        with mss.mss() as sct:
-            for i, m in enumerate(sct.monitors):
-                if i == 0:
-                    continue  # index 0 is the virtual "all monitors" screen
-                if m['left'] == 0 and m['top'] == 0:
-                    return i
-        return 1  # fallback
-
-    def _get_monitor(self):
-        """Get primary monitor dimensions (creates a fresh mss instance)."""
-        with mss.mss() as sct:
-            return sct.monitors[1].copy()
-
     def take_screenshot(self, filepath):
         """Capture a single screenshot and save as compressed JPEG.
-        Thread-safe: creates its own mss instance.
+        Reuses the latest shared frame if it is at most one recording frame old.
+        """
+        try:
+            frame = self.capture.snapshot(max_age=1.0 / SCREEN_FPS)
+            if frame is None:
+                print("❌ Screenshot error: no frame from capture service")
+                return False
+            with frame:
+                self._save_jpeg(frame.array, filepath)
+            return True
+        except Exception as e:
+            print(f"❌ Screenshot error: {e}")
+            return False
+
+    def take_heartbeat(self, filepath):
+        """Heartbeat screenshot, skipped when the screen is near-identical to the
+        last kept heartbeat. Returns True if saved, None if skipped, False on error.
+
+        A skip extends the last kept screenshot's sidecar ("unchanged until
+        HH:MM:SS"). Once that screenshot has left pending/ the next unchanged
+        screen is kept again (noted "unchanged since"), so every batch still
+        gets one frame of a static screen.
         """
+        if not HEARTBEAT_DEDUP:
+            return self.take_screenshot(filepath)
         try:
-            with mss.mss() as sct:
-                monitor = sct.monitors[self._primary_idx]
-                img = sct.grab(monitor)
-                frame = np.array(img)
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-
-                # Resize for efficiency (max 1280px width)
-                h, w = frame.shape[:2]
-                if w > 1280:
-                    scale = 1280 / w
-                    frame = cv2.resize(frame, (1280, int(h * scale)))
-
-                cv2.imwrite(filepath, frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+            frame = self.capture.snapshot(max_age=1.0 / SCREEN_FPS)
+            if frame is None:
+                print("❌ Screenshot error: no frame from capture service")
+                return False
+            with frame:
+                now = datetime.datetime.now().strftime("%H:%M:%S")
+                unchanged = self._deduper.is_duplicate(frame.array)
+                last = self._last_heartbeat
+                if unchanged and last and self._extend_unchanged(last, now):
+                    return None
+
+                meta = None
+                if unchanged:
+                    meta = {"unchanged_since": self._unchanged_since}
+                else:
+                    self._deduper.keep(frame.array)
+                    self._unchanged_since = now
+                self._save_jpeg(frame.array, filepath, meta)
+                self._last_heartbeat = filepath
             return True
         except Exception as e:
             print(f"❌ Screenshot error: {e}")
             return False
 
+    @staticmethod
+    def _extend_unchanged(path, now):
+        """Note a skipped heartbeat in the kept screenshot's sidecar. The
+        screenshot is renamed to `.part` meanwhile, so the Analyzer can't claim
+        it (or its sidecar) half-way; False if it has already left pending/."""
+        held = path + PARTIAL_SUFFIX
+        try:
+            os.rename(path, held)
+        except OSError:
+            return False
+        try:
+            meta = read_sidecar(path)
+            meta["unchanged_until"] = now
+            meta["skipped"] = meta.get("skipped", 0) + 1
+            write_sidecar(path, meta)
+        finally:
+            os.replace(held, path)
+        return True
+
+    @staticmethod
+    def _save_jpeg(frame, filepath, meta=None):
+        """Encode and publish a JPEG atomically (frames are already BGR, max 1280px wide)."""
+        ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        if not ok:
+            raise OSError("JPEG encode failed")
+        partial = filepath + PARTIAL_SUFFIX
+        with open(partial, "wb") as f:
+            f.write(data.tobytes())
+        publish_file(partial, filepath, meta)
+
     def start_recording(self, filepath):
         """Start screen recording in a background thread."""
         if self._recording:
@@ -85,56 +141,155 @@ class ScreenRecorder:
         self._output_path = None
         return path
 
+    def notify_activity(self):
+        """Input activity (e.g. a key press): return to full frame rate immediately."""
+        self._last_activity = time.time()
+        # Runs on the input hook thread while _record_loop may be closing the subscription
+        subscription = self._subscription
+        if subscription is not None:
+            subscription.set_fps(SCREEN_FPS)
+
     def _record_loop(self):
-        """Internal loop that captures frames and writes to video.
-        Thread-safe: creates its own mss instance.
+        """Capture stage: pull shared frames at SCREEN_FPS and queue the ones that changed.
+
+        While the screen is static the grab rate drops to SCREEN_KEEPALIVE_FPS;
+        a detected change (or input activity) bursts back to the full rate.
+        Only changed frames are queued, with their capture timestamps; the
+        encoder stage fills the gaps so the clip stays on the wall clock.
         """
+        path = self._output_path
+        subscription = self._subscription = self.capture.subscribe(SCREEN_FPS)
+        frames = queue.Queue(maxsize=SCREEN_QUEUE_FRAMES)
+        stats = {"captured": 0, "static": 0, "dropped": 0}
+        encoder = None
         try:
-            with mss.mss() as sct:
-                monitor = sct.monitors[self._primary_idx]
-
-                # Grab one frame to get dimensions
-                sample = sct.grab(monitor)
-                frame = np.array(sample)
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-                h, w = frame.shape[:2]
-
-                # Resize for performance
-                if w > 1280:
-                    scale = 1280 / w
-                    w_out, h_out = 1280, int(h * scale)
-                else:
-                    w_out, h_out = w, h
-
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                self._video_writer = cv2.VideoWriter(self._output_path, fourcc, SCREEN_FPS, (w_out, h_out))
+            frame_interval = 1.0 / SCREEN_FPS
 
-                frame_interval = 1.0 / SCREEN_FPS
+            # First frame gives the (already scaled) dimensions
+            frame = subscription.next_frame(timeout=2.0)
+            if frame is None:
+                print("❌ Screen recording error: no frame from capture service")
+                return
+            h_out, w_out = frame.array.shape[:2]
+            try:
+                writer = open_video_writer(path, (w_out, h_out), SCREEN_FPS)
+            except Exception:
+                frame.release()
+                raise
+            detector = FrameChangeDetector()
+            detector.changed(frame.array)
+            t0 = frame.timestamp
+            frames.put((frame, frame.timestamp))
+            stats["captured"] += 1
 
-                while self._recording:
-                    start_time = time.time()
+            encoder = threading.Thread(target=self._encode_loop, args=(writer, frames, t0, stats), daemon=True)
+            encoder.start()
 
-                    img = sct.grab(monitor)
-                    frame = np.array(img)
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+            last_change = time.time()
+            static = False
+            while self._recording:
+                start_time = time.time()
 
-                    if w_out != w:
-                        frame = cv2.resize(frame, (w_out, h_out))
+                frame = subscription.next_frame(timeout=0 if static else frame_interval)
+                if frame is not None:
+                    if detector.changed(frame.array):
+                        last_change = start_time
+                        try:
+                            # The queue holds a reference; the encoder releases it
+                            frames.put_nowait((frame, frame.timestamp))
+                            stats["captured"] += 1
+                        except queue.Full:
+                            frame.release()
+                            stats["dropped"] += 1
+                    else:
+                        frame.release()
+                        stats["static"] += 1
 
-                    self._video_writer.write(frame)
+                # Adapt the grab rate: keep-alive while static, full rate on change or input
+                recent = max(last_change, self._last_activity)
+                now_static = start_time - recent > SCREEN_STATIC_AFTER
+                if now_static != static:
+                    static = now_static
+                    subscription.set_fps(SCREEN_KEEPALIVE_FPS if static else SCREEN_FPS)
 
-                    # Maintain target FPS
-                    elapsed = time.time() - start_time
-                    sleep_time = frame_interval - elapsed
-                    if sleep_time > 0:
-                        time.sleep(sleep_time)
+                # Maintain target FPS
+                elapsed = time.time() - start_time
+                sleep_time = frame_interval - elapsed
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
 
         except Exception as e:
             print(f"❌ Screen recording error: {e}")
         finally:
-            if self._video_writer:
-                self._video_writer.release()
-                self._video_writer = None
+            if self._subscription is subscription:
+                self._subscription = None
+            subscription.close()
+            if encoder:
+                # End marker carries the stop time; an encoder that died no longer drains the queue
+                while encoder.is_alive():
+                    try:
+                        frames.put((None, time.time()), timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                encoder.join()
+                while not frames.empty():
+                    frame, _ = frames.get_nowait()
+                    if frame is not None:
+                        frame.release()
+
+    def _encode_loop(self, writer, frames, t0, stats):
+        """Encoder stage: place each queued frame at its timestamp slot on a
+        constant SCREEN_FPS timeline, repeating the previous frame to fill gaps
+        (static stretches, late grabs, dropped frames)."""
+        next_idx = 0
+        written = 0
+        last = None
+        try:
+            while True:
+                frame, ts = frames.get()
+                idx = int(round((ts - t0) * SCREEN_FPS))
+                while last is not None and next_idx < idx:
+                    writer.write(last.array)
+                    next_idx += 1
+                if frame is None:
+                    break
+                if idx < next_idx and last is not None:
+                    # Two changes inside one frame slot: the later one wins the next slot
+                    stats["dropped"] += 1
+                    frame.release()
+                    continue
+                writer.write(frame.array)
+                next_idx += 1
+                written += 1
+                if last is not None:
+                    last.release()
+                last = frame
+        except Exception as e:
+            print(f"❌ Screen encode error: {e}")
+        finally:
+            if last is not None:
+                last.release()
+            while not frames.empty():
+                frame, _ = frames.get_nowait()
+                if frame is not None:
+                    frame.release()
+            writer.close()
+
+        duration = next_idx / SCREEN_FPS
+        size = os.path.getsize(writer.path) if os.path.exists(writer.path) else 0
+        self.last_stats = {
+            "backend": writer.name,
+            "duration": duration,
+            "timeline_frames": next_idx,
+            "unique_frames": written,
+            "capture_fps": stats["captured"] / duration if duration else 0.0,
+            "dropped": stats["dropped"],
+            "bytes_per_min": size / duration * 60 if duration else 0.0,
+        }
+        print(f"🎬 录屏 [{writer.name}]: {duration:.0f}s, {written}/{next_idx} 帧为新画面, "
+              f"丢帧 {stats['dropped']}, {self.last_stats['bytes_per_min'] / 1e3:.0f} KB/min")
 
     def close(self):
         self.stop_recording()
+        self.capture.close()
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from .utils import UPLOAD_EXPIRY_MARGIN, PARTIAL_SUFFIX
+
+
+_hashes = {}  # (name, size, mtime_ns) → sha; survives the pending → processing → archive renames
+_hashes_lock = threading.Lock()
+HASH_MEMO_SIZE = 4096
+
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of a file's content, streamed in 1 MB blocks. Memoized by name,
+    size and mtime, so pre-upload, batch upload and catalog hash each file once."""
+    st = os.stat(path)
+    key = (os.path.basename(path), st.st_size, st.st_mtime_ns)
+    with _hashes_lock:
+        if key in _hashes:
+            return _hashes[key]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    sha = h.hexdigest()
+    with _hashes_lock:
+        if len(_hashes) >= HASH_MEMO_SIZE:
+            del _hashes[next(iter(_hashes))]
+        _hashes[key] = sha
+    return sha
+
+
+class UploadManifest:
+    """Persistent per-session record of Gemini uploads, keyed by content hash.
+
+    Each entry holds the remote file name, its last known state, its expiry
+    and a failure count, so retries and `--resume` can reuse files that are
+    still on the server instead of uploading them again. Saved atomically to
+    `uploads.json` after every change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def lookup(self, sha):
+        """Entry for a still-valid remote upload of this content, or None."""
+        with self._lock:
+            entry = self._entries.get(sha)
+            if not entry or not entry.get("name"):
+                return None
+            if entry.get("expires", 0) - UPLOAD_EXPIRY_MARGIN < time.time():
+                return None
+            return dict(entry)
+
+    def failures(self, sha):
+        with self._lock:
+            return self._entries.get(sha, {}).get("failures", 0)
+
+    def record_upload(self, sha, fname, remote_name, expires, state="PROCESSING"):
+        with self._lock:
+            entry = self._entries.setdefault(sha, {})
+            entry.update(file=fname, name=remote_name, state=state, expires=expires, uploaded=time.time())
+            self._save()
+
+    def set_state(self, sha, state):
+        with self._lock:
+            if sha in self._entries:
+                self._entries[sha]["state"] = state
+                self._save()
+
+    def record_failure(self, sha, fname):
+        """Count one failed attempt for this content. Returns the new total."""
+        with self._lock:
+            entry = self._entries.setdefault(sha, {"file": fname})
+            entry["failures"] = entry.get("failures", 0) + 1
+            self._save()
+            return entry["failures"]
+
+    def forget(self, sha):
+        """Drop the remote handle (deleted or gone), keeping the failure count."""
+        with self._lock:
+            entry = self._entries.get(sha)
+            if entry:
+                for key in ("name", "state", "expires", "uploaded"):
+                    entry.pop(key, None)
+                if not entry.get("failures"):
+                    del self._entries[sha]
+                self._save()
+
+    def _save(self):
+        tmp = self.path + PARTIAL_SUFFIX
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
@@ -1,4 +1,5 @@
 import os
+import json
 import shutil
 import wave
 import pyaudio
@@ -11,6 +12,7 @@ load_dotenv()
 # ── API Config ──────────────────────────────────────────────
 API_KEY = os.getenv("GOOGLE_API_KEY")
 MODEL_NAME = 'gemini-2.5-flash'
+ANALYZER_BACKEND = os.getenv("ANALYZER_BACKEND", "gemini")  # "gemini", or "fake" for an offline stand-in
 
 # ── Paths ───────────────────────────────────────────────────
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -22,14 +24,77 @@ CHANNELS = 1
 FORMAT = pyaudio.paInt16
 CHUNK_SIZE = 512               # Silero VAD requires 512 samples at 16kHz (~32ms)
 PADDING_DURATION_MS = 3000     # Silence timeout before stopping recording
+MAX_CLIP_SECONDS = 300         # Split speech clips longer than this into consecutive files
+TRIM_MARGIN_MS = 300           # Silence kept before/after speech when trimming clips
+COMPACT_PAUSES = True          # Shorten long pauses inside an utterance
+MAX_PAUSE_MS = 1000            # Internal pauses longer than this are cut down to 2x TRIM_MARGIN_MS
+AUDIO_CODEC = "flac"           # Speech clip codec: "wav" (raw PCM), "flac" (lossless) or "opus"
+OPUS_BITRATE = "24k"           # Opus bitrate for speech when AUDIO_CODEC = "opus"
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg")
 VAD_THRESHOLD = 0.5            # Silero probability threshold (0.0-1.0)
+VAD_MAX_BATCH = 8              # Max queued chunks per Silero call when the loop falls behind
+VAD_GATE_ENABLED = True        # Cheap energy/ZCR pre-gate before Silero
+VAD_GATE_MARGIN_DB = 6.0       # Energy above adaptive noise floor needed to call Silero
+VAD_GATE_ZCR = 0.3             # ZCR above which a quieter chunk (+half margin) still passes (fricatives)
+VAD_GATE_MIN_DBFS = -60.0      # Chunks below this absolute level never reach Silero
+VAD_GATE_HANGOVER_MS = 300     # Keep calling Silero this long after the gate last opened
+CAPTURE_MODE = "callback"      # "callback" (PortAudio thread fills a ring) or "blocking" (legacy read)
+CAPTURE_BUFFER_SECONDS = 10    # Ring capacity between audio callback and VAD loop
+CAPTURE_LATE_MS = 500          # Chunks consumed later than this after capture count as late
+
+# ── File naming ────────────────────────────────────────────
+PARTIAL_SUFFIX = ".part"       # Files still being written; the Analyzer ignores them
+SIDECAR_SUFFIX = ".json"       # Per-file metadata (e.g. trim time map), never uploaded
 
 # ── Screen Recording Config ────────────────────────────────
 SCREEN_FPS = 3                 # Frames per second for screen recording
+SCREEN_KEEPALIVE_FPS = 0.5     # Grab rate while the screen is static (frames are duplicated in between)
+SCREEN_STATIC_AFTER = 1.0      # Seconds without change before dropping to the keep-alive rate
+SCREEN_DIFF_THRESHOLD = 6      # Mean per-tile luma difference (0-255) that counts as a change
+SCREEN_ENCODER = "ffmpeg"      # "ffmpeg" (libx264 pipe) or "opencv" (mp4v VideoWriter fallback)
+SCREEN_CRF = 28                # libx264 quality (higher = smaller files)
+SCREEN_PRESET = "fast"         # libx264 speed preset
+SCREEN_QUEUE_FRAMES = 6        # Capture → encoder queue; frames beyond this are dropped (and counted)
 HEARTBEAT_INTERVAL = 10        # Seconds between heartbeat screenshots
+HEARTBEAT_DEDUP = True         # Skip heartbeats near-identical to the last kept one
+PHASH_MAX_DISTANCE = 4         # Max perceptual-hash Hamming distance (of 64 bits) for "unchanged"
 
 # ── Analyzer Config ────────────────────────────────────────
-ANALYSIS_INTERVAL = 600        # Seconds between batch analyses (10 min)
+ANALYSIS_INTERVAL = 600        # Max seconds a finished file waits in pending/ before it is analyzed (10 min)
+TRIGGER_SPEECH_SECONDS = 60    # Analyze early once this much speech is pending (with SPEECH_LANE off)
+TRIGGER_FILES = 60             # ... or this many files
+TRIGGER_BYTES = 50 * 1024 * 1024  # ... or this many bytes
+TRIGGER_MIN_INTERVAL = 30      # Min seconds between analysis rounds (doubles per failed round)
+TRIGGER_POLL_INTERVAL = 2.0    # pending/ listing interval where inotify is unavailable
+SPEECH_LANE = True             # Analyze finished speech clips right away in their own lane (heartbeats stay in the bulk lane)
+SPEECH_SETTLE = 3.0            # Seconds after the last speech file lands before the lane fires (pairs audio with its video)
+SPEECH_MIN_INTERVAL = 5        # Min seconds between speech-lane rounds (doubles per failed round)
+SPEECH_LANE_CONCURRENCY = 2    # Speech batches generating at once
+BULK_LANE_CONCURRENCY = 1      # Heartbeat summary batches generating at once
+QUARANTINE_AFTER = 3           # Failed upload/processing attempts before a file is quarantined
+UPLOAD_EXPIRY_MARGIN = 600     # Don't reuse a remote upload this close (s) to its expiry
+READY_TIMEOUT = 120            # Max seconds to wait for uploaded files to become ACTIVE
+READY_POLL_MIN = 0.5           # First readiness poll delay (s); grows x1.5 per poll with jitter
+READY_POLL_MAX = 4.0           # Cap on the readiness poll delay (s)
+UPLOAD_CONCURRENCY = 8         # Max uploads in flight across all batches (adaptive below that)
+POLL_CONCURRENCY = 8           # Readiness polls in flight across all batches
+DELETE_CONCURRENCY = 4         # Background deletes of finished remote uploads
+RATE_REQUESTS_PER_MIN = 600    # All Gemini calls (uploads, polls, deletes, generate)
+RATE_GENERATE_PER_MIN = 30     # generate_content calls (usually the tightest quota)
+RATE_BYTES_PER_MIN = 500 * 1024 * 1024  # Upload bytes
+RATE_MAX_ATTEMPTS = 5          # Attempts per call for 429 / 5xx / connection errors
+RETRY_BUDGET_RATIO = 0.2       # Retries may add at most 20% on top of first attempts
+LATENCY_BACKOFF = 2.0          # Shrink poll/delete concurrency while latency exceeds this x its baseline
+BATCH_MAX_TOKENS = 200_000     # Estimated prompt tokens per Gemini request; larger backlogs are split
+BATCH_MAX_BYTES = 150 * 1024 * 1024  # Upload bytes per Gemini request
+PREUPLOAD_ENABLED = True       # Upload files in the background as soon as they land in pending/
+PREUPLOAD_DELAY = 2.0          # Seconds to wait after a file is finalized before uploading it
+PREUPLOAD_CONCURRENCY = 2      # Background uploads in flight
+PREUPLOAD_BYTES_PER_SEC = 1_000_000  # Background upload rate cap, leaves the uplink for batch uploads
+KEYFRAMES_ENABLED = True       # Upload scene-change keyframes instead of whole speech-clip screen videos
+KEYFRAME_SAMPLE_FPS = 1.0      # Video frames per second checked for scene changes
+KEYFRAME_MAX_WIDTH = 768       # Keyframes are downscaled to fit one 768px image tile
+STRUCTURED_NOTES = True        # Ask for JSON in a response schema, keep it in batches.jsonl, render the note from it
 
 
 class Session:
@@ -42,16 +107,26 @@ class Session:
         self.processing_dir = os.path.join(self.base_dir, "processing")
         self.archive_dir = os.path.join(self.base_dir, "archive")
         self.log_file = os.path.join(self.base_dir, "Research_Log.md")
+        self.quarantine_dir = os.path.join(self.base_dir, "quarantine")
+        self.upload_manifest = os.path.join(self.base_dir, "uploads.json")
+        self.keyframe_dir = os.path.join(self.base_dir, "keyframes")
+        self.journal_file = os.path.join(self.base_dir, "journal.jsonl")
 
     def ensure_directories(self):
         os.makedirs(self.pending_dir, exist_ok=True)
         os.makedirs(self.processing_dir, exist_ok=True)
         os.makedirs(self.archive_dir, exist_ok=True)
+        os.makedirs(self.quarantine_dir, exist_ok=True)
 
     def is_existing(self):
         return os.path.isdir(self.base_dir)
 
 
+def catalog_path():
+    """The cross-session SQLite catalog (see catalog.Catalog)."""
+    return os.path.join(DATA_DIR, "catalog.sqlite")
+
+
 def create_session(resume_name=None):
     """Create a new session or resume an existing one."""
     if resume_name:
@@ -69,25 +144,94 @@ def create_session(resume_name=None):
         print(f"📂 New session: {name}")
 
     session.ensure_directories()
+    from .catalog import get_catalog
+    catalog = get_catalog()
+    if resume_name and session.name not in catalog.names():
+        # Recorded before the catalog existed: backfill its archive, batches and span first
+        print(f"  🗂️ Indexing {session.name} ...")
+        catalog.index_session(session)
+    else:
+        catalog.add_session(session.name)
     return session
 
 
-def list_sessions():
-    """Print all available sessions."""
-    if not os.path.isdir(DATA_DIR):
+def sync_catalog():
+    """Index session directories the catalog doesn't know yet (made before it
+    existed, or copied in). Returns the catalog."""
+    from .catalog import get_catalog
+    catalog = get_catalog()
+    if os.path.isdir(DATA_DIR):
+        known = catalog.names()
+        for d in sorted(os.listdir(DATA_DIR)):
+            if d.startswith("session_") and d not in known and os.path.isdir(os.path.join(DATA_DIR, d)):
+                print(f"  🗂️ Indexing {d} ...")
+                catalog.index_session(Session(d))
+    return catalog
+
+
+def list_sessions(since=None):
+    """Print all available sessions (optionally only those active since a UNIX time)."""
+    sessions = sync_catalog().sessions(since)
+    if not sessions:
         print("  (no sessions yet)")
         return
-    sessions = sorted([
-        d for d in os.listdir(DATA_DIR)
-        if os.path.isdir(os.path.join(DATA_DIR, d)) and d.startswith("session_")
-    ])
-    if not sessions:
+    for s in sessions:
+        start = s["first_active"] or s["created"]
+        end = s["last_active"] or start
+        span = (f"{_fmt_time(start, '%Y-%m-%d %H:%M')} → {_fmt_time(end, '%H:%M' if _same_day(start, end) else '%Y-%m-%d %H:%M')}"
+                if start else "?")
+        failed = f" ({s['failed_batches']} failed)" if s["failed_batches"] else ""
+        print(f"  📁 {s['name']}  {span} | {s['batches']} batches{failed} | "
+              f"{s['files']} files, {s['bytes'] / 1e6:.1f} MB | 🎙️ {s['speech_seconds'] / 60:.1f} min | "
+              f"log {s['log_bytes'] / 1024:.0f} KB")
+
+
+def print_stats(since=None):
+    """Print totals over all sessions (or those active since a UNIX time) from the catalog."""
+    summary, by_type = sync_catalog().totals(since)
+    if not summary or not summary["sessions"]:
         print("  (no sessions yet)")
-    else:
-        for s in sessions:
-            log = os.path.join(DATA_DIR, s, "Research_Log.md")
-            size = os.path.getsize(log) if os.path.exists(log) else 0
-            print(f"  📁 {s}  (log: {size} bytes)")
+        return
+    print(f"📊 {summary['sessions']} sessions, {summary['recorded_seconds'] / 3600:.1f} h recorded, "
+          f"{summary['batches']} batches ({summary['failed_batches']} failed), "
+          f"log {summary['log_bytes'] / 1e6:.1f} MB")
+    print(f"   {summary['files']} files archived, {summary['bytes'] / 1e9:.2f} GB, "
+          f"{summary['speech_seconds'] / 3600:.1f} h of speech")
+    for row in by_type:
+        seconds = f", {row['seconds'] / 60:.0f} min" if row["seconds"] else ""
+        print(f"   - {row['type']:<10} {row['files']:>7} files  {row['bytes'] / 1e6:9.1f} MB{seconds}")
+
+
+def search_notes(query, since=None, limit=20):
+    """Print the transcript / key-event bullets best matching `query` across
+    sessions, with links to the archived media."""
+    catalog = sync_catalog()
+    if not catalog.search_enabled:
+        print("  (search needs SQLite with FTS5)")
+        return
+    for s in catalog.sessions():
+        catalog.index_log(s["name"], Session(s["name"]).log_file)
+    results = catalog.search(query, since, limit)
+    if not results:
+        print(f"🔎 No notes match \"{query}\"")
+        return
+    print(f"🔎 {len(results)} notes matching \"{query}\":")
+    for i, r in enumerate(results, 1):
+        day = (r["analyzed"] or "")[:10]
+        icon = "🗣️" if r["kind"] == "speech" else "📝"
+        print(f"  {i:>2}. [{day} {r['clock']}] {icon} {r['text']}")
+        batch = f", {r['batch']}" if r["batch"] else ""
+        print(f"      ({r['session']}{batch})")
+        if r["media"]:
+            print(f"      {'🎙️' if r['kind'] == 'speech' else '🎬'} {os.path.relpath(r['media'])}")
+
+
+def _fmt_time(ts, fmt):
+    return datetime.datetime.fromtimestamp(ts).strftime(fmt)
+
+
+def _same_day(a, b):
+    return datetime.date.fromtimestamp(a) == datetime.date.fromtimestamp(b)
 
 
 def check_ffmpeg():
@@ -99,6 +243,41 @@ def check_ffmpeg():
     return True
 
 
+def sidecar_path(path):
+    """Metadata sidecar for a media file: `<file>.json`."""
+    return path + SIDECAR_SUFFIX
+
+
+def is_sidecar(path):
+    return path.endswith(SIDECAR_SUFFIX)
+
+
+def read_sidecar(path):
+    """Return the sidecar dict for a media file, or {} if there is none."""
+    try:
+        with open(sidecar_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_sidecar(path, data):
+    """Atomically write the sidecar for a media file."""
+    target = sidecar_path(path)
+    tmp = target + PARTIAL_SUFFIX
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, target)
+
+
+def publish_file(partial, final, meta=None):
+    """Move a finished `.part` file into place, writing its sidecar first so the
+    Analyzer never sees the media without its metadata."""
+    if meta:
+        write_sidecar(final, meta)
+    os.replace(partial, final)
+
+
 def save_wav(frames, filename):
     try:
         if not frames:
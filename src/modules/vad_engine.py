@@ -0,0 +1,155 @@
+import numpy as np
+import torch
+from .utils import (RATE, CHUNK_SIZE, VAD_MAX_BATCH, VAD_THRESHOLD, VAD_GATE_ENABLED,
+                    VAD_GATE_MARGIN_DB, VAD_GATE_ZCR, VAD_GATE_MIN_DBFS, VAD_GATE_HANGOVER_MS)
+
+_INT16_SCALE = np.float32(1.0 / 32768.0)
+
+
+class EnergyGate:
+    """Cheap RMS + zero-crossing pre-gate in front of Silero.
+
+    A chunk passes when its energy clears an adaptive noise floor by
+    `margin_db`, or clears it by half the margin with a high zero-crossing
+    rate (unvoiced onsets such as "s"/"sh"). After the gate opens it stays
+    open for `hangover` chunks. The floor tracks chunks Silero (or the gate)
+    judged to be non-speech: it falls quickly and rises slowly.
+    """
+
+    def __init__(self, margin_db=VAD_GATE_MARGIN_DB, zcr_threshold=VAD_GATE_ZCR,
+                 min_dbfs=VAD_GATE_MIN_DBFS, hangover_ms=VAD_GATE_HANGOVER_MS):
+        self.margin = 10 ** (margin_db / 20)
+        self.half_margin = 10 ** (margin_db / 40)
+        self.zcr_threshold = zcr_threshold
+        self.min_rms = 10 ** (min_dbfs / 20)
+        self.hangover = int(hangover_ms / (CHUNK_SIZE / RATE * 1000))
+        self.noise_floor = None
+        self._hang = 0
+        self.reopened = False  # True if the last check opened a closed gate
+        self.passed = 0
+        self.skipped = 0
+
+    def check(self, frame):
+        """Return (passes, rms) for one normalized float32 chunk."""
+        rms = float(np.sqrt(np.dot(frame, frame) / frame.size))
+        if self.noise_floor is None:
+            self.noise_floor = max(rms, self.min_rms)
+
+        loud = rms > self.noise_floor * self.margin
+        if not loud and rms > self.noise_floor * self.half_margin:
+            signs = np.signbit(frame)
+            zcr = np.count_nonzero(signs[1:] != signs[:-1]) / (frame.size - 1)
+            loud = zcr > self.zcr_threshold
+        loud = loud and rms > self.min_rms
+
+        was_open = self._hang > 0
+        if loud:
+            self._hang = self.hangover + 1
+        if self._hang > 0:
+            self._hang -= 1
+            self.reopened = not was_open
+            self.passed += 1
+            return True, rms
+
+        self.reopened = False
+        self.skipped += 1
+        self.observe_noise(rms)
+        return False, rms
+
+    def observe_noise(self, rms):
+        """Fold a non-speech chunk's level into the noise floor."""
+        alpha = 0.3 if rms < self.noise_floor else 0.02
+        self.noise_floor = max((1 - alpha) * self.noise_floor + alpha * rms, self.min_rms)
+
+    @property
+    def skip_ratio(self):
+        total = self.passed + self.skipped
+        return self.skipped / total if total else 0.0
+
+
+class StreamingVAD:
+    """Streaming Silero VAD over a preallocated float32 ring buffer.
+
+    Raw int16 chunks are converted in place into a fixed ring of float32 slots
+    (shared with torch, so no per-chunk tensor allocation). `process()` runs the
+    model over every queued chunk in one call and yields a per-chunk probability
+    stream. Silero is stateful across chunks of the same stream, so queued
+    chunks are fed in order rather than as independent batch rows.
+
+    With the EnergyGate enabled, chunks it rejects get probability 0.0 without
+    touching the network; the model state is reset whenever the gate reopens
+    so Silero does not resume from stale context.
+    """
+
+    def __init__(self, model, capacity=VAD_MAX_BATCH, gate=VAD_GATE_ENABLED):
+        self.model = model
+        self.gate = EnergyGate() if gate else None
+        self.capacity = capacity
+        self._buffer = np.zeros((capacity, CHUNK_SIZE), dtype=np.float32)
+        self._tensor = torch.from_numpy(self._buffer)  # shares memory with _buffer
+        self._chunks = [None] * capacity
+        self._head = 0    # oldest queued slot
+        self._count = 0   # number of queued slots
+
+    @property
+    def pending(self):
+        return self._count
+
+    @property
+    def full(self):
+        return self._count == self.capacity
+
+    def push(self, chunk):
+        """Queue one CHUNK_SIZE int16 chunk. Returns False if the ring is full."""
+        if self._count == self.capacity:
+            return False
+        slot = (self._head + self._count) % self.capacity
+        pcm = np.frombuffer(chunk, dtype=np.int16)
+        np.multiply(pcm, _INT16_SCALE, out=self._buffer[slot], dtype=np.float32)
+        self._chunks[slot] = chunk
+        self._count += 1
+        return True
+
+    def process(self):
+        """Run Silero over all queued chunks. Returns a list of (chunk, prob)."""
+        if not self._count:
+            return []
+        slots = [(self._head + i) % self.capacity for i in range(self._count)]
+        probs = [0.0] * len(slots)
+        gated = []  # (index, rms) of chunks that passed the gate
+        try:
+            with torch.inference_mode():
+                outputs = []
+                for i, slot in enumerate(slots):
+                    if self.gate:
+                        passes, rms = self.gate.check(self._buffer[slot])
+                        if not passes:
+                            continue
+                        if self.gate.reopened:
+                            self.model.reset_states()
+                        gated.append((i, rms))
+                    else:
+                        gated.append((i, None))
+                    outputs.append(self.model(self._tensor[slot], RATE))
+            if outputs:
+                for (i, rms), prob in zip(gated, torch.cat(outputs).view(-1).tolist()):
+                    probs[i] = prob
+                    if rms is not None and prob < VAD_THRESHOLD:
+                        self.gate.observe_noise(rms)
+        except Exception:
+            pass
+
+        results = [(self._chunks[slot], prob) for slot, prob in zip(slots, probs)]
+        for slot in slots:
+            self._chunks[slot] = None
+        self._head = (self._head + self._count) % self.capacity
+        self._count = 0
+        return results
+
+    def reset(self):
+        """Drop queued chunks and reset the model state."""
+        for i in range(self.capacity):
+            self._chunks[i] = None
+        self._head = 0
+        self._count = 0
+        self.model.reset_states()
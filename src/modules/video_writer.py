@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+import threading
+import subprocess
+import numpy as np
+import cv2
+from .utils import SCREEN_ENCODER, SCREEN_CRF, SCREEN_PRESET, PARTIAL_SUFFIX, publish_file
+
+
+class FfmpegPipeWriter:
+    """Pipes raw BGR frames into ffmpeg (libx264, yuv420p) at a constant input rate.
+
+    `mpdecimate` drops repeated frames before the encoder while `-fps_mode vfr`
+    keeps the original timestamps, so static stretches cost neither encode
+    time nor bytes. At least one frame per 5 s is kept as a keep-alive. Output
+    goes to `<path>.part` and is renamed into place on close. If ffmpeg dies
+    mid-clip, its output is unreadable (no moov yet), so the rest of the clip
+    is written with OpenCVWriter instead and published with a `starts_at`
+    sidecar: seconds between the clip's name time and its first frame.
+    """
+
+    name = "ffmpeg"
+
+    def __init__(self, path, size, fps):
+        self.path = path
+        self._partial = path + PARTIAL_SUFFIX
+        self._size = size
+        self._fps = fps
+        self._fallback = None
+        self._frames = 0
+        # Created up front: ffmpeg only opens the output once input arrives, and
+        # the Analyzer holds a speech clip's audio back while this exists
+        open(self._partial, "ab").close()
+        self._proc = subprocess.Popen(
+            _ffmpeg_command(size, fps, self._partial),
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+
+    def write(self, frame):
+        if self._fallback is None:
+            try:
+                self._proc.stdin.write(frame.data)
+                self._frames += 1
+                return
+            except (OSError, ValueError) as e:
+                print(f"⚠️ ffmpeg stopped mid-clip ({e}), continuing with OpenCV")
+                self._proc.kill()
+                # The dead `.part` stays until close: it still marks the clip as in progress
+                open(self._partial, "ab").close()
+                self._fallback = OpenCVWriter(self.path, self._size, self._fps,
+                                              staging=self.path + ".tail" + PARTIAL_SUFFIX)
+                self.name = f"ffmpeg→{self._fallback.name}"
+        self._fallback.write(frame)
+
+    def close(self):
+        if self._fallback is not None:
+            self._proc.wait()
+            published = self._fallback.close({"starts_at": round(self._frames / self._fps, 2)})
+            if os.path.exists(self._partial):
+                os.remove(self._partial)
+            return published
+        try:
+            # communicate() flushes and closes stdin itself
+            _, err = self._proc.communicate(timeout=30)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+            err = b"timeout"
+        if self._proc.returncode == 0 and os.path.exists(self._partial):
+            os.replace(self._partial, self.path)
+            return True
+        print(f"❌ ffmpeg encode failed: {err.decode(errors='ignore').strip()}")
+        return False
+
+
+class OpenCVWriter:
+    """The original mp4v cv2.VideoWriter, used when ffmpeg is unavailable.
+
+    cv2 picks the container from the file extension, so the clip is written
+    inside a `<path>.part` directory (`staging`) and moved into place on close.
+    """
+
+    name = "opencv"
+
+    def __init__(self, path, size, fps, staging=None):
+        self.path = path
+        self._staging = staging or path + PARTIAL_SUFFIX
+        self._staged = os.path.join(self._staging, os.path.basename(path))
+        os.makedirs(self._staging, exist_ok=True)
+        self._writer = cv2.VideoWriter(self._staged, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+        if not self._writer.isOpened():
+            shutil.rmtree(self._staging, ignore_errors=True)
+            raise OSError(f"cv2.VideoWriter could not open {path}")
+
+    def write(self, frame):
+        self._writer.write(frame)
+
+    def close(self, meta=None):
+        self._writer.release()
+        try:
+            publish_file(self._staged, self.path, meta)
+            return True
+        except OSError as e:
+            print(f"❌ OpenCV clip could not be published: {e}")
+            return False
+        finally:
+            shutil.rmtree(self._staging, ignore_errors=True)
+
+
+def _ffmpeg_command(size, fps, output):
+    w, h = size
+    keepalive = max(1, int(fps * 5))
+    return ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}", "-r", str(fps), "-i", "-",
+            # yuv420p needs even dimensions, so pad odd native resolutions by one pixel
+            "-vf", f"mpdecimate=max={keepalive},pad=ceil(iw/2)*2:ceil(ih/2)*2", "-fps_mode", "vfr",
+            "-c:v", "libx264", "-preset", SCREEN_PRESET, "-crf", str(SCREEN_CRF),
+            "-pix_fmt", "yuv420p", "-movflags", "+faststart", "-f", "mp4", output]
+
+
+_probe_result = None
+_probe_lock = threading.Lock()
+
+
+def ffmpeg_writer_usable():
+    """Whether the local ffmpeg runs FfmpegPipeWriter's command: found on
+    PATH, built with libx264, new enough for -fps_mode (5.1+). Probed once
+    by encoding a few tiny frames; the reason is printed if it fails."""
+    global _probe_result
+    with _probe_lock:
+        if _probe_result is None:
+            _probe_result = _probe_ffmpeg()
+        return _probe_result
+
+
+def _probe_ffmpeg():
+    if not shutil.which("ffmpeg"):
+        print("⚠️ ffmpeg not found, screen clips use OpenCV (mp4v)")
+        return False
+    tmp = tempfile.mkdtemp()
+    try:
+        frames = np.zeros((3, 16, 16, 3), np.uint8).tobytes()
+        result = subprocess.run(_ffmpeg_command((16, 16), 3, os.path.join(tmp, "probe.mp4")),
+                                input=frames, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=30)
+        if result.returncode == 0:
+            return True
+        reason = result.stderr.decode(errors="ignore").strip().splitlines()
+        print(f"⚠️ ffmpeg can't encode screen clips ({reason[-1] if reason else result.returncode}), "
+              f"using OpenCV (mp4v)")
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"⚠️ ffmpeg probe failed ({e}), screen clips use OpenCV (mp4v)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return False
+
+
+def open_video_writer(path, size, fps, backend=SCREEN_ENCODER):
+    """Open the configured writer, falling back to OpenCV if this ffmpeg
+    can't run the encoder command (see ffmpeg_writer_usable) or can't start."""
+    if backend == "ffmpeg" and ffmpeg_writer_usable():
+        try:
+            return FfmpegPipeWriter(path, size, fps)
+        except OSError as e:
+            print(f"⚠️ ffmpeg writer unavailable ({e}), falling back to OpenCV")
+    return OpenCVWriter(path, size, fps)
@@ -0,0 +1,137 @@
+"""
+End-to-end Analyzer benchmark against the local FakeBackend (no network,
+no API key). A producer thread finalizes synthetic speech clips and
+heartbeat screenshots into pending/ the way the Logger does (`.part` then
+rename, time-map sidecars for speech); the Analyzer runs unchanged on top.
+
+Reports files/s, end-to-end latency percentiles (finalized in pending/ →
+archived) per lane and retry amplification (backend calls per file / batch).
+
+Usage:
+    python src/testcode/bench_analyzer.py --seconds 60 --rpm 120 --error-rate 0.05
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.utils as utils
+import modules.analyzer as analyzer_mod
+from modules.analyzer import Analyzer
+from modules.fake_backend import FakeBackend
+
+
+def produce(session, seconds, speech_every, heartbeat_every, finalized, rng):
+    """Write files into pending/ in real time; record each one's finalize time."""
+    start = time.time()
+    next_speech = speech_every
+    next_heartbeat = 0.0
+    while True:
+        elapsed = time.time() - start
+        if elapsed >= seconds:
+            break
+        clock = time.strftime("%H%M%S", time.localtime())
+        if elapsed >= next_heartbeat:
+            _publish(session, f"{clock}_{len(finalized):04d}_heartbeat.jpg", rng.randint(80_000, 200_000), None, finalized)
+            next_heartbeat += heartbeat_every
+        if elapsed >= next_speech:
+            duration = rng.uniform(3, 30)
+            meta = {"timemap": {"start": time.strftime("%H:%M:%S.000"), "cuts": [], "duration": duration}}
+            _publish(session, f"{clock}_{len(finalized):04d}_speech_clip.flac", int(duration * 18000), meta, finalized)
+            _publish(session, f"{clock}_{len(finalized):04d}_speech_clip.mp4", int(duration * 60000), None, finalized)
+            next_speech += speech_every * rng.uniform(0.5, 1.5)
+        time.sleep(0.05)
+
+
+def _publish(session, name, size, meta, finalized):
+    path = os.path.join(session.pending_dir, name)
+    with open(path + utils.PARTIAL_SUFFIX, "wb") as f:
+        f.write(os.urandom(size))
+    utils.publish_file(path + utils.PARTIAL_SUFFIX, path, meta)
+    finalized[name] = time.time()
+
+
+def collect(session, finalized, archived, stop):
+    """Record when each finalized file reaches archive/."""
+    while not stop.is_set():
+        for name in os.listdir(session.archive_dir):
+            if name in finalized and name not in archived:
+                archived[name] = time.time()
+        time.sleep(0.05)
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Analyzer end to end against a fake Gemini")
+    parser.add_argument("--seconds", type=float, default=60, help="How long to produce files")
+    parser.add_argument("--speech-every", type=float, default=8, help="Mean seconds between speech clips")
+    parser.add_argument("--heartbeat-every", type=float, default=1, help="Seconds between heartbeats")
+    parser.add_argument("--max-latency", type=float, default=20, help="Bulk lane deadline (ANALYSIS_INTERVAL)")
+    parser.add_argument("--rpm", type=int, default=None, help="Fake requests-per-minute quota (429s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls failing with 503")
+    parser.add_argument("--processing-failures", type=float, default=0.0, help="Fraction of uploads ending FAILED")
+    args = parser.parse_args()
+
+    # Compress the bulk-lane deadline so a short run exercises it
+    analyzer_mod.ANALYSIS_INTERVAL = args.max_latency
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as root:
+        utils.DATA_DIR = root
+        session = utils.Session("bench_session")
+        session.ensure_directories()
+
+        backend = FakeBackend(requests_per_minute=args.rpm, error_rate=args.error_rate,
+                              processing_failure_rate=args.processing_failures,
+                              generate_latency=(1.0, 4.0), seed=1)
+        analyzer = Analyzer(session, backend=backend)
+        finalized, archived = {}, {}
+        stop = threading.Event()
+        collector = threading.Thread(target=collect, args=(session, finalized, archived, stop), daemon=True)
+
+        analyzer.start()
+        collector.start()
+        start = time.time()
+        produce(session, args.seconds, args.speech_every, args.heartbeat_every, finalized, rng)
+        produced_at = time.time()
+
+        # Shutdown path: final round for everything left, wait for all batches
+        analyzer.stop()
+        analyzer.run_now()
+        limiter = analyzer.pipeline.limiter.summary()
+        time.sleep(0.2)
+        stop.set()
+        collector.join()
+        wall = time.time() - start
+
+        with open(session.log_file, encoding="utf-8") as f:
+            batches = f.read().count("[Batch Analysis:")
+        quarantined = len(os.listdir(session.quarantine_dir))
+
+    print(f"\n{'=' * 60}")
+    print(f"produced {len(finalized)} files in {produced_at - start:.0f}s, archived {len(archived)}, "
+          f"quarantined {quarantined}, wall {wall:.0f}s")
+    print(f"throughput: {len(archived) / wall:.2f} files/s, {batches} batches")
+    for lane, match in (("speech", "_speech_clip"), ("heartbeat", "_heartbeat")):
+        lat = [archived[n] - finalized[n] for n in archived if match in n]
+        print(f"{lane:<10} latency p50 {percentile(lat, 50):5.1f}s  p90 {percentile(lat, 90):5.1f}s  "
+              f"p99 {percentile(lat, 99):5.1f}s  max {max(lat, default=float('nan')):5.1f}s  (n={len(lat)})")
+    print(f"retry amplification: uploads {backend.calls['upload'] / max(1, len(finalized)):.2f}x per file, "
+          f"generate {backend.calls['generate'] / max(1, batches):.2f}x per batch")
+    print(f"backend calls {backend.calls}, errors {backend.errors}, left on server {backend.remote_files}")
+    print(f"limiter: {limiter}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Report compression ratio and encode cost per minute of speech for each clip codec.
+
+Usage:
+    python src/testcode/bench_codec.py data/<session>/archive/*_speech_clip.wav
+"""
+import os
+import sys
+import time
+import wave
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.clip_encoder import CODECS, encode_audio
+
+
+def child_cpu():
+    """CPU seconds used by finished child processes (POSIX only)."""
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+    except ImportError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FLAC/Opus encoding of speech clips")
+    parser.add_argument("wavs", nargs="+", help="Speech clip WAV files")
+    args = parser.parse_args()
+
+    minutes = 0.0
+    bytes_in = 0
+    for path in args.wavs:
+        with wave.open(path, "rb") as wf:
+            minutes += wf.getnframes() / wf.getframerate() / 60
+        bytes_in += os.path.getsize(path)
+    print(f"🎧 {len(args.wavs)} clips, {minutes:.1f} min of speech, {bytes_in / 1e6:.1f} MB WAV")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec, (ext, _, _) in CODECS.items():
+            bytes_out = 0
+            cpu_start = child_cpu()
+            start = time.perf_counter()
+            for i, path in enumerate(args.wavs):
+                dst = os.path.join(tmp, f"{i}{ext}")
+                encode_audio(path, dst, codec)
+                bytes_out += os.path.getsize(dst)
+            wall = time.perf_counter() - start
+            cpu_end = child_cpu()
+
+            cpu = f"{(cpu_end - cpu_start) / minutes:.2f} CPU-s" if cpu_start is not None else "n/a CPU-s"
+            print(f"  {codec:<5} ratio {bytes_in / bytes_out:5.1f}x  "
+                  f"{bytes_out / minutes / 1e3:7.0f} KB/min  "
+                  f"encode {wall / minutes:.2f}s wall, {cpu} per min of speech")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Measure what keyframe extraction saves on speech-clip screen videos: upload
+bytes, estimated prompt tokens and upload time per clip, against the cost
+of extracting the keyframes.
+
+Usage:
+    python src/testcode/bench_keyframes.py data/<session>/archive/*_speech_clip.mp4
+    python src/testcode/bench_keyframes.py --synthetic 5     # generated 30 s screen clips
+    python src/testcode/bench_keyframes.py --vfr 3           # ... written by the ffmpeg writer (needs ffmpeg)
+
+The --vfr clips go through FfmpegPipeWriter like real recordings: repeated
+frames are dropped, so the clip has a variable frame rate. Their screen
+changes happen at known times, and the bench reports how far the keyframe
+offsets are from them.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.utils import SCREEN_FPS
+from modules.keyframes import extract_keyframes
+from modules.batch_planner import VIDEO_TOKENS_PER_SEC
+from modules.video_writer import FfmpegPipeWriter, ffmpeg_writer_usable
+
+
+def synthetic_clip(path, seconds, rng, size=(1280, 720)):
+    """A reading/typing session: a page of text with a line typed every few
+    seconds, a new page now and then, and a cursor that keeps moving."""
+    w, h = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), SCREEN_FPS, size)
+    page = None
+    lines = 0
+    for i in range(int(seconds * SCREEN_FPS)):
+        t = i / SCREEN_FPS
+        if page is None or rng.random() < 0.03:  # ~ every 10 s
+            page = np.full((h, w, 3), 245, np.uint8)
+            cv2.rectangle(page, (0, 0), (w, 40), (60, 60, 60), -1)
+            for row in range(rng.randint(5, 15)):
+                cv2.putText(page, "".join(rng.choice("abcdefgh ijklmnop") for _ in range(70)),
+                            (40, 90 + row * 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (20, 20, 20), 1)
+            lines = 0
+        if rng.random() < 0.1:  # a typed line
+            cv2.putText(page, "".join(rng.choice("xyz = f(a) + 1;") for _ in range(50)),
+                        (40, 560 + (lines % 5) * 28), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (120, 30, 30), 1)
+            lines += 1
+        frame = page.copy()
+        x, y = int(w / 2 + 300 * np.sin(t)), int(h / 2 + 150 * np.cos(t / 2))
+        cv2.circle(frame, (x, y), 6, (0, 0, 0), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def synthetic_vfr_clip(path, seconds, rng, size=(1280, 720)):
+    """A mostly static screen (reading): a new page every 3-12 s and nothing
+    moving in between, encoded with the ffmpeg writer. Returns the change times."""
+    w, h = size
+    writer = FfmpegPipeWriter(path, size, SCREEN_FPS)
+    changes = []
+    page = None
+    next_change = 0.0
+    for i in range(int(seconds * SCREEN_FPS)):
+        t = i / SCREEN_FPS
+        if t >= next_change:
+            page = np.full((h, w, 3), 245, np.uint8)
+            for row in range(rng.randint(5, 15)):
+                cv2.putText(page, "".join(rng.choice("abcdefgh ijklmnop") for _ in range(70)),
+                            (40, 90 + row * 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (20, 20, 20), 1)
+            changes.append(t)
+            next_change = t + rng.uniform(3, 12)
+        writer.write(page)
+    if not writer.close():
+        raise RuntimeError("ffmpeg writer failed")
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark keyframe extraction for screen clips")
+    parser.add_argument("clips", nargs="*", help="Speech clip MP4 files")
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate this many 30 s clips instead")
+    parser.add_argument("--vfr", type=int, default=0, help="Generate this many 60 s variable-frame-rate clips")
+    parser.add_argument("--uplink", type=float, default=10, help="Uplink in Mbit/s for the upload time estimate")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clips = list(args.clips)
+        rng = random.Random(0)
+        for i in range(args.synthetic):
+            path = os.path.join(tmp, f"1200{i:02d}_speech_clip.mp4")
+            synthetic_clip(path, 30, rng)
+            clips.append(path)
+        truth = {}  # VFR clip → (screen change times, length)
+        if args.vfr and not ffmpeg_writer_usable():
+            parser.error("--vfr needs an ffmpeg that can run the screen encoder")
+        for i in range(args.vfr):
+            path = os.path.join(tmp, f"1300{i:02d}_speech_clip.mp4")
+            truth[path] = (synthetic_vfr_clip(path, 60, rng), 60)
+            clips.append(path)
+        if not clips:
+            parser.error("give clips or --synthetic N / --vfr N")
+
+        cache = os.path.join(tmp, "keyframes")
+        totals = {"video_bytes": 0, "bytes": 0, "video_tokens": 0, "tokens": 0}
+        frames = whole = 0
+        errors = []
+        start = time.perf_counter()
+        for path in clips:
+            result = extract_keyframes(path, cache)
+            size = os.path.getsize(path)
+            if result is None:
+                whole += 1
+                totals["video_bytes"] += size
+                totals["bytes"] += size
+                print(f"  {os.path.basename(path)}: sent whole ({size / 1e6:.2f} MB)")
+                continue
+            frames += len(result.frames)
+            for key in totals:
+                totals[key] += getattr(result, key)
+            print(f"  {os.path.basename(path)}: {len(result.frames)} keyframes, "
+                  f"{result.video_bytes / 1e6:.2f} → {result.bytes / 1e6:.2f} MB, "
+                  f"~{result.video_tokens:,} → ~{result.tokens:,} tokens")
+            if path in truth:
+                changes, seconds = truth[path]
+                offsets = [kf.offset for kf in result.frames]
+                errors.extend(min(abs(o - t) for o in offsets) for t in changes)
+                print(f"    changes at {', '.join(f'{t:.1f}' for t in changes)}s → "
+                      f"keyframes at {', '.join(f'{o:.1f}' for o in offsets)}s; "
+                      f"video tokens ~{result.video_tokens:,} (expected ~{seconds * VIDEO_TOKENS_PER_SEC:,})")
+        wall = time.perf_counter() - start
+
+    uplink = args.uplink * 1e6 / 8
+    print(f"\n🎞️ {len(clips)} clips ({whole} sent whole), {frames} keyframes, extraction {wall / len(clips):.2f}s per clip")
+    print(f"  upload bytes  {totals['video_bytes'] / 1e6:7.2f} MB → {totals['bytes'] / 1e6:7.2f} MB "
+          f"({totals['video_bytes'] / max(1, totals['bytes']):.1f}x less)")
+    print(f"  upload time   {totals['video_bytes'] / uplink:7.1f} s  → {totals['bytes'] / uplink:7.1f} s   "
+          f"at {args.uplink:g} Mbit/s")
+    if errors:
+        print(f"  VFR offsets   max {max(errors):.2f}s, mean {sum(errors) / len(errors):.2f}s from the real change times")
+    if totals["tokens"]:
+        print(f"  video tokens  {totals['video_tokens']:>9,} → {totals['tokens']:>9,} "
+              f"({totals['video_tokens'] / totals['tokens']:.1f}x less, reduced clips only)")
+
+
+if __name__ == "__main__":
+    main()
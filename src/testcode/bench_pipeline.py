@@ -0,0 +1,104 @@
+"""
+Compare sequential batch_analyze calls with the asyncio AnalysisPipeline
+against the local FakeBackend (no network, no API key). Reports wall time,
+batches/min and per-batch latency (submit → log written).
+
+Usage:
+    python src/testcode/bench_pipeline.py --batches 6 --files 12
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.fake_backend import FakeBackend
+from modules.gemini_client import batch_analyze
+from modules.pipeline import AnalysisPipeline
+
+# name suffix → size range (bytes) of the synthetic files
+KINDS = {
+    "_heartbeat.jpg": (80_000, 200_000),
+    "_speech_clip.flac": (100_000, 600_000),
+    "_speech_clip.mp4": (300_000, 3_000_000),
+}
+
+
+def make_batches(root, batches, files):
+    rng = random.Random(0)
+    out = []
+    t = 9 * 3600
+    for b in range(batches):
+        batch = []
+        for _ in range(files):
+            t += rng.randint(5, 30)
+            suffix = rng.choice(list(KINDS))
+            name = f"{t // 3600:02d}{t // 60 % 60:02d}{t % 60:02d}_{b}{suffix}"
+            path = os.path.join(root, name)
+            with open(path, "wb") as f:
+                f.write(os.urandom(rng.randint(*KINDS[suffix])))
+            batch.append(path)
+        out.append(batch)
+    return out
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def report(name, wall, latencies, backend):
+    print(f"{name:<10} {wall:6.1f}s wall  {len(latencies) / wall * 60:5.1f} batches/min  "
+          f"latency p50 {percentile(latencies, 50):5.1f}s  p95 {percentile(latencies, 95):5.1f}s  "
+          f"calls {backend.calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline against a fake Gemini")
+    parser.add_argument("--batches", type=int, default=6)
+    parser.add_argument("--files", type=int, default=12, help="Files per batch")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        batches = make_batches(root, args.batches, args.files)
+        log = os.path.join(root, "Research_Log.md")
+
+        # Sequential: one blocking batch_analyze after another (the old Analyzer)
+        backend = FakeBackend(seed=1)
+        start = time.monotonic()
+        latencies = []
+        for batch in batches:
+            ok = batch_analyze(batch, log, backend=backend)
+            assert ok
+            latencies.append(time.monotonic() - start)
+        seq_wall = time.monotonic() - start
+        seq = (seq_wall, latencies, backend)
+
+        # Pipelined: all batches submitted at once, stages overlap across batches
+        backend = FakeBackend(seed=1)
+        pipeline = AnalysisPipeline(backend=backend)
+        done = {}
+        start = time.monotonic()
+        for i, batch in enumerate(batches):
+            pipeline.submit(batch, log, on_done=lambda ok, i=i: done.setdefault(i, (ok, time.monotonic() - start)))
+        pipeline.drain()
+        pipe_wall = time.monotonic() - start
+        pipeline.close()
+        assert all(ok for ok, _ in done.values()) and len(done) == len(batches)
+        assert backend.remote_files == 0, "every upload should have been deleted"
+
+        with open(log, encoding="utf-8") as f:
+            entries = f.read().count("[Batch Analysis:")
+        assert entries == 2 * len(batches)
+
+    print()
+    report("sequential", *seq)
+    report("pipeline", pipe_wall, [t for _, t in done.values()], backend)
+    print(f"speedup x{seq_wall / pipe_wall:.1f}")
+
+
+if __name__ == "__main__":
+    main()
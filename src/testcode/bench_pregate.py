@@ -0,0 +1,58 @@
+"""
+Report how much Silero inference the EnergyGate saves on recorded audio,
+and how many Silero-positive chunks it would have hidden (misses).
+
+Usage:
+    python src/testcode/bench_pregate.py office_1.wav [office_2.wav ...]
+"""
+import os
+import sys
+import time
+import argparse
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from silero_vad import load_silero_vad
+from modules.utils import RATE, CHUNK_SIZE, VAD_THRESHOLD
+from modules.vad_engine import StreamingVAD
+from bench_vad import load_chunks
+
+
+def run(model, chunks, gate):
+    model.reset_states()
+    vad = StreamingVAD(model, capacity=1, gate=gate)
+    start = time.process_time()
+    probs = []
+    for chunk in chunks:
+        vad.push(chunk)
+        probs.extend(p for _, p in vad.process())
+    return probs, time.process_time() - start, vad.gate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Silero calls skipped by the energy pre-gate")
+    parser.add_argument("wavs", nargs="+", help="16 kHz mono 16-bit WAV recordings")
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    model = load_silero_vad()
+    model.eval()
+
+    for path in args.wavs:
+        chunks = load_chunks(path, 0)
+        hours = len(chunks) * CHUNK_SIZE / RATE / 3600
+        ref, ref_cpu, _ = run(model, chunks, gate=False)
+        got, gate_cpu, gate = run(model, chunks, gate=True)
+
+        speech = sum(p > VAD_THRESHOLD for p in ref)
+        missed = sum(r > VAD_THRESHOLD and g <= VAD_THRESHOLD for r, g in zip(ref, got))
+        print(f"📄 {os.path.basename(path)} ({hours * 60:.1f} min)")
+        print(f"  Silero calls skipped: {gate.skipped}/{len(chunks)} ({gate.skip_ratio:.1%})")
+        print(f"  CPU: {ref_cpu / hours:.1f} → {gate_cpu / hours:.1f} CPU-s / hour")
+        print(f"  Speech chunks missed: {missed}/{speech}")
+
+
+if __name__ == "__main__":
+    main()
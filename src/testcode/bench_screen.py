@@ -0,0 +1,51 @@
+"""
+Compare screen clip writers: achieved FPS, dropped frames and bytes per minute.
+
+Records the primary monitor for --seconds with each backend (scroll or type
+during the run to exercise the change detector).
+
+Usage:
+    python src/testcode/bench_screen.py [--seconds 30]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import screen_recorder
+from modules.screen_recorder import ScreenRecorder
+from modules.video_writer import open_video_writer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark screen clip writers")
+    parser.add_argument("--seconds", type=float, default=30)
+    args = parser.parse_args()
+
+    recorder = ScreenRecorder()
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("opencv", "ffmpeg"):
+            # Force the backend for this run
+            screen_recorder.open_video_writer = (
+                lambda path, size, fps, b=backend: open_video_writer(path, size, fps, backend=b))
+            path = os.path.join(tmp, f"{backend}.mp4")
+            cpu = time.process_time()
+            recorder.start_recording(path)
+            time.sleep(args.seconds)
+            recorder.stop_recording()
+            cpu = time.process_time() - cpu
+
+            stats = recorder.last_stats or {}
+            print(f"  {backend:<7} capture {stats.get('capture_fps', 0):4.2f} new fps, "
+                  f"{stats.get('unique_frames', 0)}/{stats.get('timeline_frames', 0)} unique frames, "
+                  f"dropped {stats.get('dropped', 0)}, "
+                  f"{stats.get('bytes_per_min', 0) / 1e3:7.0f} KB/min, "
+                  f"{cpu:.1f} CPU-s in-process")
+    recorder.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: CPU cost of Silero VAD per hour of audio.
+
+Compares the legacy per-chunk path (frombuffer → astype → divide →
+from_numpy → model → .item()) against StreamingVAD, at batch size 1
+(loop keeping up) and VAD_MAX_BATCH (loop falling behind).
+
+Usage:
+    python src/testcode/bench_vad.py [path/to/16k_mono.wav] [--seconds 120]
+"""
+import os
+import sys
+import time
+import wave
+import argparse
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from silero_vad import load_silero_vad
+from modules.utils import RATE, CHUNK_SIZE, VAD_MAX_BATCH
+from modules.vad_engine import StreamingVAD
+
+
+def load_chunks(path, seconds):
+    """Return a list of CHUNK_SIZE int16 byte chunks from a WAV file or synthetic noise+tone."""
+    if path:
+        with wave.open(path, "rb") as wf:
+            if wf.getframerate() != RATE or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+                raise SystemExit(f"❌ Expected 16 kHz mono 16-bit WAV: {path}")
+            data = wf.readframes(wf.getnframes())
+    else:
+        rng = np.random.default_rng(0)
+        t = np.arange(int(seconds * RATE)) / RATE
+        audio = rng.normal(0, 300, t.size) + 3000 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 0.2 * t) > 0)
+        data = np.clip(audio, -32768, 32767).astype(np.int16).tobytes()
+
+    step = CHUNK_SIZE * 2
+    return [data[i:i + step] for i in range(0, len(data) - step + 1, step)]
+
+
+def legacy_path(model, chunks):
+    for chunk in chunks:
+        audio_int16 = np.frombuffer(chunk, dtype=np.int16)
+        audio_float32 = audio_int16.astype(np.float32) / 32768.0
+        audio_tensor = torch.from_numpy(audio_float32)
+        model(audio_tensor, RATE).item()
+
+
+def engine_path(model, chunks, batch):
+    vad = StreamingVAD(model, capacity=batch, gate=False)  # the gate is measured by bench_pregate.py
+    for i in range(0, len(chunks), batch):
+        for chunk in chunks[i:i + batch]:
+            vad.push(chunk)
+        vad.process()
+
+
+def measure(label, fn, audio_seconds):
+    start = time.process_time()
+    fn()
+    cpu = time.process_time() - start
+    per_hour = cpu / audio_seconds * 3600
+    print(f"  {label:<28} {cpu:7.2f} CPU-s  →  {per_hour:7.1f} CPU-s / hour of audio")
+    return per_hour
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Silero VAD CPU cost")
+    parser.add_argument("wav", nargs="?", default=None, help="16 kHz mono 16-bit WAV (default: synthetic)")
+    parser.add_argument("--seconds", type=float, default=120, help="Synthetic audio length")
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    model = load_silero_vad()
+    model.eval()
+
+    chunks = load_chunks(args.wav, args.seconds)
+    audio_seconds = len(chunks) * CHUNK_SIZE / RATE
+    print(f"🎧 {len(chunks)} chunks ({audio_seconds:.0f}s of audio)")
+
+    model.reset_states()
+    base = measure("legacy is_speech", lambda: legacy_path(model, chunks), audio_seconds)
+    model.reset_states()
+    one = measure("StreamingVAD batch=1", lambda: engine_path(model, chunks, 1), audio_seconds)
+    model.reset_states()
+    many = measure(f"StreamingVAD batch={VAD_MAX_BATCH}",
+                   lambda: engine_path(model, chunks, VAD_MAX_BATCH), audio_seconds)
+
+    print("-" * 50)
+    print(f"  batch=1 vs legacy: {100 * (1 - one / base):+.1f}% CPU saved")
+    print(f"  batch={VAD_MAX_BATCH} vs legacy: {100 * (1 - many / base):+.1f}% CPU saved")
+
+
+if __name__ == "__main__":
+    main()
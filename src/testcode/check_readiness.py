@@ -0,0 +1,86 @@
+"""
+Exercise ReadinessTracker against a local fake of the Gemini file service
+(no network, no API key). Compares wall time with the old sequential
+2-second polling and checks FAILED / timeout handling.
+
+Usage:
+    python src/testcode/check_readiness.py
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.readiness import ReadinessTracker
+
+
+class FakeFileService:
+    """get_file() stand-in: each file turns ACTIVE (or FAILED) after a fixed delay."""
+
+    def __init__(self, delays, failing=(), latency=0.05):
+        self.delays = delays
+        self.failing = set(failing)
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+
+    def upload(self, name):
+        return SimpleNamespace(name=name, state=SimpleNamespace(name="PROCESSING"))
+
+    def get_file(self, name):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        ready = time.monotonic() - self._start >= self.delays[name]
+        state = "PROCESSING"
+        if ready:
+            state = "FAILED" if name in self.failing else "ACTIVE"
+        return SimpleNamespace(name=name, state=SimpleNamespace(name=state))
+
+
+def sequential(service, files, timeout):
+    """The previous _wait_for_active loop: one file at a time, fixed 2 s sleep."""
+    for remote in files.values():
+        start = time.monotonic()
+        while time.monotonic() - start < timeout:
+            if service.get_file(remote.name).state.name in ("ACTIVE", "FAILED"):
+                break
+            time.sleep(2)
+
+
+def main():
+    delays = {"a.jpg": 0.0, "b.flac": 1.0, "c.mp4": 6.0, "d.mp4": 3.0, "e.jpg": 0.2, "f.mp4": 2.0}
+
+    service = FakeFileService(delays)
+    files = {n: service.upload(n) for n in delays}
+    start = time.monotonic()
+    sequential(service, files, timeout=20)
+    seq_wall = time.monotonic() - start
+    print(f"sequential: {seq_wall:.1f}s wall, {service.calls} polls")
+
+    service = FakeFileService(delays, failing={"f.mp4"})
+    files = {n: service.upload(n) for n in delays}
+    start = time.monotonic()
+    results = asyncio.run(ReadinessTracker(service.get_file, timeout=20).wait_all(files))
+    wall = time.monotonic() - start
+    print(f"tracker:    {wall:.1f}s wall, {service.calls} polls")
+    for name, (state, seconds) in sorted(results.items(), key=lambda kv: kv[1][1]):
+        print(f"  {name:<7} {state:<8} {seconds:5.1f}s (ready at {delays[name]:.1f}s)")
+
+    assert results["f.mp4"][0] == "FAILED"
+    assert all(state == "ACTIVE" for n, (state, _) in results.items() if n != "f.mp4")
+    assert wall < max(delays.values()) * 1.6 + 1, "tracker should finish near the slowest file"
+
+    service = FakeFileService({"slow.mp4": 60})
+    results = asyncio.run(ReadinessTracker(service.get_file, timeout=2).wait_all({"slow.mp4": service.upload("slow.mp4")}))
+    assert results["slow.mp4"][0] == "TIMEOUT"
+    print("✅ readiness tracker checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,154 @@
 import os
-import re
+import sys
+import json
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 
-def clean_log(input_path, output_path=None):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.log_lock import log_lock
+
+DETAILS_OPEN = "<details>"
+DETAILS_CLOSE = "</details>"
+SUMMARY = "<summary>📎 本次分析的原始素材</summary>"
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+STATE_FILE = ".clean_log_state.json"  # in the data dir: log path → (size, mtime_ns) after the last run
+
+
+def strip_file_refs(lines):
+    """Drop the raw file reference blocks (<details>, then the 📎 本次分析的原始素材
+    summary, through </details>) from a stream of lines.
+
+    Line-oriented state machine: only a "<details>" line and the blank
+    lines after it are held back until the next line shows whose block it is.
+    """
+    held = []         # "<details>" line + blank lines, undecided
+    skipping = False  # inside one of our blocks
+    for line in lines:
+        if held:
+            if not line.strip():
+                held.append(line)
+                continue
+            if line.lstrip().startswith(SUMMARY):
+                held = []
+                skipping = True
+                line = line.lstrip()[len(SUMMARY):]  # the block may close on the same line
+            else:
+                yield from held  # someone else's <details>
+                held = []
+        if skipping:
+            end = line.find(DETAILS_CLOSE)
+            if end < 0:
+                continue
+            skipping = False
+            line = line[end + len(DETAILS_CLOSE):]
+            if not line:
+                continue
+        if line.strip() == DETAILS_OPEN:
+            held = [line]
+            continue
+        yield line
+    yield from held
+
+
+def collapse_blank_lines(lines):
+    """Keep at most one empty line in a row (the gaps left where blocks were removed)."""
+    blank = False
+    for line in lines:
+        if line == "\n":
+            if blank:
+                continue
+            blank = True
+        else:
+            blank = False
+        yield line
+
+
+def clean_log(input_path, output_path=None, in_place=False):
     """
     Remove the raw file reference sections (<details>...📎 本次分析的原始素材...</details>) from the log.
+
+    Streams line by line in constant memory and writes through a temporary
+    file that atomically replaces the output. The whole pass holds the log's
+    lock, which the Analyzer takes for every append, so a note written while
+    a live session's log is cleaned in place waits instead of being lost.
+    Returns (bytes before, bytes after, [size, mtime_ns] of the input as
+    the pass left it), or None if nothing was written.
     """
-    if not output_path:
+    if in_place:
+        output_path = input_path
+    elif not output_path:
         base, ext = os.path.splitext(input_path)
         output_path = f"{base}_clean{ext}"
 
     if not os.path.exists(input_path):
         print(f"❌ Input file not found: {input_path}")
-        return
-
-    with open(input_path, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    # Regex to match the <details> block containing "📎 本次分析的原始素材"
-    # DOTALL flag allows . to match newlines
-    pattern = re.compile(r'<details>\s*<summary>📎 本次分析的原始素材</summary>.*?</details>', re.DOTALL)
-    
-    cleaned_content = re.sub(pattern, "", content)
-    
-    # Remove excessive newlines that might be left behind (optional polish)
-    cleaned_content = re.sub(r'\n{3,}', '\n\n', cleaned_content)
-
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(cleaned_content)
-    
+        return None
+
+    tmp = output_path + ".part"
+    with log_lock(input_path):
+        size = os.path.getsize(input_path)
+        with open(input_path, "r", encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as dst:
+            dst.writelines(collapse_blank_lines(strip_file_refs(src)))
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp, output_path)
+        st = os.stat(input_path)
     print(f"✅ Clean log saved to: {output_path}")
+    return size, os.path.getsize(output_path), [st.st_size, st.st_mtime_ns]
+
+
+def clean_all_sessions(data_dir=DATA_DIR, in_place=False, jobs=None):
+    """Clean every session's Research_Log.md in parallel, skipping logs
+    unchanged since the last run (tracked in data_dir/.clean_log_state.json)."""
+    state_path = os.path.join(data_dir, STATE_FILE)
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+
+    todo = []
+    skipped = 0
+    for name in sorted(os.listdir(data_dir)) if os.path.isdir(data_dir) else []:
+        log = os.path.join(data_dir, name, "Research_Log.md")
+        if not name.startswith("session_") or not os.path.isfile(log):
+            continue
+        st = os.stat(log)
+        output = log if in_place else os.path.splitext(log)[0] + "_clean.md"
+        if state.get(log) == [st.st_size, st.st_mtime_ns] and os.path.exists(output):
+            skipped += 1
+        else:
+            todo.append(log)
+
+    print(f"🧹 {len(todo)} logs to clean, {skipped} unchanged since the last run")
+    saved = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for log, result in zip(todo, pool.map(clean_log, todo, [None] * len(todo), [in_place] * len(todo))):
+            if result:
+                state[log] = result[2]
+                saved += result[0] - result[1]
+
+    tmp = state_path + ".part"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, state_path)
+    print(f"✅ Cleaned {len(todo)} logs, removed {saved / 1024:.0f} KB of file references")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Remove raw file references from Research_Log.md")
-    parser.add_argument("file", help="Path to the Research_Log.md file")
+    parser.add_argument("file", nargs="?", help="Path to the Research_Log.md file")
+    parser.add_argument("--in-place", action="store_true", help="Replace the log itself (atomically)")
+    parser.add_argument("--all-sessions", action="store_true", help="Clean every session's log under the data dir")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Sessions directory for --all-sessions")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes for --all-sessions")
     args = parser.parse_args()
-    
-    clean_log(args.file)
+
+    if args.all_sessions:
+        clean_all_sessions(args.data_dir, args.in_place, args.jobs)
+    elif args.file:
+        clean_log(args.file, in_place=args.in_place)
+    else:
+        parser.error("give a log file or --all-sessions")